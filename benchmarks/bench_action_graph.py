@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Time ordering generated storage configs (disks, RAID1 pairs with
+partitions, nested mounts) with subiquity.models.actiongraph, and check
+that every action comes after the actions it refers to. """
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOPDIR)
+
+from subiquity.models.actiongraph import (action_references,  # noqa: E402
+                                          order_actions)
+
+
+def generate_actions(disks, partitions):
+    actions = []
+    for d in range(disks):
+        actions.append({'id': 'disk%d' % d, 'type': 'disk'})
+        for p in range(partitions):
+            actions.append({'id': 'disk%dp%d' % (d, p), 'type': 'partition',
+                            'device': 'disk%d' % d})
+    for d in range(0, disks - 1, 2):
+        for p in range(partitions):
+            md = 'md%d_%d' % (d, p)
+            actions.append({'id': md, 'type': 'raid', 'raidlevel': 1,
+                            'devices': ['disk%dp%d' % (d, p),
+                                        'disk%dp%d' % (d + 1, p)]})
+            actions.append({'id': md + 'p1', 'type': 'partition',
+                            'device': md})
+            actions.append({'id': md + '-fs', 'type': 'format',
+                            'volume': md + 'p1', 'fstype': 'ext4'})
+            actions.append({'id': md + '-mount', 'type': 'mount',
+                            'device': md + '-fs',
+                            'path': '/srv/%d/%d' % (d, p)})
+    actions.append({'id': 'srv-fs', 'type': 'format', 'volume': 'disk0p0'})
+    actions.append({'id': 'srv-mount', 'type': 'mount', 'device': 'srv-fs',
+                    'path': '/srv'})
+    random.Random(0).shuffle(actions)
+    return actions
+
+
+def check_order(ordered):
+    paths = set(a['path'] for a in ordered if a['type'] == 'mount')
+    seen = set()
+    mounted = set()
+    for action in ordered:
+        for ref in action_references(action):
+            assert ref in seen, (action, ref)
+        if action['type'] == 'mount':
+            parent = os.path.dirname(action['path'])
+            while parent not in paths and parent != '/':
+                parent = os.path.dirname(parent)
+            assert parent not in paths or parent in mounted, action
+            mounted.add(action['path'])
+        seen.add(action['id'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--partitions', type=int, default=4)
+    parser.add_argument('disks', type=int, nargs='*',
+                        default=[10, 100, 1000])
+    opts = parser.parse_args()
+
+    print('{:>6} {:>8} {:>10} {:>12}'.format(
+          'disks', 'actions', 'order ms', 'us/action'))
+    for disks in opts.disks:
+        actions = generate_actions(disks, opts.partitions)
+        check_order(order_actions(actions))
+        seconds = min(timeit.repeat(lambda: order_actions(actions),
+                                    repeat=opts.repeat, number=1))
+        print('{:>6} {:>8} {:>10.2f} {:>12.2f}'.format(
+              disks, len(actions), seconds * 1000,
+              seconds * 1e6 / len(actions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Time and measure the peak memory of writing the curtin storage config
+for a large JBOD, with the old dump-indent-write writer and with
+subiquitycore.curtin.curtin_write_config. """
+
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+import yaml
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOPDIR)
+
+from subiquitycore.curtin import curtin_write_config  # noqa: E402
+
+
+def jbod_actions(disks, partitions):
+    actions = []
+    for d in range(disks):
+        disk_id = 'disk-sd{}'.format(d)
+        actions.append({'id': disk_id, 'type': 'disk', 'ptable': 'gpt',
+                        'model': 'JBOD DISK', 'serial': 'SERIAL{:06d}'.format(d),
+                        'wipe': 'superblock'})
+        for p in range(1, partitions + 1):
+            part_id = '{}-part{}'.format(disk_id, p)
+            actions.append({'id': part_id, 'type': 'partition',
+                            'device': disk_id, 'number': p,
+                            'size': '100G', 'flag': ''})
+            actions.append({'id': part_id + '-fs', 'type': 'format',
+                            'volume': part_id, 'fstype': 'ext4'})
+            actions.append({'id': part_id + '-mount', 'type': 'mount',
+                            'device': part_id + '-fs',
+                            'path': '/srv/{}/{}'.format(d, p)})
+    return actions
+
+
+def old_writer(path, actions):
+    curtin_config = yaml.dump(actions, default_flow_style=False)
+    curtin_config = "    " + "\n    ".join(curtin_config.splitlines())
+    with open(path, 'w') as conf:
+        conf.write("\nstorage:\n  version: 1\n  config:\n")
+        conf.write(curtin_config)
+
+
+def new_writer(path, actions):
+    curtin_write_config(path, 'storage', actions)
+
+
+def measure(writer, path, actions, repeat):
+    seconds = min(timeit.repeat(lambda: writer(path, actions),
+                                repeat=repeat, number=1))
+    tracemalloc.start()
+    writer(path, actions)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    with open(path) as fp:
+        config = yaml.load(fp, Loader=getattr(yaml, 'CSafeLoader',
+                                              yaml.SafeLoader))
+    return seconds, peak, config['storage']['config']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--partitions', type=int, default=4)
+    parser.add_argument('disks', type=int, nargs='*',
+                        default=[10, 100, 500])
+    opts = parser.parse_args()
+
+    print('{:>6} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+          'disks', 'actions', 'old ms', 'new ms', 'old KiB', 'new KiB'))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'storage.yaml')
+        for disks in opts.disks:
+            actions = jbod_actions(disks, opts.partitions)
+            old_s, old_peak, old_cfg = measure(old_writer, path, actions,
+                                               opts.repeat)
+            new_s, new_peak, new_cfg = measure(new_writer, path, actions,
+                                               opts.repeat)
+            assert old_cfg == new_cfg == actions
+            print('{:>6} {:>8} {:>10.1f} {:>10.1f} {:>10.0f} {:>10.0f}'.format(
+                  disks, len(actions), old_s * 1000, new_s * 1000,
+                  old_peak / 1024, new_peak / 1024))
+
+
+if __name__ == '__main__':
+    main()
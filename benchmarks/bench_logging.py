@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Time spent on the logging thread for debug messages like the ones
+probe_storage and emit_signal log: eager .format() into a synchronous
+file handler (the old setup) against lazy %-arguments into the queue
+handler of subiquitycore.log. """
+
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+from logging.handlers import QueueListener, TimedRotatingFileHandler
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOPDIR)
+
+from subiquitycore.log import DeferredQueueHandler, lazy  # noqa: E402
+
+FORMAT = "%(asctime)s %(name)s:%(lineno)d %(message)s"
+
+
+def fake_disk(n):
+    return {'DEVNAME': '/dev/sd{}'.format(n), 'DEVTYPE': 'disk',
+            'MAJOR': '8', 'ID_SERIAL': 'SERIAL{:06d}'.format(n),
+            'attrs': {'size': str(1 << 40), 'ro': '0', 'removable': '0',
+                      'queue': {str(i): i for i in range(30)}}}
+
+
+def log_old(log, disks, stack):
+    for (n, disk) in enumerate(disks):
+        log.debug('disk={}\n{}'.format(n, json.dumps(disk, indent=4,
+                                                     sort_keys=True)))
+        log.debug("Emitter: {}, {}, {}".format('menu:filesystem', (), {}))
+        log.debug(" emit: before: size={} stack={}".format(len(stack),
+                                                           stack))
+
+
+def log_new(log, disks, stack):
+    for (n, disk) in enumerate(disks):
+        log.debug('disk=%s\n%s', n, lazy(json.dumps, disk, indent=4,
+                                         sort_keys=True))
+        log.debug("Emitter: %s, %s, %s", 'menu:filesystem', (), {})
+        log.debug(" emit: before: size=%d stack=%s", len(stack),
+                  list(stack))
+
+
+def run(name, writer, handler, disks, stack, listener=None):
+    log = logging.getLogger('bench.' + name)
+    log.propagate = False
+    log.setLevel('DEBUG')
+    log.addHandler(handler)
+    if listener is not None:
+        listener.start()
+    start = time.perf_counter()
+    writer(log, disks, stack)
+    caller = time.perf_counter() - start
+    if listener is not None:
+        listener.stop()
+    total = time.perf_counter() - start
+    log.removeHandler(handler)
+    return caller, total
+
+
+def file_handler(path):
+    handler = TimedRotatingFileHandler(path, when='D', interval=1,
+                                       backupCount=7)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    return handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--disks', type=int, default=2000)
+    opts = parser.parse_args()
+
+    disks = [fake_disk(n) for n in range(opts.disks)]
+    stack = [('menu:welcome:main', (), {})] * 20
+    with tempfile.TemporaryDirectory() as tmp:
+        old = run('old', log_old, file_handler(os.path.join(tmp, 'old')),
+                  disks, stack)
+        records = queue.Queue()
+        new = run('new', log_new, DeferredQueueHandler(records),
+                  disks, stack,
+                  QueueListener(records,
+                                file_handler(os.path.join(tmp, 'new'))))
+        assert os.path.getsize(os.path.join(tmp, 'old')) == \
+            os.path.getsize(os.path.join(tmp, 'new'))
+
+    print('{} messages'.format(opts.disks * 3))
+    print('{:<28} {:>10} {:>10}'.format('', 'caller ms', 'total ms'))
+    print('{:<28} {:>10.1f} {:>10.1f}'.format(
+          'format + file handler', old[0] * 1000, old[1] * 1000))
+    print('{:<28} {:>10.1f} {:>10.1f}'.format(
+          'lazy args + queue handler', new[0] * 1000, new[1] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Time loading every machine config in examples/ with the old loader
+(yaml.safe_load) and with subiquitycore.prober.load_machine_config. """
+
+import argparse
+import glob
+import os
+import sys
+import timeit
+
+import yaml
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOPDIR)
+
+from subiquitycore.prober import load_machine_config  # noqa: E402
+
+
+def safe_load(path):
+    with open(path) as mc:
+        return yaml.safe_load(mc)
+
+
+def best_of(func, path, repeat, number):
+    timings = timeit.repeat(lambda: func(path), repeat=repeat, number=number)
+    return min(timings) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=3)
+    parser.add_argument('configs', nargs='*',
+                        default=sorted(glob.glob(
+                            os.path.join(TOPDIR, 'examples', '*.json'))))
+    opts = parser.parse_args()
+
+    print('{:<40} {:>8} {:>12} {:>12} {:>8}'.format(
+          'config', 'KiB', 'safe_load ms', 'loader ms', 'speedup'))
+    total_old = total_new = 0
+    for path in opts.configs:
+        old = best_of(safe_load, path, opts.repeat, opts.number)
+        new = best_of(load_machine_config, path, opts.repeat, opts.number)
+        total_old += old
+        total_new += new
+        print('{:<40} {:>8.1f} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+              os.path.basename(path), os.path.getsize(path) / 1024,
+              old * 1000, new * 1000, old / new))
+    if opts.configs:
+        print('{:<40} {:>8} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+              'total', '', total_old * 1000, total_new * 1000,
+              total_old / total_new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Bytes sent to the terminal per screen transition, by urwid's raw
+display and by the serial display (--serial), drawing the same frames
+on a pseudo terminal with the monochrome palette: moving between
+screens like the installer's, moving the focus, and the install
+progress screen following a log. """
+
+import argparse
+import os
+import pty
+import sys
+import threading
+import time
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOPDIR)
+
+import urwid  # noqa: E402
+from urwid import Columns, ListBox, Pile, ProgressBar, Text  # noqa: E402
+
+from subiquitycore.palette import STYLES_MONO  # noqa: E402
+from subiquitycore.ui.buttons import done_btn, menu_btn  # noqa: E402
+from subiquitycore.ui.frame import SubiquityUI  # noqa: E402
+from subiquitycore.ui.interactive import StringEditor  # noqa: E402
+from subiquitycore.ui.serial import SerialScreen  # noqa: E402
+from subiquitycore.ui.utils import Color, Padding  # noqa: E402
+
+BAUDS = [9600, 115200]
+
+
+class Terminal:
+    ''' A pty whose output is counted, not shown '''
+
+    def __init__(self):
+        (self.master, slave) = pty.openpty()
+        self.input = os.fdopen(os.dup(slave), 'r')
+        self.output = os.fdopen(slave, 'w')
+        self.count = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self._drain, daemon=True).start()
+
+    def _drain(self):
+        while True:
+            try:
+                data = os.read(self.master, 65536)
+            except OSError:
+                return
+            if not data:
+                return
+            with self.lock:
+                self.count += len(data)
+
+    def take(self):
+        ''' bytes received since the last take() '''
+        last = -1
+        while True:
+            time.sleep(0.02)
+            with self.lock:
+                if self.count == last:
+                    self.count = 0
+                    return last
+                last = self.count
+
+
+def menu_screen(n):
+    return ListBox([Padding.center_79(Color.menu_button(
+        menu_btn(label='Menu entry {}'.format(i)),
+        focus_map='menu_button focus')) for i in range(n)])
+
+
+def form_screen():
+    rows = [Columns([('weight', 0.2, Text(label, align='right')),
+                     ('weight', 0.3, Color.string_input(
+                         StringEditor(caption=''),
+                         focus_map='string_input focus'))], dividechars=4)
+            for label in ['Your name', 'Your username', 'Password',
+                          'Confirm password']]
+    rows.append(Padding.fixed_10(Color.button(done_btn(),
+                                              focus_map='button focus')))
+    return ListBox([Padding.center_79(row) for row in rows])
+
+
+def disks_screen(n):
+    rows = [Columns([(16, Text('/dev/sd{}'.format(i))),
+                     Text('{}.000G'.format(i + 100))], 2) for i in range(n)]
+    return ListBox([Padding.center_79(Pile(rows))])
+
+
+class Progress:
+    def __init__(self):
+        self.bar = ProgressBar(normal='progress_incomplete',
+                               complete='progress_complete')
+        self.text = Text('')
+        self.lines = []
+        self.widget = ListBox([Padding.center_79(self.bar),
+                               Padding.center_79(self.text)])
+
+    def step(self, i):
+        self.bar.set_completion(i)
+        self.lines.append('curtin: {} writing {} blocks to /dev/sda{}'.format(
+            time.strftime('%H:%M:%S', time.gmtime(i)), i * 4096, i % 4))
+        self.text.set_text('\n'.join(self.lines[-10:]))
+
+
+def transitions(ui):
+    ''' Change the ui, yield a label for each change '''
+    ui.set_header('Welcome!', 'Please choose your language')
+    ui.set_footer('Use UP, DOWN and ENTER keys to select', 10)
+    ui.set_body(menu_screen(12))
+    yield 'first screen'
+    for i in range(3):
+        ui.keypress((80, 24), 'down')
+        yield 'focus down'
+    ui.set_header('Network connections')
+    ui.set_footer('Configure at least the main interface', 40)
+    ui.set_body(disks_screen(6))
+    yield 'next screen'
+    ui.set_header('Profile setup')
+    ui.set_body(form_screen())
+    yield 'next screen'
+    for key in 'ubuntu':
+        ui.keypress((80, 24), key)
+        yield 'typing'
+    ui.set_header('Filesystem setup')
+    ui.set_footer('Select available disks to format and mount', 30)
+    ui.set_body(disks_screen(90))
+    yield 'next screen'
+    for i in range(5):
+        ui.keypress((80, 24), 'page down')
+        yield 'page down'
+    progress = Progress()
+    ui.set_header('Installing system')
+    ui.set_footer('Thank you for using Ubuntu!', 90)
+    ui.set_body(progress.widget)
+    yield 'next screen'
+    for i in range(1, 51):
+        progress.step(i)
+        yield 'progress update'
+
+
+def run(screen_class):
+    term = Terminal()
+    screen = screen_class(input=term.input, output=term.output)
+    screen.register_palette(STYLES_MONO)
+    screen.start()
+    term.take()
+    ui = SubiquityUI()
+    results = []
+    try:
+        for label in transitions(ui):
+            canvas = ui.render((80, 24), focus=True)
+            screen.draw_screen((80, 24), canvas)
+            results.append((label, term.take()))
+    finally:
+        screen.stop()
+    return results
+
+
+def report(name, results):
+    by_label = {}
+    for (label, count) in results:
+        by_label.setdefault(label, []).append(count)
+    total = sum(count for (_, count) in results)
+    print(name)
+    for (label, counts) in sorted(by_label.items()):
+        print('  {:16} {:4} x {:6.0f} bytes'.format(
+              label, len(counts), sum(counts) / len(counts)))
+    print('  {:16} {:13} bytes, {}'.format(
+          'total', total, ', '.join('{:.1f}s at {}'.format(
+              total * 10 / baud, baud) for baud in BAUDS)))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+    urwid.set_encoding('utf-8')
+    raw = report('raw display', run(urwid.raw_display.Screen))
+    serial = report('serial display', run(SerialScreen))
+    print('serial display sends {:.0f}% of the bytes'.format(
+          serial * 100 / raw))
+
+
+if __name__ == '__main__':
+    main()
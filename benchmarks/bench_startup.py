@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Time from exec to the first screen of bin/subiquity-tui and
+bin/console-conf-tui in --dry-run mode, on a pseudo terminal.  The
+application logs when it has drawn its first screen; the time reported
+is the one it logs (process start to first paint), the wall time seen
+from here is shown next to it.  With --bundle, the same again with the
+packages loaded from a bytecode bundle (see subiquitycore.bundle). """
+
+import argparse
+import os
+import pty
+import re
+import select
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOPDIR)
+
+from subiquitycore.bundle import BUNDLE_ENV, build_bundle  # noqa: E402
+
+FIRST_PAINT = re.compile(rb'first paint (\d+)ms after the application '
+                         rb'started(?:, (\d+)ms after the process started)?')
+MACHINE_CONFIG = os.path.join(TOPDIR, 'examples', 'desktop.json')
+
+
+def first_paint(logfile):
+    try:
+        with open(logfile, 'rb') as fp:
+            match = FIRST_PAINT.search(fp.read())
+    except OSError:
+        return None
+    if match is None:
+        return None
+    if match.group(2) is not None:
+        return int(match.group(2))
+    return int(match.group(1))
+
+
+def log_tail(logfile, lines=10):
+    try:
+        with open(logfile, errors='replace') as fp:
+            return ''.join(fp.readlines()[-lines:])
+    except OSError:
+        return '(no log)'
+
+
+def start_once(script, env, timeout):
+    ''' Run `script' until it has painted, returns (logged ms, wall ms) '''
+    workdir = tempfile.mkdtemp()
+    logfile = os.path.join(workdir, '.subiquity', 'subiquity-debug.log')
+    argv = [sys.executable, os.path.join(TOPDIR, 'bin', script), '--dry-run']
+    if script == 'subiquity-tui':
+        argv += ['--machine-config', MACHINE_CONFIG]
+    master, slave = pty.openpty()
+    start = time.time()
+    proc = subprocess.Popen(argv, cwd=workdir, env=env, stdin=slave,
+                            stdout=slave, stderr=slave,
+                            start_new_session=True)
+    os.close(slave)
+    output = b''
+    try:
+        while time.time() - start < timeout:
+            # keep the terminal drained so drawing never blocks
+            if select.select([master], [], [], 0.01)[0]:
+                try:
+                    output = (output + os.read(master, 65536))[-4096:]
+                except OSError:
+                    pass
+            logged = first_paint(logfile)
+            if logged is not None:
+                return (logged, (time.time() - start) * 1000)
+            if proc.poll() is not None:
+                raise RuntimeError('{} exited with {} before painting:\n'
+                                   '{}{}'.format(script, proc.returncode,
+                                                 log_tail(logfile),
+                                                 output.decode('utf-8',
+                                                               'replace')))
+        raise RuntimeError('{} did not paint within {}s'.format(script,
+                                                                timeout))
+    finally:
+        if proc.poll() is None:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+        os.close(master)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(label, script, env, rounds, timeout):
+    results = [start_once(script, env, timeout) for _ in range(rounds)]
+    print('{:32} first paint {:6.0f}ms (wall {:6.0f}ms)'.format(
+          label, statistics.median(r[0] for r in results),
+          statistics.median(r[1] for r in results)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--bundle', action='store_true',
+                        help='also start from a bytecode bundle')
+    parser.add_argument('scripts', nargs='*',
+                        default=['subiquity-tui', 'console-conf-tui'])
+    opts = parser.parse_args()
+
+    env = dict(os.environ, TERM='linux')
+    env.pop(BUNDLE_ENV, None)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [TOPDIR] + [p for p in env.get('PYTHONPATH', '').split(os.pathsep)
+                    if p])
+    for script in opts.scripts:
+        # the first start warms the page cache and __pycache__
+        start_once(script, env, opts.timeout)
+        run(script, script, env, opts.rounds, opts.timeout)
+
+    if opts.bundle:
+        bundledir = tempfile.mkdtemp()
+        try:
+            bundle = os.path.join(bundledir, 'subiquity.zip')
+            build_bundle(bundle)
+            bundle_env = dict(env, PYTHONDONTWRITEBYTECODE='1')
+            bundle_env[BUNDLE_ENV] = bundle
+            for script in opts.scripts:
+                run(script + ' (bundle)', script, bundle_env, opts.rounds,
+                    opts.timeout)
+        finally:
+            shutil.rmtree(bundledir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
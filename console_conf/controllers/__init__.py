@@ -13,9 +13,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-""" console-conf controllers """
+""" console-conf controllers
 
-from .welcome import WelcomeController  # NOQA
-from subiquitycore.controllers.network import NetworkController  # NOQA
-from subiquitycore.controllers.login import LoginController  # NOQA
-from .identity import IdentityController  # NOQA
+Nothing is imported here: the application imports each controller
+module when the controller is first needed (see subiquitycore.core).
+"""
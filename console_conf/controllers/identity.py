@@ -18,7 +18,8 @@ import json
 from subiquitycore.controllers.identity import BaseIdentityController
 from subiquitycore.utils import disable_first_boot_service, run_command, mark_firstboot_complete
 
-from console_conf.ui.views import IdentityView, LoginView
+from console_conf.ui.views.identity import IdentityView
+from console_conf.ui.views.login import LoginView
 
 
 class IdentityController(BaseIdentityController):
@@ -14,7 +14,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from console_conf.ui.views import WelcomeView
+from console_conf.ui.views.welcome import WelcomeView
 
 from subiquitycore.controllers.welcome import (
     WelcomeController as WelcomeControllerBase,
@@ -23,6 +23,7 @@ log = logging.getLogger('console_conf.core')
 class ConsoleConf(Application):
 
     project = "console_conf"
+    probes = ["network"]
     controllers = [
         "Welcome",
         "Network",
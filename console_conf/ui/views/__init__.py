@@ -13,10 +13,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-""" ConsoleConf UI Views """
+""" ConsoleConf UI Views
 
-from .identity import IdentityView  # NOQA
-from .login import LoginView  # NOQA
-from .welcome import WelcomeView  # NOQA
-#from .network import NetworkView  # NOQA
-#from .network_configure_interface import NetworkConfigureInterfaceView  # NOQA
+Import views from their modules, so that showing one screen does not
+load all the others.
+"""
@@ -13,11 +13,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from subiquitycore.controllers.login import LoginController  # NOQA
-from subiquitycore.controllers.network import NetworkController  # NOQA
-from subiquitycore.controllers.welcome import WelcomeController  # NOQA
+""" Subiquity controllers
 
-from .identity import IdentityController  # NOQA
-from .installpath import InstallpathController  # NOQA
-from .installprogress import InstallProgressController  # NOQA
-from .filesystem import FilesystemController  # NOQA
+Nothing is imported here: the application imports each controller
+module when the controller is first needed (see subiquitycore.core).
+"""
@@ -17,7 +17,7 @@ import logging
 
 from subiquitycore.controller import BaseController
 
-from subiquity.models import CephDiskModel
+from subiquity.models.ceph_disk import CephDiskModel
 
 log = logging.getLogger("subiquitycore.controller.ceph")
 
@@ -16,19 +16,27 @@
 import logging
 import os
 
+from subiquitycore.answers import AnswersError
 from subiquitycore.controller import BaseController
 from subiquitycore.ui.dummy import DummyView
 from subiquitycore.ui.error import ErrorView
 from subiquitycore.curtin import (curtin_write_storage_actions,
                                   curtin_write_preserved_actions)
+from subiquitycore.sysfs import get_block_attributes
 
+from subiquity.models.actiongraph import ActionGraphError
 from subiquity.models.actions import preserve_action
-from subiquity.models import (FilesystemModel, RaidModel)
-from subiquity.models.filesystem import (_humanize_size)
-from subiquity.ui.views import (DiskPartitionView, AddPartitionView,
-                                AddFormatView, FilesystemView,
-                                DiskInfoView, RaidView, BcacheView,
-                                LVMVolumeGroupView)
+from subiquity.models.filesystem import (FilesystemModel,
+                                         _dehumanize_size,
+                                         _humanize_size)
+from subiquity.models.raid import RaidModel
+from subiquity.ui.views.bcache import BcacheView
+from subiquity.ui.views.filesystem import (DiskPartitionView,
+                                           AddPartitionView,
+                                           AddFormatView, FilesystemView,
+                                           DiskInfoView)
+from subiquity.ui.views.lvm import LVMVolumeGroupView
+from subiquity.ui.views.raid import RaidView
 
 
 log = logging.getLogger("subiquitycore.controller.filesystem")
@@ -36,6 +44,9 @@ log = logging.getLogger("subiquitycore.controller.filesystem")
 BIOS_GRUB_SIZE_BYTES = 2 * 1024 * 1024   # 2MiB
 UEFI_GRUB_SIZE_BYTES = 512 * 1024 * 1024  # 512MiB EFI partition
 
+# when the answers do not say how to partition
+DEFAULT_PARTITIONS = [{'fstype': 'ext4', 'mount': '/'}]
+
 
 class FilesystemController(BaseController):
     signals = [
@@ -65,33 +76,110 @@ class FilesystemController(BaseController):
         # self.iscsi_model = IscsiDiskModel()
         # self.ceph_model = CephDiskModel()
         self.raid_model = RaidModel()
+        # kept between visits, see FilesystemView.refresh()
+        self.fs_view = None
 
     def filesystem(self, reset=False):
         # FIXME: Is this the best way to zero out this list for a reset?
         if reset:
             log.info("Resetting Filesystem model")
             self.model.reset()
+            self.fs_view = None
 
         title = "Filesystem setup"
         footer = ("Select available disks to format and mount")
         self.ui.set_header(title)
         self.ui.set_footer(footer, 30)
-        self.ui.set_body(FilesystemView(self.model,
-                                        self.signal))
+        if not self.model.probed:
+            self.model.probe_storage()
+        if self.fs_view is None:
+            self.fs_view = FilesystemView(self.model, self.signal)
+        else:
+            self.fs_view.refresh()
+        self.ui.set_body(self.fs_view)
 
     default = filesystem
 
+    def unattended(self, answers):
+        if not self.model.probed:
+            self.model.probe_storage()
+        disk = answers.get('disk')
+        if disk is None:
+            available = self.model.get_available_disk_names()
+            if not available:
+                raise AnswersError('no disk to install to')
+            disk = available[0]
+        elif disk not in self.model.get_available_disk_names():
+            raise AnswersError('{} is not an available disk'.format(disk))
+        for partition in answers.get('partitions', DEFAULT_PARTITIONS):
+            self.answer_partition(disk, partition)
+        if not self.model.installable():
+            raise AnswersError('no partition is mounted at /')
+        # as FilesystemView.done
+        self.signal.emit_signal('filesystem:finish', False)
+
+    def answer_partition(self, disk, partition):
+        ''' Add `partition' to `disk' the way AddPartitionView does '''
+        current_disk = self.model.get_disk(disk)
+        freespace = int(current_disk.freespace)
+        size = freespace
+        if partition.get('size') is not None:
+            try:
+                size = _dehumanize_size(str(partition['size']))
+            except ValueError as e:
+                raise AnswersError(str(e))
+            if size > freespace:
+                # a different layout than asked for is no layout at all
+                raise AnswersError('{} partition does not fit on {}, '
+                                   '{} free'.format(partition['size'], disk,
+                                                    _humanize_size(freespace)))
+        if size <= 0:
+            raise AnswersError('no space left on {}'.format(disk))
+        result = {
+            "partnum": current_disk.lastpartnumber + 1,
+            "raw_size": _humanize_size(size),
+            "bytes": size,
+            "fstype": partition.get('fstype', 'ext4'),
+            "mountpoint": partition.get('mount'),
+        }
+        if result['fstype'] not in self.model.supported_filesystems:
+            raise AnswersError('unsupported filesystem {}'.format(
+                result['fstype']))
+        if result['fstype'] != 'swap':
+            try:
+                self.model.valid_mount(result)
+            except ValueError as e:
+                raise AnswersError('mount point {}: {}'.format(
+                    result['mountpoint'], e))
+        partitions = current_disk.lastpartnumber
+        self.signal.emit_signal('filesystem:finish-add-disk-partition',
+                                disk, result)
+        if current_disk.lastpartnumber == partitions:
+            raise AnswersError('could not add {} partition to {}'.format(
+                result['fstype'], disk))
+
     def filesystem_error(self, error_fname):
+        self.show_error("Failed to obtain write permissions to /tmp")
+
+    def show_error(self, error_msg):
         title = "Filesystem error"
         footer = ("Error while installing Ubuntu")
-        error_msg = "Failed to obtain write permissions to /tmp"
         self.ui.set_header(title)
         self.ui.set_footer(footer, 30)
         self.ui.set_body(ErrorView(self.signal, error_msg))
+        if self.answers is not None:
+            self.signal.emit_signal('unattended:failed',
+                                    '{}\n{}'.format(title, error_msg))
 
     def filesystem_handler(self, reset=False, actions=None):
-        if actions is None and reset is False:
-            self.signal.emit_signal('network:show')
+        if actions is None:
+            try:
+                actions = self.model.get_actions()
+            except ActionGraphError as e:
+                log.exception('Failed to order storage actions')
+                self.show_error(
+                    "The storage configuration is inconsistent: {}".format(e))
+                return None
 
         log.info("Rendering curtin config from user choices")
         try:
@@ -320,14 +408,10 @@ class FilesystemController(BaseController):
             bus = 'virtio'
 
         devpath = disk_info.raw.get('DEVPATH', disk.devpath)
-        rotational = '1'
-        try:
-            dev = os.path.basename(devpath)
-            rfile = '/sys/class/block/{}/queue/rotational'.format(dev)
-            rotational = open(rfile, 'r').read().strip()
-        except (PermissionError, FileNotFoundError, IOError):
-            log.exception('WARNING: Failed to read file {}'.format(rfile))
-            pass
+        rotational = get_block_attributes().get(devpath, 'rotational')
+        if rotational is None:
+            log.warning('no rotational attribute for {}'.format(devpath))
+            rotational = '1'
 
         dinfo = {
             'bus': bus,
@@ -16,7 +16,7 @@
 
 from subiquitycore.controllers.identity import BaseIdentityController
 
-from subiquity.ui.views import IdentityView
+from subiquity.ui.views.identity import IdentityView
 
 
 class IdentityController(BaseIdentityController):
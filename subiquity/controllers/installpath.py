@@ -18,8 +18,8 @@ import logging
 from subiquitycore.controller import BaseController
 from subiquitycore.ui.dummy import DummyView
 
-from subiquity.models import InstallpathModel
-from subiquity.ui.views import InstallpathView
+from subiquity.models.installpath import InstallpathModel
+from subiquity.ui.views.installpath import InstallpathView
 
 log = logging.getLogger('subiquity.controller.installpath')
 
@@ -53,6 +53,10 @@ class InstallpathController(BaseController):
 
     default = installpath
 
+    def unattended(self, answers):
+        # installing Ubuntu is the only path there is
+        self.signal.emit_signal('installpath:install-ubuntu')
+
     def install_ubuntu(self):
         log.debug("Installing Ubuntu path chosen.")
         self.signal.emit_signal('next-screen')
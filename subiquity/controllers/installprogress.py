@@ -15,7 +15,6 @@
 
 import logging
 import os
-import subprocess
 from tornado.gen import coroutine
 
 from subiquitycore import utils
@@ -24,10 +23,13 @@ from subiquitycore.curtin import (CURTIN_CONFIGS,
                                   CURTIN_INSTALL_LOG,
                                   CURTIN_POSTINSTALL_LOG,
                                   curtin_reboot,
-                                  curtin_install_cmd)
+                                  curtin_install_cmd,
+                                  curtin_write_reporting_config)
+from subiquitycore.logfollower import LogFollower
+from subiquitycore.reporting import CurtinEventReceiver
 
-from subiquity.models import InstallProgressModel
-from subiquity.ui.views import ProgressView
+from subiquity.models.installprogress import InstallProgressModel
+from subiquity.ui.views.installprogress import ProgressView
 
 
 log = logging.getLogger("subiquitycore.controller.installprogress")
@@ -49,6 +51,9 @@ class InstallProgressController(BaseController):
         self.progress_view = None
         self.alarm = None
         self.install_log = CURTIN_INSTALL_LOG
+        self.install_log_follower = LogFollower(self.install_log)
+        # only started along with curtin, see curtin_install()
+        self.event_receiver = CurtinEventReceiver(self.curtin_event)
 
         # state flags
         self.install_error = False
@@ -72,17 +77,32 @@ class InstallProgressController(BaseController):
                   self.postinstall_complete))
         return (self.install_complete and self.postinstall_complete)
 
-    def curtin_tail_install_log(self):
-        if os.path.exists(self.install_log):
-            tail_cmd = ['tail', '-n', '10', self.install_log]
-            log.debug('tail cmd: {}'.format(" ".join(tail_cmd)))
-            install_tail = subprocess.check_output(tail_cmd)
-            return install_tail
-        else:
-            log.debug(('Install log not yet present:') +
-                      '{}'.format(self.install_log))
+    def curtin_event(self, event):
+        self.model.event(event)
+        if self.progress_view is not None:
+            self.progress_view.update_progress()
 
-        return ''
+    def start_event_receiver(self):
+        if self.event_receiver.endpoint is not None:
+            return
+        try:
+            self.event_receiver.start()
+        except OSError:
+            log.exception('Failed to start curtin event receiver, '
+                          'progress will only show the install log')
+
+    def curtin_configs(self, *sections):
+        ''' The configs of `sections', plus the one pointing curtin at
+            the event receiver when it is running '''
+        configs = [CURTIN_CONFIGS[section] for section in sections]
+        if self.event_receiver.endpoint is not None:
+            curtin_write_reporting_config(self.event_receiver.endpoint)
+            configs.append(CURTIN_CONFIGS['reporting'])
+        return configs
+
+    def curtin_tail_install_log(self):
+        self.install_log_follower.poll()
+        return self.install_log_follower.tail()
 
     def curtin_error(self):
         log.debug('curtin_error')
@@ -93,6 +113,10 @@ class InstallProgressController(BaseController):
         errmsg = errmsg.replace("\'\'", "")
         errmsg = errmsg.replace("\\n\'\n", "\n")
         errmsg = errmsg.replace('\\n', '\n')
+        failed = self.model.failed_stage
+        if failed is not None:
+            errmsg = 'Failed stage: {} {}\n\n{}'.format(
+                failed.name, failed.description, errmsg)
         log.error(errmsg)
         title = ('An error occurred during installation')
         self.ui.set_header(title, 'Please report this error in Launchpad')
@@ -101,6 +125,9 @@ class InstallProgressController(BaseController):
         self.progress_view.show_finished_button()
         log.debug('curtin_error: refreshing final error screen')
         self.signal.emit_signal('refresh')
+        if self.answers is not None:
+            self.signal.emit_signal('unattended:failed',
+                                    '{}\n{}'.format(title, errmsg))
 
     @coroutine
     def curtin_install(self):
@@ -112,14 +139,15 @@ class InstallProgressController(BaseController):
             raise Exception('AIEEE!')
 
         self.install_spawned = True
+        self.model.reset()
+        self.start_event_receiver()
         if self.opts.dry_run:
             log.debug("Installprogress: this is a dry-run")
             curtin_cmd = ["top", "-d", "0.5", "-n", "20", "-b", "-p",
                           str(os.getpid()), ">", self.install_log]
         else:
             log.debug("Installprogress: this is the *REAL* thing")
-            configs = [CURTIN_CONFIGS['network'],
-                       CURTIN_CONFIGS['storage']]
+            configs = self.curtin_configs('network', 'storage')
             curtin_cmd = curtin_install_cmd(configs)
 
         log.debug('Curtin install cmd: {}'.format(curtin_cmd))
@@ -149,16 +177,15 @@ class InstallProgressController(BaseController):
 
         self.postinstall_spawned = True
         self.install_log = CURTIN_POSTINSTALL_LOG
+        self.install_log_follower.follow(self.install_log)
+        self.model.next_run('postinstall')
         if self.opts.dry_run:
             log.debug("Installprogress: this is a dry-run")
             curtin_cmd = ["top", "-d", "0.5", "-n", "20", "-b", "-p",
                           str(os.getpid()), ">", self.install_log]
         else:
             log.debug("Installprogress: this is the *REAL* thing")
-            configs = [
-                CURTIN_CONFIGS['postinstall'],
-                CURTIN_CONFIGS['preserved'],
-            ]
+            configs = self.curtin_configs('postinstall', 'preserved')
             curtin_cmd = curtin_install_cmd(configs)
 
         log.debug('Curtin postinstall cmd: {}'.format(curtin_cmd))
@@ -188,6 +215,10 @@ class InstallProgressController(BaseController):
             self.ui.set_footer("", 100)
             self.progress_view.show_finished_button()
             self.loop.remove_alarm(self.alarm)
+            self.install_log_follower.close()
+            self.event_receiver.stop()
+            if self.answers is not None:
+                self.unattended_finish()
             return
         elif (self.postinstall_config and
               self.install_complete and
@@ -196,13 +227,22 @@ class InstallProgressController(BaseController):
             self.signal.emit_signal('installprogress:curtin-postinstall')
         else:
             log.debug('progress_indicator: looping')
-            install_tail = self.curtin_tail_install_log()
-            self.progress_view.text.set_text(install_tail)
+            # only touch the view when the log moved on
+            if self.install_log_follower.poll():
+                self.progress_view.text.set_text(
+                    self.install_log_follower.tail())
 
         if not self.install_error:
             log.debug('progress_indicator: setting alarm')
             self.alarm = self.loop.set_alarm_in(0.3, self.progress_indicator)
 
+    def unattended_finish(self):
+        # nobody to press the finish button
+        if self.answers['InstallProgress'].get('reboot', False):
+            self.signal.emit_signal('installprogress:curtin-reboot')
+        else:
+            self.signal.emit_signal('quit')
+
     def reboot(self):
         if self.opts.dry_run:
             log.debug('dry-run enabled, skipping reboot, quiting instead')
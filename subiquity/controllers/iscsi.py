@@ -17,7 +17,7 @@ import logging
 
 from subiquitycore.controller import BaseController
 
-from subiquity.models import IscsiDiskModel
+from subiquity.models.iscsi_disk import IscsiDiskModel
 
 log = logging.getLogger("subiquitycore.controller.iscsi")
 
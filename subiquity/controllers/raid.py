@@ -17,7 +17,7 @@ import logging
 
 from subiquitycore.controller import BaseController
 
-from subiquity.models import RaidDiskModel
+from subiquity.models.raid import RaidDiskModel
 
 log = logging.getLogger("subiquitycore.controller.raid")
 
@@ -13,7 +13,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .installpath import InstallpathModel  # NOQA
-from .installprogress import InstallProgressModel  # NOQA
-from .filesystem import FilesystemModel  # NOQA
-from .raid import RaidModel  # NOQA
+""" Subiquity models
+
+Import models from their modules, so that a controller only loads the
+models it uses.
+"""
@@ -0,0 +1,147 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Action graph
+
+Orders curtin storage actions so that every action comes after the
+actions it refers to (a partition after its disk, a raid after its
+members, a mount after its format and after the mount of its parent
+directory).  Among the actions that are ready, the one earliest in
+TYPE_ORDER goes first, then the one given first, so the output looks
+like it always has: disks, partitions, ..., formats, mounts.
+"""
+
+from collections import deque
+import logging
+import os
+
+log = logging.getLogger("subiquity.models.actiongraph")
+
+TYPE_ORDER = ['disk', 'partition', 'raid', 'bcache', 'lvm_volgroup',
+              'lvm_partition', 'format', 'mount']
+
+# keys of an action holding the id (or list of ids) of other actions
+REFERENCE_KEYS = ['device', 'volume', 'devices', 'spare_devices',
+                  'backing_device', 'cache_device', 'volgroup']
+
+
+class ActionGraphError(ValueError):
+    pass
+
+
+def action_references(action):
+    ''' ids of the actions `action' refers to '''
+    refs = []
+    for key in REFERENCE_KEYS:
+        value = action.get(key)
+        if not value:
+            continue
+        if isinstance(value, str):
+            refs.append(value)
+        else:
+            refs.extend(value)
+    return refs
+
+
+def _parent_mount(path, mounts):
+    ''' the index in `mounts' of the closest mount above `path' '''
+    while path != '/':
+        path = os.path.dirname(path)
+        if path in mounts:
+            return mounts[path]
+    return None
+
+
+class ActionGraph():
+    ''' Dependency graph of a list of curtin actions.
+
+        Raises ActionGraphError on duplicate ids and references to
+        actions that are not in the list.
+    '''
+
+    def __init__(self, actions):
+        self.actions = list(actions)
+        self.ids = {}
+        for (i, action) in enumerate(self.actions):
+            action_id = action.get('id')
+            if action_id in self.ids:
+                raise ActionGraphError(
+                    'duplicate action id {}'.format(action_id))
+            self.ids[action_id] = i
+
+        # dependents[i]: actions that must come after action i
+        self.dependents = [[] for _ in self.actions]
+        self.indegree = [0] * len(self.actions)
+        mounts = {}
+        for (i, action) in enumerate(self.actions):
+            for ref in action_references(action):
+                if ref not in self.ids:
+                    raise ActionGraphError(
+                        'action {} refers to unknown action {}'.format(
+                            action.get('id'), ref))
+                self._add_edge(self.ids[ref], i)
+            if action.get('type') == 'mount' and action.get('path'):
+                path = os.path.normpath(action['path'])
+                mounts.setdefault(path, i)
+        for (path, i) in mounts.items():
+            parent = _parent_mount(path, mounts)
+            if parent is not None:
+                self._add_edge(parent, i)
+
+    def _add_edge(self, before, after):
+        self.dependents[before].append(after)
+        self.indegree[after] += 1
+
+    def _rank(self, i):
+        action_type = self.actions[i].get('type')
+        if action_type in TYPE_ORDER:
+            return TYPE_ORDER.index(action_type)
+        return len(TYPE_ORDER)
+
+    def order(self):
+        ''' The actions in dependency order.  Raises ActionGraphError if
+            some actions depend on each other. '''
+        indegree = list(self.indegree)
+        ranks = [self._rank(i) for i in range(len(self.actions))]
+        ready = [deque() for _ in range(len(TYPE_ORDER) + 1)]
+        for (i, degree) in enumerate(indegree):
+            if degree == 0:
+                ready[ranks[i]].append(i)
+
+        ordered = []
+        rank = 0
+        while rank < len(ready):
+            if not ready[rank]:
+                rank += 1
+                continue
+            i = ready[rank].popleft()
+            ordered.append(self.actions[i])
+            for j in self.dependents[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    ready[ranks[j]].append(j)
+                    rank = min(rank, ranks[j])
+
+        if len(ordered) < len(self.actions):
+            cycle = [self.actions[i].get('id')
+                     for (i, degree) in enumerate(indegree) if degree > 0]
+            raise ActionGraphError(
+                'actions depend on each other: {}'.format(cycle))
+        log.debug('ordered {} actions'.format(len(ordered)))
+        return ordered
+
+
+def order_actions(actions):
+    return ActionGraph(actions).order()
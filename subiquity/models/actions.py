@@ -198,10 +198,11 @@ class LVMPartitionAction(DiskAction):
 
 
 class PartitionAction(DiskAction):
-    def __init__(self, parent, partnum, offset, size, flags=None):
+    ''' A partition of `size' bytes.  Where it goes on the disk is up to
+        the Blockdev holding it, which adds the offset to get(). '''
+    def __init__(self, parent, partnum, size, flags=None):
         self.parent = parent
         self.partnum = int(partnum)
-        self._offset = int(offset)
         self._size = int(size)
         self.flags = flags
         self._type = 'partition'
@@ -219,7 +220,6 @@ class PartitionAction(DiskAction):
             return (self._action_id == other._action_id and
                     self.parent == other.parent and
                     self.partnum == other.partnum and
-                    self._offset == other._offset and
                     self._size == other._size and
                     self.flags == other.flags and
                     self._type == other._type)
@@ -238,10 +238,6 @@ class PartitionAction(DiskAction):
     def size(self):
         return self._size
 
-    @property
-    def offset(self):
-        return self._offset
-
     def get(self):
         return {
             'device': self.parent.action_id,
@@ -249,7 +245,6 @@ class PartitionAction(DiskAction):
             'id': self.action_id,
             'number': self.partnum,
             'size': '{}B'.format(self.size),
-            'offset': '{}B'.format(self.offset),
             'type': self._type,
         }
 
@@ -13,12 +13,17 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from bisect import bisect_left, bisect_right, insort
 from collections import OrderedDict
 import logging
 import os
 import re
 import yaml
 
+from subiquitycore.log import lazy
+from subiquitycore.mounts import get_mount_table
+from subiquitycore.sysfs import get_block_attributes
+
 from .actions import (
     BcacheAction,
     DiskAction,
@@ -28,10 +33,12 @@ from .actions import (
     MountAction,
     RaidAction,
 )
+from .actiongraph import order_actions
 
 log = logging.getLogger("subiquity.filesystem.blockdev")
 FIRST_PARTITION_OFFSET = 1 << 20  # 1K offset/aligned
 GPT_END_RESERVE = 1 << 20  # save room at the end for GPT
+PARTITION_ALIGNMENT = 1 << 20  # unless the device prefers bigger I/O
 
 
 # round up length by 1M
@@ -39,6 +46,130 @@ def blockdev_align_up(size, block_size=1 << 30):
     return size + (block_size - (size % block_size))
 
 
+def _gcd(a, b):
+    while b:
+        (a, b) = (b, a % b)
+    return a
+
+
+class ExtentAllocator():
+    ''' Sector accurate free space of a device of `sectors' logical
+        sectors, of which only [first, last) can be allocated.
+
+        Free extents are (start, length) in sectors.  They are indexed
+        both by start (placement, merging on release) and by
+        (length, start) (best-fit, largest-gap), so finding the extent
+        to use is a bisect rather than a walk; first-fit still has to
+        walk the gaps in disk order.  Partitions start on multiples of
+        `alignment' sectors, and lengths are rounded up to it unless
+        that would run past the end of the gap.
+    '''
+
+    STRATEGIES = ('first-fit', 'best-fit', 'largest-gap')
+
+    def __init__(self, sectors, first=0, last=None, alignment=1):
+        self.sectors = sectors
+        self.first = first
+        self.last = sectors if last is None else last
+        self.alignment = max(alignment, 1)
+        self.reset()
+
+    def reset(self):
+        # sorted starts, start -> length and sorted (length, start)
+        self._starts = []
+        self._lengths = {}
+        self._by_size = []
+        self.used = 0
+        if self.last > self.first:
+            self._add(self.first, self.last - self.first)
+
+    def _add(self, start, length):
+        insort(self._starts, start)
+        self._lengths[start] = length
+        insort(self._by_size, (length, start))
+
+    def _remove(self, start):
+        length = self._lengths.pop(start)
+        del self._starts[bisect_left(self._starts, start)]
+        del self._by_size[bisect_left(self._by_size, (length, start))]
+        return length
+
+    @property
+    def free(self):
+        return [(start, self._lengths[start]) for start in self._starts]
+
+    @property
+    def free_sectors(self):
+        return self.last - self.first - self.used
+
+    @property
+    def largest_free(self):
+        ''' sectors available to the biggest aligned allocation '''
+        best = 0
+        for (length, start) in reversed(self._by_size):
+            if length <= best:
+                break
+            best = max(best, start + length - self.align_up(start))
+        return best
+
+    def align_up(self, sector):
+        return -(-sector // self.alignment) * self.alignment
+
+    def find(self, length, strategy='first-fit'):
+        ''' Find room for `length' sectors.  Returns (gap start,
+            aligned start) or None. '''
+        if strategy == 'first-fit':
+            candidates = self._starts
+        elif strategy == 'best-fit':
+            idx = bisect_left(self._by_size, (length, -1))
+            candidates = (self._by_size[i][1]
+                          for i in range(idx, len(self._by_size)))
+        elif strategy == 'largest-gap':
+            idx = bisect_left(self._by_size, (length, -1))
+            candidates = (self._by_size[i][1]
+                          for i in range(len(self._by_size) - 1, idx - 1, -1))
+        else:
+            raise ValueError('Unknown allocation strategy {}'.format(
+                             strategy))
+        for start in candidates:
+            aligned = self.align_up(start)
+            if aligned + length <= start + self._lengths[start]:
+                return (start, aligned)
+        return None
+
+    def allocate(self, start, length):
+        ''' mark `length' sectors from `start' allocated, they must be
+            free '''
+        idx = bisect_right(self._starts, start) - 1
+        if idx >= 0:
+            fstart = self._starts[idx]
+            fend = fstart + self._lengths[fstart]
+        if idx < 0 or start + length > fend:
+            raise ValueError('{} sectors at {} are not free'.format(
+                             length, start))
+        self._remove(fstart)
+        if start > fstart:
+            self._add(fstart, start - fstart)
+        if fend > start + length:
+            self._add(start + length, fend - start - length)
+        self.used += length
+
+    def release(self, start, length):
+        ''' mark `length' sectors from `start' free again '''
+        end = start + length
+        # merge with the extents either side
+        if end in self._lengths:
+            end += self._remove(end)
+        idx = bisect_left(self._starts, start)
+        if idx > 0:
+            prev = self._starts[idx - 1]
+            if prev + self._lengths[prev] == start:
+                self._remove(prev)
+                start = prev
+        self._add(start, end - start)
+        self.used -= length
+
+
 class Disk():
     def __init__(self, devpath, serial, model, parttype, size=0):
         self._devpath = devpath
@@ -47,6 +178,8 @@ class Disk():
         self._model = model
         self._size = self._get_size(devpath, size)
         self._partitions = OrderedDict()
+        (self._logical_block_size,
+         self._optimal_io_size) = self._get_io_sizes(devpath)
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
@@ -68,20 +201,25 @@ class Disk():
     def _get_size(self, devpath, size):
         if size:
             return size
-        sysblock = os.path.join('/sys/block', os.path.basename(devpath))
-        nr_blocks_f = os.path.join(sysblock, 'size')
-        block_sz_f = os.path.join(sysblock, 'queue', 'logical_block_size')
+        attrs = get_block_attributes().device(devpath)
 
-        if not os.path.exists(sysblock):
+        if 'size' not in attrs:
             log.warn('disk at devpath:{} not present'.format(devpath))
             return 0
 
-        with open(nr_blocks_f, 'r') as r:
-            nr_blocks = int(r.read())
-        with open(block_sz_f, 'r') as r:
-            block_sz = int(r.read())
+        # sysfs sizes are always in 512 byte sectors
+        return int(attrs['size']) * 512
 
-        return nr_blocks * block_sz
+    def _get_io_sizes(self, devpath):
+        attrs = get_block_attributes().device(devpath)
+        sizes = []
+        for (attr, default) in [('logical_block_size', 512),
+                                ('optimal_io_size', 0)]:
+            try:
+                sizes.append(int(attrs.get(attr, default)) or default)
+            except ValueError:
+                sizes.append(default)
+        return sizes
 
     def __repr__(self):
         o = {
@@ -114,6 +252,26 @@ class Disk():
     def size(self):
         return self._size
 
+    @property
+    def logical_block_size(self):
+        return self._logical_block_size
+
+    @property
+    def optimal_io_size(self):
+        return self._optimal_io_size
+
+    @property
+    def alignment(self):
+        ''' partition alignment in bytes: 1M, or a multiple of the
+            optimal I/O size (e.g. a RAID stripe) if there is one '''
+        alignment = PARTITION_ALIGNMENT
+        if self.optimal_io_size:
+            alignment = (alignment * self.optimal_io_size //
+                         _gcd(alignment, self.optimal_io_size))
+        # a whole number of sectors
+        return alignment - alignment % self.logical_block_size or \
+            self.logical_block_size
+
     @property
     def partitions(self):
         return self._partitions
@@ -130,6 +288,11 @@ class Blockdev():
         self._mounts = {}
         self._mountactions = {}
         self._tag = ''
+        self._listeners = []
+        self._allocations = self._make_allocator()
+        # partnum -> (start, length) in sectors, see self._allocations
+        self._extents = {}
+        self.allocation_strategy = 'first-fit'
         self.bcache = []
         self.lvm = []
         self.baseaction = DiskAction(os.path.basename(self.disk.devpath),
@@ -156,6 +319,14 @@ class Blockdev():
     def __repr__(self):
         return str(self.get_actions())
 
+    def _make_allocator(self):
+        sector = self.disk.logical_block_size
+        return ExtentAllocator(self.disk.size // sector,
+                               first=FIRST_PARTITION_OFFSET // sector,
+                               last=(self.disk.size - GPT_END_RESERVE) //
+                               sector,
+                               alignment=self.disk.alignment // sector)
+
     def reset(self):
         ''' Wipe out any actions queued for this disk '''
         self.disk.reset()
@@ -165,6 +336,18 @@ class Blockdev():
         self.bcache = []
         self.lvm = []
         self.tag = ''
+        self._allocations.reset()
+        self._extents = {}
+        self._notify()
+
+    def add_listener(self, callback):
+        ''' call `callback(blockdev)' whenever the partitions, filesystems
+            or mounts of this device change '''
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback(self)
 
     @property
     def id(self):
@@ -254,20 +437,17 @@ class Blockdev():
     @property
     def usedspace(self, unit='b'):
         ''' return amount of used space'''
-        space = 0
         if self.devpath in self.filesystems:
-            space = self.size
-        else:
-            for (num, action) in self.disk.partitions.items():
-                space += int(action.offset)
-                space += int(action.size)
-
-        return space
+            return self.size
+        return self._allocations.used * self.disk.logical_block_size
 
     @property
     def freespace(self, unit='B'):
-        ''' return amount of free space '''
-        return self.size - self.usedspace
+        ''' return amount of space that can still be partitioned '''
+        if self.devpath in self.filesystems:
+            return 0
+        return (self._allocations.free_sectors *
+                self.disk.logical_block_size)
 
     @property
     def lastpartnumber(self):
@@ -280,51 +460,108 @@ class Blockdev():
     def set_tag(self, tag):
         self._tag = tag
 
-    def delete_partition(self, partnum=None, sector=None, mountpoint=None):
-        # find part and then call deletePartition()
-        # find and remove from self.fstable
-        pass
+    def _find_partnum(self, partnum, sector, mountpoint):
+        if partnum is not None:
+            return int(partnum)
+        for (num, (start, length)) in self._extents.items():
+            if sector is not None and start <= sector < start + length:
+                return num
+            partpath = "{}{}".format(self.disk.devpath, num)
+            if mountpoint is not None and \
+               self._mounts.get(partpath) == mountpoint:
+                return num
+        return None
 
-    def add_partition(self, partnum, size, fstype, mountpoint=None, flag=None):
-        ''' add a new partition to this disk '''
+    def delete_partition(self, partnum=None, sector=None, mountpoint=None):
+        ''' delete the partition numbered `partnum', or the one holding
+            (logical) `sector', or the one mounted at `mountpoint',
+            together with its filesystem and mount.  Returns the number
+            of bytes freed.
+        '''
+        log.debug('delete_partition: partnum:%s sector:%s mountpoint:%s',
+                  partnum, sector, mountpoint)
+        num = self._find_partnum(partnum, sector, mountpoint)
+        if num not in self.disk.partitions:
+            raise ValueError('No such partition on {} (partnum:{} sector:{} '
+                             'mountpoint:{})'.format(self.devpath, partnum,
+                                                     sector, mountpoint))
+
+        del self.disk.partitions[num]
+        partpath = "{}{}".format(self.disk.devpath, num)
+        self._filesystems.pop(partpath, None)
+        self._mounts.pop(partpath, None)
+        self._mountactions.pop(partpath, None)
+        (start, length) = self._extents.pop(num)
+        self._allocations.release(start, length)
+
+        log.debug('Partition Deleted')
+        self._notify()
+        return length * self.disk.logical_block_size
+
+    def add_partition(self, partnum, size, fstype, mountpoint=None, flag=None,
+                      strategy=None):
+        ''' add a new partition of `size' bytes to this disk, in a gap
+            picked by `strategy' (self.allocation_strategy by default).
+            Returns the number of bytes of freespace consumed, including
+            the padding needed to align it. '''
         log.debug('add_partition:'
-                  ' partnum:%s size:%s fstype:%s mountpoint:%s flag=%s' % (
-                      partnum, size, fstype, mountpoint, flag))
-
-        if size > self.freespace:
-            raise Exception('Not enough space (requested:{} free:{}'.format(
-                            size, self.freespace))
+                  ' partnum:%s size:%s fstype:%s mountpoint:%s flag=%s',
+                  partnum, size, fstype, mountpoint, flag)
 
         # ensure we always use integers for partitions
         partnum = int(partnum)
 
-        if len(self.disk.partitions) == 0:
-            offset = FIRST_PARTITION_OFFSET
+        allocations = self._allocations
+        # redefining a partition gives its space back first
+        released = self._extents.pop(partnum, None)
+        if released is not None:
+            allocations.release(*released)
+
+        sector = self.disk.logical_block_size
+        strategy = strategy or self.allocation_strategy
+        needed = -(-int(size) // sector)
+        log.debug('Aligning start and length on %s boundaries',
+                  self.disk.alignment)
+        for length in [allocations.align_up(needed), needed]:
+            found = allocations.find(length, strategy)
+            if found is not None:
+                break
         else:
-            offset = 0
-
-        log.debug('Aligning start and length on 1M boundaries')
-        new_size = blockdev_align_up(size + offset)
-        if new_size > self.freespace - GPT_END_RESERVE:
-            new_size = self.freespace - GPT_END_RESERVE
-        log.debug('Old size: {} New size: {}'.format(size, new_size))
-
-        log.debug('requested start: {} length: {}'.format(offset,
-                                                          new_size - offset))
+            # asking for all of a gap only loses the padding needed to
+            # align its start; anything bigger does not fit
+            length = allocations.largest_free
+            largest_gap = max([0] + [gap_length for (_, gap_length)
+                                     in allocations.free])
+            if length == 0 or needed > largest_gap:
+                if released is not None:
+                    allocations.allocate(*released)
+                    self._extents[partnum] = released
+                raise Exception(
+                    'Not enough space (requested:{} largest free:{})'.format(
+                        size, length * sector))
+            found = allocations.find(length, 'largest-gap')
+        (gap, start) = found
+
+        log.debug('Old size: %s New size: %s', size, length * sector)
+
+        log.debug('requested start: %s length: %s', start * sector,
+                  length * sector)
         # create partition and add
         part_action = PartitionAction(self.baseaction, partnum,
-                                      offset, new_size - offset, flag)
+                                      length * sector, flag)
 
-        log.debug('PartitionAction:\n{}'.format(part_action.get()))
+        log.debug('PartitionAction:\n%s', lazy(part_action.get))
 
         self.disk.partitions.update({partnum: part_action})
+        allocations.allocate(start, length)
+        self._extents[partnum] = (start, length)
         partpath = "{}{}".format(self.disk.devpath, partnum)
 
         # record filesystem formating
         if fstype and fstype not in ['leave unformatted']:
             fs_action = FormatAction(part_action, fstype)
-            log.debug('Adding filesystem on {}'.format(partpath))
-            log.debug('FormatAction:\n{}'.format(fs_action.get()))
+            log.debug('Adding filesystem on %s', partpath)
+            log.debug('FormatAction:\n%s', lazy(fs_action.get))
             self.filesystems.update({partpath: fs_action})
 
         # associate partition devpath with mountpoint
@@ -333,7 +570,9 @@ class Blockdev():
             self._mountactions[partpath] = MountAction(fs_action, mountpoint)
 
         log.debug('Partition Added')
-        return new_size
+        self._notify()
+        # the padding in front of it is left too small to use
+        return (start + length - gap) * sector
 
     def clear_ptable(self):
         ''' clear any partition table setting on underlying device '''
@@ -341,49 +580,32 @@ class Blockdev():
             self.baseaction.clear_ptable()
 
     def format_device(self, fstype, mountpoint):
-        log.debug('format:' ' fstype:%s mountpoint:%s' % (
-                  fstype, mountpoint))
+        log.debug('format: fstype:%s mountpoint:%s', fstype, mountpoint)
 
         mntdev = self.devpath
 
         # create partition and add
         fs_action = FormatAction(self.baseaction, fstype)
-        log.debug('Adding filesystem on {}'.format(mntdev))
-        log.debug('FormatAction:\n{}'.format(fs_action.get()))
+        log.debug('Adding filesystem on %s', mntdev)
+        log.debug('FormatAction:\n%s', lazy(fs_action.get))
         self.filesystems.update({mntdev: fs_action})
 
         # associate partition devpath with mountpoint
         if mountpoint:
             self._mounts[mntdev] = mountpoint
             self._mountactions[mntdev] = MountAction(fs_action, mountpoint)
-            log.debug('Mounting {} at {}'.format(mntdev, mountpoint))
+            log.debug('Mounting %s at %s', mntdev, mountpoint)
 
         # remove any partition table
         self.clear_ptable()
+        self._notify()
 
     def get_partition(self, devpath):
         [partnum] = re.findall('\d+$', devpath)
         return self.disk.partitions[int(partnum)]
 
     def is_mounted(self):
-        with open('/proc/mounts') as pm:
-            mounts = pm.read()
-
-        # collect any /dev/* device and use
-        # dict to uniq the list of devices mounted
-        mounted_devs = {}
-        for mnt in re.findall('/dev/.*', mounts):
-            (devpath, mount, *_) = mnt.split()
-            # resolve any symlinks
-            mounted_devs.update(
-                {os.path.realpath(devpath): mount})
-
-        matches = [dev for dev in mounted_devs.keys()
-                   if dev.startswith(self.disk.devpath)]
-        if len(matches) > 0:
-            return True
-
-        return False
+        return get_mount_table().is_mounted(self.disk.devpath)
 
     def get_actions(self):
         if self.is_mounted():
@@ -393,15 +615,36 @@ class Blockdev():
 
         actions = []
         action = self.baseaction.get()
-        part_actions = [part.get() for (num, part) in
-                        self.disk.partitions.items()]
+        # curtin places each partition `offset' bytes after the one it
+        # gets before, so emit them in disk order
+        offsets = self.partition_offsets()
+        part_actions = []
+        for num in sorted(offsets, key=lambda num: self._extents[num]):
+            part_action = self.disk.partitions[num].get()
+            part_action['offset'] = '{}B'.format(offsets[num])
+            part_actions.append(part_action)
         fs_actions = [fs.get() for fs in self.filesystems.values()]
         mount_actions = [m.get() for m in self._mountactions.values()]
         actions = [action] + part_actions + fs_actions + mount_actions
-        log.debug('actions ({}):\n{}'.format(len(actions), actions))
+        log.debug('actions (%d):\n%s', len(actions), actions)
 
         return actions
 
+    def partition_offsets(self):
+        ''' partnum -> bytes between the partition and the one before it
+            on the disk (or the start of the disk), worked out from where
+            the partitions are now, as deleting one moves that space
+            to the next '''
+        sector = self.disk.logical_block_size
+        offsets = {}
+        previous_end = 0
+        for (start, length, num) in sorted(
+                (start, length, num)
+                for (num, (start, length)) in self._extents.items()):
+            offsets[num] = (start - previous_end) * sector
+            previous_end = start + length
+        return offsets
+
     def get_fs_table(self):
         ''' list(mountpoint, size, fstype, partition_path) '''
         fs_table = []
@@ -476,35 +719,7 @@ class Bcachedev(Blockdev):
 
 
 def sort_actions(actions):
-    def type_index(t):
-        order = ['disk', 'partition', 'raid', 'bcache', 'lvm_volgroup',
-                 'lvm_partition', 'format', 'mount']
-        return order.index(t.get('type'))
-
-    def path_count(p):
-        if p.get('path') == "/":
-            return 0
-        else:
-            return p.get('path').count('/')
-
-    def order_sort(a):
-        # sort by type first
-        score = type_index(a)
-        # for type==mount, count the number of dirs
-        if a.get('type') == 'mount':
-            score += path_count(a)
-        elif (a.get('type') == 'partition' and
-              a.get('id').startswith('md')):
-            score += 2
-        log.debug('a={} score={}'.format(a, score))
-        return score
-
-    log.debug(actions)
-    actions = sorted(actions, key=order_sort)
-    log.debug('sorted')
-    log.debug(actions)
-
-    return actions
+    return order_actions(actions)
 
 
 if __name__ == '__main__':
@@ -13,13 +13,17 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from bisect import insort
+from collections import namedtuple
 import json
 import logging
 import math
 import os
 import re
 
+from subiquitycore.log import lazy
 from subiquitycore.model import BaseModel
+from subiquitycore.mounts import get_mount_table
 
 from .blockdev import (Bcachedev,
                        Blockdev,
@@ -37,6 +41,12 @@ class AttrDict(dict):
     __setattr__ = dict.__setitem__
 
 
+# What the model's indexes hold for one disk, see _index_disk()
+DiskIndex = namedtuple('DiskIndex', ['available', 'used', 'installable',
+                                     'empty_partitions', 'flagged',
+                                     'mounts'])
+
+
 class FilesystemModel(BaseModel):
     """ Model representing storage options
     """
@@ -94,6 +104,10 @@ class FilesystemModel(BaseModel):
         self.storage = {}
         self.holders = {}
         self.tags = {}
+        self.probed = False
+        # bumped on every change, see changed_disks()
+        self.generation = 0
+        self._reset_indexes()
 
     def reset(self):
         log.debug('FilesystemModel: resetting disks')
@@ -104,6 +118,111 @@ class FilesystemModel(BaseModel):
         self.lvm_devices = {}
         self.holders = {}
         self.tags = {}
+        self.probed = False
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        ''' The indexes answer the get_*_disks() style queries without
+            walking every disk and partition.  Blockdevs report their
+            changes, the model marks the disk dirty and dirty disks are
+            re-indexed on the next query.  A change of the host's mount
+            table makes every disk dirty.  Views use changed_disks() to
+            redraw only the disks that changed. '''
+        # sorted names of all disks, self.devices + self.info
+        self._disk_names = []
+        self._disk_name_set = set()
+        self._dirty = set()
+        # devpath -> self.generation when it last changed
+        self._changed = {}
+        self._mount_generation = None
+        # disk devpath -> DiskIndex
+        self._indexed = {}
+        # disks by state
+        self._available = set()
+        self._used = set()
+        self._installable = set()
+        # partition flag -> partition devpaths
+        self._flagged = {}
+        # mountpoint -> devpaths of the disks mounting something there
+        self._mountpoints = {}
+
+    def _add_disk_name(self, devpath):
+        if devpath not in self._disk_name_set:
+            self._disk_name_set.add(devpath)
+            insort(self._disk_names, devpath)
+            self._mark_dirty(devpath)
+
+    def _mark_dirty(self, devpath):
+        self._dirty.add(devpath)
+        self.generation += 1
+        self._changed[devpath] = self.generation
+
+    def _disk_changed(self, disk):
+        self._mark_dirty(disk.devpath)
+
+    def _unindex_disk(self, devpath):
+        entry = self._indexed.pop(devpath, None)
+        if entry is None:
+            return
+        self._available.discard(devpath)
+        self._used.discard(devpath)
+        self._installable.discard(devpath)
+        for (flag, partitions) in entry.flagged.items():
+            self._flagged[flag].difference_update(partitions)
+        for mountpoint in entry.mounts:
+            self._mountpoints[mountpoint].remove(devpath)
+            if not self._mountpoints[mountpoint]:
+                del self._mountpoints[mountpoint]
+
+    def _index_disk(self, devpath):
+        self._unindex_disk(devpath)
+        disk = self.get_disk(devpath)
+        available = disk.available
+        flagged = {}
+        for (num, action) in disk.partitions.items():
+            partpath = '{}{}'.format(devpath, num)
+            flagged.setdefault(action.flags, []).append(partpath)
+        entry = DiskIndex(
+            available=available and len(self.get_holders(devpath)) == 0,
+            used=available is False,
+            installable=disk.usedspace > 0 and "/" in disk.mounts,
+            empty_partitions=disk.available_partitions,
+            flagged=flagged,
+            mounts=list(disk.mounts))
+        self._indexed[devpath] = entry
+        if entry.available:
+            self._available.add(devpath)
+        if entry.used:
+            self._used.add(devpath)
+        if entry.installable:
+            self._installable.add(devpath)
+        for (flag, partitions) in flagged.items():
+            self._flagged.setdefault(flag, set()).update(partitions)
+        for mountpoint in entry.mounts:
+            self._mountpoints.setdefault(mountpoint, []).append(devpath)
+
+    def _refresh_indexes(self):
+        generation = get_mount_table().refresh()
+        if generation != self._mount_generation:
+            self._mount_generation = generation
+            for devpath in self._disk_names:
+                self._mark_dirty(devpath)
+        if not self._dirty:
+            return
+        dirty = self._dirty & self._disk_name_set
+        self._dirty = set()
+        log.debug('re-indexing disks: {}'.format(sorted(dirty)))
+        for devpath in dirty:
+            self._index_disk(devpath)
+
+    def changed_disks(self, since):
+        ''' The devpaths of the disks that changed after generation
+            `since', in disk order, and the current generation to pass
+            next time.  Pass 0 to get every disk. '''
+        self._refresh_indexes()
+        changed = [devpath for devpath in self._disk_names
+                   if self._changed.get(devpath, 0) > since]
+        return (changed, self.generation)
 
     def get_menu(self):
         return self.fs_menu
@@ -111,7 +230,7 @@ class FilesystemModel(BaseModel):
     def probe_storage(self):
         log.debug('model.probe_storage: probing storage')
         self.storage = self.prober.get_storage()
-        log.debug('got storage:\n{}'.format(self.storage))
+        log.debug('got storage:\n%s', lazy(str, self.storage))
         # TODO: Put this into a logging namespace for probert
         #       since its quite a bit of log information.
         # log.debug('storage probe data:\n{}'.format(
@@ -123,15 +242,17 @@ class FilesystemModel(BaseModel):
         for disk in self.storage.keys():
             if self.storage[disk]['DEVTYPE'] == 'disk' and \
                self.storage[disk]['MAJOR'] in VALID_MAJORS:
-                log.debug('disk={}\n{}'.format(disk,
-                          json.dumps(self.storage[disk], indent=4,
-                                     sort_keys=True)))
+                log.debug('disk=%s\n%s', disk,
+                          lazy(json.dumps, self.storage[disk], indent=4,
+                               sort_keys=True))
                 self.info[disk] = self.prober.get_storage_info(disk)
+                self._add_disk_name(disk)
+        self.probed = True
 
     def get_disk(self, disk):
         '''get disk object given path.  If provided a partition, then
          return the parent disk.  /dev/sda2 --> /dev/sda obj'''
-        log.debug('probe_storage: get_disk({})'.format(disk))
+        log.debug('probe_storage: get_disk(%s)', disk)
 
         if not disk.startswith('/dev/'):
             disk = os.path.join('/dev', disk)
@@ -141,6 +262,8 @@ class FilesystemModel(BaseModel):
                 self.devices[disk] = Blockdev(disk, self.info[disk].serial,
                                               self.info[disk].model,
                                               size=self.info[disk].size)
+                self.devices[disk].add_listener(self._disk_changed)
+                self._add_disk_name(disk)
             except KeyError:
                 ''' if it looks like a partition, try again with
                     parent device '''
@@ -151,17 +274,15 @@ class FilesystemModel(BaseModel):
 
     def get_available_disks(self):
         ''' currently only returns available disks '''
-        disks = [d for d in self.get_all_disks()
-                 if (d.available and
-                     len(self.get_holders(d.devpath)) == 0)]
+        self._refresh_indexes()
+        disks = [self.devices[d] for d in self._disk_names
+                 if d in self._available]
         log.debug('get_available_disks -> {}'.format(
                   ",".join([d.devpath for d in disks])))
         return disks
 
     def get_all_disks(self):
-        possible_devices = list(set(list(self.devices.keys()) +
-                                    list(self.info.keys())))
-        possible_disks = [self.get_disk(d) for d in sorted(possible_devices)]
+        possible_disks = [self.get_disk(d) for d in self._disk_names]
         log.debug('get_all_disks -> {}'.format(",".join([d.devpath for d in
                                                          possible_disks])))
         return possible_disks
@@ -245,6 +366,7 @@ class FilesystemModel(BaseModel):
                 raid_devices.append(raiddev)
             else:
                 spare_devices.append(raiddev)
+            self._disk_changed(disk)
 
         # auto increment md number based in registered devices
         raid_shortname = 'md{}'.format(len(self.raid_devices))
@@ -333,6 +455,7 @@ class FilesystemModel(BaseModel):
                 pv_dev = disk
 
             lvm_devices.append(pv_dev)
+            self._disk_changed(disk)
 
         lvm_size = sum([pv.size for pv in lvm_devices])
         lvm_device_names = [pv.id for pv in lvm_devices]
@@ -439,6 +562,9 @@ class FilesystemModel(BaseModel):
     def add_device(self, devpath, device):
         log.debug("adding device: {} = {}".format(devpath, device))
         self.devices[devpath] = device
+        device.add_listener(self._disk_changed)
+        self._add_disk_name(devpath)
+        self._mark_dirty(devpath)
 
     def get_partitions(self):
         log.debug('probe_storage: get_partitions()')
@@ -465,20 +591,16 @@ class FilesystemModel(BaseModel):
         ''' one or more disks has used space
             and has "/" as a mount
         '''
-        for disk in self.get_all_disks():
-            if disk.usedspace > 0 and "/" in disk.mounts:
-                return True
-
-        return False
+        self._refresh_indexes()
+        return len(self._installable) > 0
 
     def bootable(self):
         ''' true if one disk has a boot partition '''
         log.debug('bootable check')
-        for disk in self.get_all_disks():
-            for (num, action) in disk.partitions.items():
-                if action.flags in ['bios_grub']:
-                    log.debug('bootable check: we\'ve got boot!')
-                    return True
+        self._refresh_indexes()
+        if self._flagged.get('bios_grub'):
+            log.debug('bootable check: we\'ve got boot!')
+            return True
 
         log.debug('bootable check: no disks have been marked bootable')
         return False
@@ -491,16 +613,19 @@ class FilesystemModel(BaseModel):
             self.holders[held_device] = [holder_devpath]
         else:
             self.holders[held_device].append(holder_devpath)
+        self._mark_dirty(held_device)
 
     def clear_holder(self, held_device, holder_devpath):
         if held_device in self.holders:
             self.holders[held_device].remove(holder_devpath)
+            self._mark_dirty(held_device)
 
     def get_holders(self, held_device):
         return self.holders.get(held_device, [])
 
     def set_tag(self, device, tag):
         self.tags[device] = tag
+        self._mark_dirty(device)
 
     def get_tag(self, device):
         return self.tags.get(device, '')
@@ -566,9 +691,11 @@ class FilesystemModel(BaseModel):
     def get_empty_partition_names(self):
         ''' empty partitions have non-zero size, but are not part
             of a filesystem or mount point or other raid '''
+        self._refresh_indexes()
         empty = []
-        for dev in self.get_available_disks():
-            empty += dev.available_partitions
+        for devpath in self._disk_names:
+            if devpath in self._available:
+                empty += self._indexed[devpath].empty_partitions
 
         log.debug('empty_partitions: {}'.format(", ".join(empty)))
         return empty
@@ -577,18 +704,18 @@ class FilesystemModel(BaseModel):
         return [dev.disk.devpath for dev in self.get_available_disks()]
 
     def get_used_disk_names(self):
-        return [dev.disk.devpath for dev in self.get_all_disks()
-                if dev.available is False]
+        self._refresh_indexes()
+        return [devpath for devpath in self._disk_names
+                if devpath in self._used]
 
     def get_disk_info(self, disk):
         return self.info.get(disk, {})
 
     def get_mounts(self):
-        mounts = []
-        for dev in self.get_all_disks():
-            mounts += dev.mounts
-
-        return mounts
+        self._refresh_indexes()
+        return [mountpoint
+                for (mountpoint, devpaths) in self._mountpoints.items()
+                for devpath in devpaths]
 
     def get_disk_action(self, disk):
         return self.devices[disk].get_actions()
@@ -600,9 +727,7 @@ class FilesystemModel(BaseModel):
             if not dev.available:
                 actions += dev.get_actions()
 
-        log.debug('****')
-        log.debug('all actions:{}'.format(actions))
-        log.debug('****')
+        log.debug('all actions:%s', actions)
         return sort_actions(actions)
 
 
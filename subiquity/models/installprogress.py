@@ -13,15 +13,196 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
 import logging
+import time
+
 from subiquitycore.model import BaseModel
 
 
 log = logging.getLogger('subiquity.models.installprogress')
 
+# Rough share of the install time taken by each of curtin's install
+# stages, used to turn finished stages into a percentage.
+STAGE_WEIGHTS = OrderedDict([
+    ('stage-early', 1),
+    ('stage-partitioning', 10),
+    ('stage-network', 2),
+    ('stage-extract', 45),
+    ('stage-curthooks', 35),
+    ('stage-hook', 2),
+    ('stage-late', 5),
+])
+
+# Share of the whole progress bar taken by each curtin run, in the
+# order they run.
+RUN_SHARES = OrderedDict([
+    ('install', 90),
+    ('postinstall', 10),
+])
+
+
+class ProgressStage():
+    ''' One curtin event name (e.g. cmd-install/stage-extract) and what
+        we know of it '''
+
+    def __init__(self, name):
+        self.name = name
+        self.description = ''
+        self.start = None
+        self.finish = None
+        self.result = None
+        self.children = OrderedDict()
+
+    @property
+    def running(self):
+        return self.start is not None and self.finish is None
+
+    @property
+    def failed(self):
+        return self.result == 'FAIL'
+
+    def duration(self, now=None):
+        if self.start is None:
+            return 0
+        end = self.finish
+        if end is None:
+            end = time.time() if now is None else now
+        return max(end - self.start, 0)
+
 
 class InstallProgressModel(BaseModel):
     """ Model representing install progress
+
+    Built from the events curtin reports: a tree of ProgressStage, one
+    node per '/'-separated component of the event names.  curtin runs
+    more than once (see RUN_SHARES); next_run() starts a new tree and
+    keeps what the runs before it took, so the percentage and ETA go on
+    from there.
     """
     # FIXME: Decide what to do here if ESC is pressed, it's probably in
     # a state of no return so may be better to just exit with error.
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # (name, seconds) of the runs before the current one
+        self.finished_runs = []
+        self.run = next(iter(RUN_SHARES))
+        self._start_tree()
+
+    def _start_tree(self):
+        self.root = ProgressStage('')
+        self.failed_stage = None
+        self.events = 0
+
+    def next_run(self, name):
+        ''' Follow the curtin run `name', after the current one '''
+        install = self.install
+        self.finished_runs.append(
+            (self.run, install.duration() if install is not None else 0))
+        self.run = name
+        self._start_tree()
+
+    def _node(self, name):
+        node = self.root
+        for part in name.split('/'):
+            if part not in node.children:
+                node.children[part] = ProgressStage(
+                    (node.name + '/' + part).lstrip('/'))
+            node = node.children[part]
+        return node
+
+    def event(self, event):
+        ''' Record a curtin event (a dict, see subiquitycore.reporting) '''
+        node = self._node(event['name'])
+        timestamp = event.get('timestamp')
+        if timestamp is None:
+            timestamp = time.time()
+        if event.get('description'):
+            node.description = event['description']
+        if event.get('event_type') == 'start':
+            node.start = timestamp
+            node.finish = None
+            node.result = None
+        elif event.get('event_type') == 'finish':
+            if node.start is None:
+                node.start = timestamp
+            node.finish = timestamp
+            node.result = event.get('result', 'SUCCESS')
+            # the innermost stage fails first and is the useful one
+            if node.failed and self.failed_stage is None:
+                self.failed_stage = node
+        self.events += 1
+
+    @property
+    def install(self):
+        ''' the top level (cmd-install) stage, if any '''
+        for node in self.root.children.values():
+            return node
+        return None
+
+    @property
+    def stages(self):
+        install = self.install
+        if install is None:
+            return []
+        return list(install.children.values())
+
+    @property
+    def current_stage(self):
+        ''' the innermost stage still running '''
+        node = self.install
+        if node is None or not node.running:
+            return None
+        while True:
+            running = [child for child in node.children.values()
+                       if child.running]
+            if not running:
+                return node
+            node = running[-1]
+
+    def _run_fraction(self):
+        ''' how much of the current run is done, from 0 to 1 '''
+        install = self.install
+        if install is None:
+            return 0
+        if install.finish is not None:
+            return 1
+        done = 0
+        for stage in self.stages:
+            weight = STAGE_WEIGHTS.get(stage.name.split('/')[-1], 1)
+            if stage.finish is not None:
+                done += weight
+            elif stage.running:
+                done += weight / 2
+        return done / sum(STAGE_WEIGHTS.values())
+
+    @property
+    def percent(self):
+        done = sum(RUN_SHARES.get(name, 0)
+                   for (name, seconds) in self.finished_runs)
+        done += RUN_SHARES.get(self.run, 0) * self._run_fraction()
+        total = sum(RUN_SHARES.values())
+        last_run = list(RUN_SHARES)[-1]
+        if self.run == last_run and self._run_fraction() == 1:
+            return 100
+        return min(int(100 * done / total), 99)
+
+    def eta(self, now=None):
+        ''' seconds left, going by the time taken so far, or None '''
+        percent = self.percent
+        if percent == 0 or percent == 100:
+            return None
+        elapsed = sum(seconds for (name, seconds) in self.finished_runs)
+        install = self.install
+        if install is not None:
+            elapsed += install.duration(now)
+        return elapsed * (100 - percent) / percent
+
+    def stage_durations(self, now=None):
+        ''' [(name, description, seconds, result)] for each stage '''
+        return [(stage.name.split('/')[-1], stage.description,
+                 stage.duration(now), stage.result)
+                for stage in self.stages]
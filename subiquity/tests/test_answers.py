@@ -0,0 +1,120 @@
+import logging
+import os
+import tempfile
+import testtools
+import urwid
+
+from subiquitycore.answers import AnswersError, HeadlessLoop, load_answers
+
+CONTROLLERS = ['Welcome', 'Network', 'Filesystem', 'Identity']
+
+
+class TestLoadAnswers(testtools.TestCase):
+    def setUp(self):
+        super(TestLoadAnswers, self).setUp()
+        logging.disable(logging.CRITICAL)
+
+    def load(self, content):
+        (fd, path) = tempfile.mkstemp(suffix='.yaml')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(content)
+        return load_answers(path, CONTROLLERS)
+
+    def test_answers_by_controller(self):
+        answers = self.load('Filesystem:\n  disk: /dev/sda\nWelcome:\n')
+        self.assertEqual(answers['Filesystem'], {'disk': '/dev/sda'})
+        self.assertEqual(answers['Welcome'], {})
+        self.assertEqual(answers['Identity'], {})
+
+    def test_empty_file(self):
+        answers = self.load('')
+        self.assertEqual(sorted(answers), sorted(CONTROLLERS))
+
+    def test_unknown_controller(self):
+        self.assertRaises(AnswersError, self.load, 'Identiy:\n  a: b\n')
+
+    def test_not_a_mapping(self):
+        self.assertRaises(AnswersError, self.load, '- Welcome\n')
+        self.assertRaises(AnswersError, self.load, 'Welcome: English\n')
+
+    def test_invalid_yaml(self):
+        self.assertRaises(AnswersError, self.load, 'Welcome: [\n')
+
+    def test_missing_file(self):
+        self.assertRaises(AnswersError, load_answers, '/nonexistent.yaml',
+                          CONTROLLERS)
+
+
+class TestHeadlessLoop(testtools.TestCase):
+    def setUp(self):
+        super(TestHeadlessLoop, self).setUp()
+        logging.disable(logging.CRITICAL)
+        self.loop = HeadlessLoop()
+        self.addCleanup(self.loop.ioloop.close)
+
+    def exit(self, *args):
+        raise urwid.ExitMainLoop()
+
+    def test_alarm(self):
+        calls = []
+
+        def callback(loop, user_data):
+            calls.append((loop, user_data))
+            raise urwid.ExitMainLoop()
+        self.loop.set_alarm_in(0, callback, 'data')
+        self.loop.run()
+        self.assertEqual(calls, [(self.loop, 'data')])
+
+    def test_remove_alarm(self):
+        calls = []
+        handle = self.loop.set_alarm_in(0, lambda loop, data: calls.append(1))
+        self.assertTrue(self.loop.remove_alarm(handle))
+        self.loop.set_alarm_in(0.01, self.exit)
+        self.loop.run()
+        self.assertEqual(calls, [])
+
+    def test_exception_raised_by_run(self):
+        def callback(loop, user_data):
+            raise ValueError('boom')
+        self.loop.set_alarm_in(0, callback)
+        self.assertRaises(ValueError, self.loop.run)
+        # and not again on the next run
+        self.loop.set_alarm_in(0, self.exit)
+        self.loop.run()
+
+    def test_watch_pipe(self):
+        received = []
+
+        def callback(data):
+            received.append(data)
+            raise urwid.ExitMainLoop()
+        write_fd = self.loop.watch_pipe(callback)
+        self.addCleanup(self.loop.remove_watch_pipe, write_fd)
+        self.addCleanup(os.close, write_fd)
+        os.write(write_fd, b'hello')
+        self.loop.run()
+        self.assertEqual(received, [b'hello'])
+
+    def test_watch_pipe_eof(self):
+        received = []
+        write_fd = self.loop.watch_pipe(received.append)
+        os.close(write_fd)
+        self.loop.set_alarm_in(0.05, self.exit)
+        self.loop.run()
+        self.assertEqual(received, [b''])
+        self.assertFalse(self.loop.remove_watch_pipe(write_fd))
+
+    def test_watch_pipe_callback_false(self):
+        received = []
+
+        def callback(data):
+            received.append(data)
+            return False
+        write_fd = self.loop.watch_pipe(callback)
+        self.addCleanup(os.close, write_fd)
+        os.write(write_fd, b'once')
+        self.loop.set_alarm_in(0.05, self.exit)
+        self.loop.run()
+        self.assertEqual(received, [b'once'])
+        self.assertFalse(self.loop.remove_watch_pipe(write_fd))
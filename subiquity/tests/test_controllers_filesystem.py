@@ -0,0 +1,55 @@
+import logging
+import testtools
+
+from mock import Mock, patch
+from subiquity.controllers.filesystem import FilesystemController
+from subiquity.models.blockdev import Blockdev, Disk
+from subiquitycore.answers import AnswersError
+
+
+GB = 1 << 30
+
+
+class TestFilesystemUnattended(testtools.TestCase):
+    def setUp(self):
+        super(TestFilesystemUnattended, self).setUp()
+        logging.disable(logging.CRITICAL)
+        patcher = patch.object(Disk, '_get_io_sizes', return_value=[512, 0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        common = {
+            'ui': Mock(),
+            'signal': Mock(),
+            'opts': Mock(),
+            'loop': None,
+            'prober': Mock(),
+            'controllers': None,
+            'answers': {},
+        }
+        self.controller = FilesystemController(common)
+        self.model = self.controller.model
+        self.model.add_device('/dev/sda', Blockdev('/dev/sda', 'serial',
+                                                   'model', size=10 * GB))
+        self.model.probed = True
+
+    def assertAnswersError(self, answers, message):
+        e = self.assertRaises(AnswersError, self.controller.unattended,
+                              answers)
+        self.assertIn(message, str(e))
+        self.assertFalse(self.controller.signal.emit_signal.called)
+
+    def test_bad_disk(self):
+        self.assertAnswersError({'disk': '/dev/sdz'},
+                                '/dev/sdz is not an available disk')
+
+    def test_bad_fstype(self):
+        self.assertAnswersError(
+            {'disk': '/dev/sda',
+             'partitions': [{'fstype': 'fat99', 'mount': '/'}]},
+            'unsupported filesystem fat99')
+
+    def test_partition_too_big(self):
+        self.assertAnswersError(
+            {'disk': '/dev/sda',
+             'partitions': [{'size': '20G', 'fstype': 'ext4', 'mount': '/'}]},
+            'does not fit on /dev/sda')
@@ -0,0 +1,48 @@
+import logging
+import os
+import tempfile
+import testtools
+import yaml
+
+from mock import patch
+from subiquitycore import curtin
+
+
+class TestCurtinConfigs(testtools.TestCase):
+    def setUp(self):
+        super(TestCurtinConfigs, self).setUp()
+        logging.disable(logging.CRITICAL)
+
+    def config_file(self, name):
+        (fd, path) = tempfile.mkstemp(suffix='.yaml')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        patcher = patch.object(curtin, name, path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return path
+
+    def load(self, path):
+        with open(path) as fp:
+            return yaml.safe_load(fp)
+
+    def test_reporting_config(self):
+        path = self.config_file('CURTIN_REPORTING_CONFIG_FILE')
+        curtin.curtin_write_reporting_config('http://127.0.0.1:1234/')
+        self.assertEqual(self.load(path)['reporting'], {
+            'subiquity_events': {
+                'type': 'webhook',
+                'endpoint': 'http://127.0.0.1:1234/',
+            },
+        })
+
+    def test_storage_config(self):
+        path = self.config_file('CURTIN_STORAGE_CONFIG_FILE')
+        curtin.curtin_write_storage_actions([{'id': 'sda', 'type': 'disk'}])
+        config = self.load(path)
+        self.assertEqual(config['reporting'],
+                         {'subiquity': {'type': 'print'}})
+        self.assertEqual(config['storage'], {
+            'version': 1,
+            'config': [{'id': 'sda', 'type': 'disk'}],
+        })
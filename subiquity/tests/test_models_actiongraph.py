@@ -0,0 +1,97 @@
+import logging
+import testtools
+
+from mock import patch
+from subiquity.models.actiongraph import ActionGraphError, order_actions
+from subiquity.models.blockdev import Bcachedev, Blockdev, Disk
+from subiquity.models.filesystem import FilesystemModel
+
+GB = 1 << 30
+
+
+def disk(id):
+    return {'id': id, 'type': 'disk'}
+
+
+def partition(id, device):
+    return {'id': id, 'type': 'partition', 'device': device}
+
+
+def raid(id, devices):
+    return {'id': id, 'type': 'raid', 'devices': devices}
+
+
+def fmt(id, volume):
+    return {'id': id, 'type': 'format', 'volume': volume}
+
+
+def mount(id, device, path):
+    return {'id': id, 'type': 'mount', 'device': device, 'path': path}
+
+
+class TestActionGraph(testtools.TestCase):
+    def setUp(self):
+        super(TestActionGraph, self).setUp()
+        logging.disable(logging.CRITICAL)
+
+    def ids(self, actions):
+        return [a['id'] for a in order_actions(actions)]
+
+    def test_type_order(self):
+        actions = [mount('m1', 'f1', '/'), fmt('f1', 'p1'),
+                   partition('p1', 'd1'), disk('d1')]
+        self.assertEqual(self.ids(actions), ['d1', 'p1', 'f1', 'm1'])
+
+    def test_partition_on_raid(self):
+        # the partition on md0 must come after md0, unlike its type says
+        actions = [disk('d1'), disk('d2'),
+                   partition('d1p1', 'd1'), partition('d2p1', 'd2'),
+                   raid('md0', ['d1p1', 'd2p1']), partition('md0p1', 'md0'),
+                   fmt('f1', 'md0p1'), mount('m1', 'f1', '/')]
+        self.assertEqual(self.ids(actions),
+                         ['d1', 'd2', 'd1p1', 'd2p1', 'md0', 'md0p1',
+                          'f1', 'm1'])
+
+    def test_nested_mounts(self):
+        actions = [disk('d1')]
+        for (n, path) in enumerate(['/srv/data', '/home/user', '/home', '/']):
+            actions += [partition('p%d' % n, 'd1'),
+                        fmt('f%d' % n, 'p%d' % n),
+                        mount('m%d' % n, 'f%d' % n, path)]
+        paths = [a['path'] for a in order_actions(actions)
+                 if a['type'] == 'mount']
+        self.assertEqual(paths, ['/', '/srv/data', '/home', '/home/user'])
+
+    def test_missing_reference(self):
+        self.assertRaises(ActionGraphError, order_actions,
+                          [partition('p1', 'd1')])
+
+    def test_cycle(self):
+        self.assertRaises(ActionGraphError, order_actions,
+                          [raid('md0', ['md1']), raid('md1', ['md0'])])
+
+    def test_duplicate_id(self):
+        self.assertRaises(ActionGraphError, order_actions,
+                          [disk('d1'), disk('d1')])
+
+
+class TestGetActions(testtools.TestCase):
+    def setUp(self):
+        super(TestGetActions, self).setUp()
+        logging.disable(logging.CRITICAL)
+
+    @patch.object(Disk, '_get_io_sizes')
+    def test_missing_reference(self, _get_io_sizes):
+        _get_io_sizes.return_value = [512, 0]
+        model = FilesystemModel(None, None)
+        backing = Blockdev('/dev/sda', 'serial', 'model', size=10 * GB)
+        backing.add_partition(1, backing.freespace, None, None,
+                              flag='bcache')
+        # the cache device is not part of the model
+        cache = Blockdev('/dev/sdb', 'serial', 'model', size=10 * GB)
+        bcache = Bcachedev('/dev/bcache0', 'serial', 'model', 'gpt',
+                           10 * GB, backing, cache)
+        bcache.format_device('ext4', '/')
+        model.add_device('/dev/sda', backing)
+        model.add_device('/dev/bcache0', bcache)
+        self.assertRaises(ActionGraphError, model.get_actions)
@@ -0,0 +1,191 @@
+import logging
+import testtools
+
+from mock import patch
+from subiquity.models.blockdev import (Blockdev,
+                                       Disk,
+                                       ExtentAllocator,
+                                       FIRST_PARTITION_OFFSET,
+                                       GPT_END_RESERVE)
+
+
+MB = 1 << 20
+GB = 1 << 30
+
+
+class TestExtentAllocator(testtools.TestCase):
+    def setUp(self):
+        super(TestExtentAllocator, self).setUp()
+        logging.disable(logging.CRITICAL)
+        self.alloc = ExtentAllocator(1000, first=10, last=990, alignment=8)
+
+    def test_init(self):
+        self.assertEqual(self.alloc.free, [(10, 980)])
+        self.assertEqual(self.alloc.used, 0)
+        self.assertEqual(self.alloc.free_sectors, 980)
+
+    def test_allocate_splits_gap(self):
+        self.alloc.allocate(100, 50)
+        self.assertEqual(self.alloc.free, [(10, 90), (150, 840)])
+        self.assertEqual(self.alloc.used, 50)
+
+    def test_allocate_not_free(self):
+        self.alloc.allocate(100, 50)
+        self.assertRaises(ValueError, self.alloc.allocate, 120, 10)
+        self.assertRaises(ValueError, self.alloc.allocate, 0, 5)
+
+    def test_release_merges(self):
+        self.alloc.allocate(100, 50)
+        self.alloc.allocate(200, 50)
+        self.alloc.release(100, 50)
+        self.assertEqual(self.alloc.free, [(10, 190), (250, 740)])
+        self.alloc.release(200, 50)
+        self.assertEqual(self.alloc.free, [(10, 980)])
+        self.assertEqual(self.alloc.used, 0)
+
+    def test_find_aligns_start(self):
+        self.assertEqual(self.alloc.find(100), (10, 16))
+
+    def test_find_strategies(self):
+        # gaps: [10, 100) [200, 240) [300, 990)
+        self.alloc.allocate(100, 100)
+        self.alloc.allocate(240, 60)
+        self.assertEqual(self.alloc.find(30, 'first-fit'), (10, 16))
+        self.assertEqual(self.alloc.find(30, 'best-fit'), (200, 200))
+        self.assertEqual(self.alloc.find(30, 'largest-gap'), (300, 304))
+        self.assertEqual(self.alloc.find(700), None)
+        self.assertRaises(ValueError, self.alloc.find, 30, 'worst-fit')
+
+    def test_largest_free_is_aligned(self):
+        self.assertEqual(self.alloc.largest_free, 990 - 16)
+
+
+class TestBlockdevAllocation(testtools.TestCase):
+    def setUp(self):
+        super(TestBlockdevAllocation, self).setUp()
+        logging.disable(logging.CRITICAL)
+
+    @patch.object(Disk, '_get_io_sizes')
+    def make_blockdev(self, size, io_sizes, _get_io_sizes):
+        _get_io_sizes.return_value = io_sizes
+        return Blockdev('/dev/foo', 'serial', 'model', size=size)
+
+    def test_freespace(self):
+        disk = self.make_blockdev(100 * GB, [512, 0])
+        self.assertEqual(disk.usedspace, 0)
+        self.assertEqual(disk.freespace,
+                         100 * GB - FIRST_PARTITION_OFFSET - GPT_END_RESERVE)
+
+    def test_add_partition_sector_accurate(self):
+        disk = self.make_blockdev(100 * GB, [512, 0])
+        disk.add_partition(1, 10 * GB, 'ext4', '/')
+        disk.add_partition(2, 512 * MB + 1, 'ext4', '/home')
+        offsets = disk.partition_offsets()
+        self.assertEqual(offsets[1], FIRST_PARTITION_OFFSET)
+        self.assertEqual(disk.partitions[1].size, 10 * GB)
+        self.assertEqual(offsets[2], 0)
+        # rounded up to the 1M alignment
+        self.assertEqual(disk.partitions[2].size, 513 * MB)
+        self.assertEqual(disk.usedspace, 10 * GB + 513 * MB)
+
+    def test_add_partition_optimal_io_size(self):
+        # 4k sectors and a 384k RAID stripe: align on 3M
+        disk = self.make_blockdev(100 * GB, [4096, 384 * 1024])
+        self.assertEqual(disk.disk.alignment, 3 * MB)
+        disk.add_partition(1, 10 * MB, 'ext4', '/')
+        disk.add_partition(2, 10 * MB, 'ext4', '/home')
+        offsets = disk.partition_offsets()
+        self.assertEqual(offsets[1], 3 * MB)
+        self.assertEqual(disk.partitions[1].size, 12 * MB)
+        self.assertEqual(offsets[2], 0)
+
+    def test_add_partition_all_free_space(self):
+        disk = self.make_blockdev(100 * GB, [512, 0])
+        disk.add_partition(1, disk.freespace, None, None, flag='raid')
+        self.assertEqual(disk.freespace, 0)
+        self.assertEqual(disk.percent_free, 0)
+
+    def test_add_partition_too_big(self):
+        disk = self.make_blockdev(10 * GB, [512, 0])
+        self.assertRaises(Exception, disk.add_partition, 1, 11 * GB, 'ext4')
+
+    def test_add_partition_bigger_than_any_gap(self):
+        disk = self.make_blockdev(30 * GB, [512, 0])
+        disk.add_partition(1, 9 * GB, 'ext4', '/')
+        disk.add_partition(2, 9 * GB, 'ext4', '/home')
+        disk.add_partition(3, 9 * GB, 'ext4', '/srv')
+        disk.delete_partition(1)
+        disk.delete_partition(3)
+        # enough free space in total, but not in one piece
+        self.assertGreater(disk.freespace, 20 * GB)
+        self.assertRaises(Exception, disk.add_partition, 4, 20 * GB, 'ext4')
+        self.assertNotIn(4, disk.partitions)
+
+    def test_redefine_partition_too_big_keeps_it(self):
+        disk = self.make_blockdev(30 * GB, [512, 0])
+        disk.add_partition(1, 10 * GB, 'ext4', '/')
+        disk.add_partition(2, 10 * GB, 'ext4', '/home')
+        extent = disk._extents[1]
+        freespace = disk.freespace
+        self.assertRaises(Exception, disk.add_partition, 1, 25 * GB, 'ext4')
+        self.assertEqual(disk._extents[1], extent)
+        self.assertEqual(disk.freespace, freespace)
+        # the space is still taken
+        self.assertRaises(ValueError, disk._allocations.allocate, *extent)
+
+    def test_delete_partition_reuses_gap(self):
+        disk = self.make_blockdev(100 * GB, [512, 0])
+        disk.add_partition(1, 10 * GB, 'ext4', '/')
+        disk.add_partition(2, 10 * GB, 'ext4', '/home')
+        disk.add_partition(3, 10 * GB, 'ext4', '/srv')
+        freespace = disk.freespace
+
+        self.assertEqual(disk.delete_partition(mountpoint='/home'), 10 * GB)
+        self.assertEqual(disk.freespace, freespace + 10 * GB)
+        self.assertEqual(list(disk.partitions.keys()), [1, 3])
+        self.assertNotIn('/home', disk.mounts)
+
+        disk.add_partition(4, 5 * GB, 'ext4', '/home', strategy='best-fit')
+        self.assertEqual(disk._extents[4][0], disk._extents[1][1] +
+                         FIRST_PARTITION_OFFSET // 512)
+
+    def part_actions(self, disk):
+        return [(action['number'], action['offset'])
+                for action in disk.get_actions()
+                if action['type'] == 'partition']
+
+    def test_delete_partition_moves_offset(self):
+        disk = self.make_blockdev(30 * GB, [512, 0])
+        for num in (1, 2, 3):
+            disk.add_partition(num, 9 * GB, 'ext4')
+        disk.delete_partition(1)
+        # partition 2 did not move, it is now further from the one before
+        self.assertEqual(self.part_actions(disk),
+                         [(2, '{}B'.format(9 * GB + FIRST_PARTITION_OFFSET)),
+                          (3, '0B')])
+
+    def test_delete_then_add_partition(self):
+        disk = self.make_blockdev(30 * GB, [512, 0])
+        for num in (1, 2, 3):
+            disk.add_partition(num, 9 * GB, 'ext4')
+        disk.delete_partition(1)
+        disk.add_partition(4, 4 * GB, 'ext4')
+        # the new partition went in the gap at the front of the disk
+        self.assertEqual(disk._extents[4][0], FIRST_PARTITION_OFFSET // 512)
+        self.assertEqual(self.part_actions(disk),
+                         [(4, '{}B'.format(FIRST_PARTITION_OFFSET)),
+                          (2, '{}B'.format(5 * GB)),
+                          (3, '0B')])
+
+    def test_add_partition_returns_freespace_used(self):
+        # as add_disk_partition_handler, a boot partition then the rest
+        disk = self.make_blockdev(30 * GB, [512, 0])
+        size = disk.freespace
+        size -= disk.add_partition(1, 2 * MB, None, flag='bios_grub')
+        disk.add_partition(2, size, 'ext4', '/')
+        self.assertEqual(disk.partitions[2].size, size)
+        self.assertEqual(disk.freespace, 0)
+
+    def test_delete_partition_missing(self):
+        disk = self.make_blockdev(100 * GB, [512, 0])
+        self.assertRaises(ValueError, disk.delete_partition, 1)
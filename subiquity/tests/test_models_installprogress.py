@@ -0,0 +1,53 @@
+import logging
+import testtools
+
+from subiquity.models.installprogress import InstallProgressModel
+
+
+def events(model, start, *stages):
+    ''' run cmd-install and `stages', a second each, from `start' '''
+    now = start
+    model.event({'name': 'cmd-install', 'event_type': 'start',
+                 'timestamp': now})
+    for stage in stages:
+        name = 'cmd-install/' + stage
+        model.event({'name': name, 'event_type': 'start', 'timestamp': now})
+        now += 1
+        model.event({'name': name, 'event_type': 'finish', 'timestamp': now})
+    return now
+
+
+class TestInstallProgressModel(testtools.TestCase):
+    def setUp(self):
+        super(TestInstallProgressModel, self).setUp()
+        logging.disable(logging.CRITICAL)
+        self.model = InstallProgressModel()
+
+    def test_stages(self):
+        self.assertEqual(self.model.percent, 0)
+        self.assertIsNone(self.model.eta())
+        now = events(self.model, 0, 'stage-early', 'stage-partitioning')
+        percent = self.model.percent
+        self.assertTrue(0 < percent < 90)
+        self.assertAlmostEqual(self.model.eta(now),
+                               now * (100 - percent) / percent)
+
+    def test_postinstall_goes_on(self):
+        now = events(self.model, 0, 'stage-early', 'stage-extract')
+        self.model.event({'name': 'cmd-install', 'event_type': 'finish',
+                          'timestamp': now})
+        self.assertEqual(self.model.percent, 90)
+        self.assertAlmostEqual(self.model.eta(now), now / 9)
+        self.model.next_run('postinstall')
+        self.assertEqual(self.model.percent, 90)
+        self.assertEqual(self.model.stages, [])
+        later = events(self.model, now, 'stage-early', 'stage-extract')
+        percent = self.model.percent
+        self.assertTrue(90 < percent < 100)
+        # going by the time both runs took
+        self.assertAlmostEqual(self.model.eta(later),
+                               later * (100 - percent) / percent)
+        self.model.event({'name': 'cmd-install', 'event_type': 'finish',
+                          'timestamp': later})
+        self.assertEqual(self.model.percent, 100)
+        self.assertIsNone(self.model.eta(later))
@@ -0,0 +1,73 @@
+import logging
+import os
+import shutil
+import tempfile
+import testtools
+
+from mock import patch
+from subiquitycore import probecache
+
+UDEV_SDA = """S:disk/by-id/ata-QEMU_HARDDISK_QM00001
+I:{initialized}
+E:ID_SERIAL=QEMU_HARDDISK_QM00001
+E:ID_PART_TABLE_TYPE={ptable}
+G:systemd
+"""
+
+
+class TestFingerprints(testtools.TestCase):
+    def setUp(self):
+        super(TestFingerprints, self).setUp()
+        logging.disable(logging.CRITICAL)
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for name in ('SYS_CLASS_BLOCK', 'SYS_CLASS_NET', 'SYS_DMI_ID',
+                     'UDEV_DATA'):
+            path = os.path.join(self.root, name)
+            os.mkdir(path)
+            patcher = patch.object(probecache, name, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.write('SYS_CLASS_BLOCK/sda/dev', '8:0')
+        self.write('SYS_CLASS_BLOCK/sda/size', '20971520')
+        self.write('SYS_CLASS_NET/eth0/address', '52:54:00:12:34:56')
+        os.mkdir(os.path.join(self.root, 'e1000'))
+        os.mkdir(os.path.join(self.root, 'SYS_CLASS_NET/eth0/device'))
+        os.symlink(os.path.join(self.root, 'e1000'),
+                   os.path.join(self.root, 'SYS_CLASS_NET/eth0/device/driver'))
+        self.boot(initialized=5012345, ptable='gpt')
+
+    def write(self, path, content):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(content)
+
+    def boot(self, **udev):
+        self.write('UDEV_DATA/b8:0', UDEV_SDA.format(**udev))
+
+    def test_storage_stable_across_boots(self):
+        fingerprint = probecache.storage_fingerprint()
+        self.boot(initialized=4987654, ptable='gpt')
+        self.assertEqual(probecache.storage_fingerprint(), fingerprint)
+
+    def test_storage_repartitioned(self):
+        fingerprint = probecache.storage_fingerprint()
+        self.boot(initialized=5012345, ptable='dos')
+        self.assertNotEqual(probecache.storage_fingerprint(), fingerprint)
+
+    def test_storage_ignores_loop_devices(self):
+        fingerprint = probecache.storage_fingerprint()
+        self.write('SYS_CLASS_BLOCK/loop0/dev', '7:0')
+        self.write('SYS_CLASS_BLOCK/loop0/size', '0')
+        self.assertEqual(probecache.storage_fingerprint(), fingerprint)
+
+    def test_storage_without_udev(self):
+        shutil.rmtree(os.path.join(self.root, 'UDEV_DATA'))
+        self.assertIsNone(probecache.storage_fingerprint())
+
+    def test_network(self):
+        fingerprint = probecache.network_fingerprint()
+        self.assertEqual(probecache.network_fingerprint(), fingerprint)
+        self.write('SYS_CLASS_NET/eth0/address', '52:54:00:65:43:21')
+        self.assertNotEqual(probecache.network_fingerprint(), fingerprint)
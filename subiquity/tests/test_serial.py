@@ -0,0 +1,161 @@
+import io
+import logging
+import testtools
+import urwid
+
+from mock import Mock, patch
+from subiquitycore.ui import serial
+from subiquitycore.ui.serial import (SerialMainLoop,
+                                     SerialScreen,
+                                     _changed_span,
+                                     canvas_cells)
+
+
+def cells(text):
+    return [(None, None, char) for char in text]
+
+
+def wide(text):
+    ''' cells for a row of double width characters '''
+    row = []
+    for char in text:
+        row += [(None, None, char), (None, None, '')]
+    return row
+
+
+class TestCanvasCells(testtools.TestCase):
+    def setUp(self):
+        super(TestCanvasCells, self).setUp()
+        logging.disable(logging.CRITICAL)
+
+    def test_rows(self):
+        canvas = urwid.Text('ab\ncd').render((3,))
+        self.assertEqual(canvas_cells(canvas, 'utf8'),
+                         [cells('ab '), cells('cd ')])
+
+    def test_double_width(self):
+        canvas = urwid.Text('日x').render((4,))
+        self.assertEqual(canvas_cells(canvas, 'utf8'),
+                         [wide('日') + cells('x ')])
+
+
+class TestChangedSpan(testtools.TestCase):
+    def setUp(self):
+        super(TestChangedSpan, self).setUp()
+        logging.disable(logging.CRITICAL)
+
+    def test_same(self):
+        self.assertIsNone(_changed_span(cells('abcd'), cells('abcd')))
+
+    def test_whole_row(self):
+        self.assertEqual(_changed_span(None, cells('abcd')), (0, 3))
+        self.assertEqual(_changed_span(cells('abc'), cells('abcd')), (0, 3))
+
+    def test_middle(self):
+        self.assertEqual(_changed_span(cells('abcdef'), cells('abXYef')),
+                         (2, 3))
+
+    def test_double_width_start(self):
+        # the change starts on the second half of a double width character
+        self.assertEqual(_changed_span(cells('ax'), wide('a')), (0, 1))
+        self.assertEqual(_changed_span(cells('xay'), cells('x') + wide('a')),
+                         (1, 2))
+
+    def test_double_width_end(self):
+        # the second halves are the same, the characters are not
+        self.assertEqual(_changed_span(wide('b') + cells('c'),
+                                       wide('a') + cells('c')), (0, 1))
+
+
+class TestSerialScreen(testtools.TestCase):
+    def setUp(self):
+        super(TestSerialScreen, self).setUp()
+        logging.disable(logging.CRITICAL)
+        self.output = io.StringIO()
+        self.screen = SerialScreen(input=io.StringIO(), output=self.output)
+        self.screen.screen_buf = None
+
+    def draw(self, text, size=(4, 2)):
+        self.output.seek(0)
+        self.output.truncate()
+        canvas = urwid.Text(text).render(size[:1])
+        self.screen.draw_screen(size, canvas)
+        return self.output.getvalue()
+
+    def test_trailing_blanks_erased(self):
+        data = self.draw('ab\ncd')
+        self.assertIn('ab' + urwid.escape.ERASE_IN_LINE_RIGHT, data)
+        self.assertNotIn('ab  ', data)
+
+    def test_only_changes_sent(self):
+        self.draw('abcd\nef')
+        data = self.draw('aXcd\nef')
+        self.assertIn(urwid.escape.set_cursor_position(1, 0), data)
+        self.assertIn('X', data)
+        self.assertNotIn('cd', data)
+        self.assertNotIn('ef', data)
+        self.assertEqual(self.screen.last_frame_bytes, len(data))
+
+    def test_bottom_right_cell_inserted(self):
+        self.draw('ab\ncd')
+        data = self.draw('ab\ncdef')
+        # f is written one to the left, then e inserted before it
+        self.assertIn('f\x08' + urwid.escape.INSERT_ON + 'e' +
+                      urwid.escape.INSERT_OFF, data)
+        self.assertNotIn('ef', data)
+
+    def test_resize_sends_everything(self):
+        self.draw('ab\ncd')
+        data = self.draw('ab\ncd', size=(5, 2))
+        self.assertIn('ab', data)
+        self.assertIn('cd', data)
+
+
+class TestSerialMainLoop(testtools.TestCase):
+    def setUp(self):
+        super(TestSerialMainLoop, self).setUp()
+        logging.disable(logging.CRITICAL)
+        self.now = 100.0
+        patcher = patch.object(serial.time, 'time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(urwid.MainLoop, 'draw_screen')
+        self.draw_screen = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.screen = Mock(baud=None, last_frame_bytes=100)
+        self.loop = SerialMainLoop(urwid.SolidFill(), screen=self.screen,
+                                   event_loop=Mock(), max_fps=10)
+
+    def test_redraws_merged(self):
+        self.loop.draw_screen()
+        self.assertEqual(self.draw_screen.call_count, 1)
+        self.now += 0.01
+        self.loop.draw_screen()
+        self.loop.draw_screen()
+        # one delayed redraw, for both requests
+        self.assertEqual(self.draw_screen.call_count, 1)
+        self.assertEqual(self.loop.event_loop.alarm.call_count, 1)
+        (delay, callback) = self.loop.event_loop.alarm.call_args[0]
+        self.assertAlmostEqual(delay, 0.09)
+        self.now += delay
+        callback()
+        self.assertEqual(self.draw_screen.call_count, 2)
+        self.assertEqual(self.loop.frames, 2)
+
+    def test_waits_for_link(self):
+        # 1000 bytes at 9600 baud take over a second to send
+        self.screen.baud = 9600
+        self.screen.last_frame_bytes = 1000
+        self.loop.draw_screen()
+        self.now += 0.5
+        self.loop.draw_screen()
+        (delay, callback) = self.loop.event_loop.alarm.call_args[0]
+        self.assertAlmostEqual(delay, 1000 * 10 / 9600 - 0.5)
+
+    def test_unchanged_frame_frees_link(self):
+        self.screen.last_frame_bytes = 0
+        self.loop.draw_screen()
+        self.loop.draw_screen()
+        self.assertEqual(self.draw_screen.call_count, 2)
+        self.assertFalse(self.loop.event_loop.alarm.called)
+        self.assertEqual(self.loop.frames, 0)
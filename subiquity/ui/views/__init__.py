@@ -13,16 +13,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .filesystem import (FilesystemView,  # NOQA
-                         AddPartitionView,
-                         AddFormatView,
-                         DiskPartitionView,
-                         DiskInfoView)
-from .bcache import BcacheView  # NOQA
-from .raid import RaidView  # NOQA
-from .ceph import CephDiskView  # NOQA
-from .iscsi import IscsiDiskView  # NOQA
-from .lvm import LVMVolumeGroupView  # NOQA
-from .identity import IdentityView  # NOQA
-from .installpath import InstallpathView  # NOQA
-from .installprogress import ProgressView  # NOQA
+""" Subiquity UI Views
+
+Import views from their modules, so that showing one screen does not
+load all the others.
+"""
@@ -481,79 +481,122 @@ class DiskPartitionView(BaseView):
 
 
 class FilesystemView(BaseView):
+    ''' The main filesystem screen.
+
+        The controller keeps one FilesystemView and calls refresh()
+        each time the screen is shown again; the rows of every disk are
+        kept and only the disks the model reports as changed get their
+        rows rebuilt.
+    '''
+
     def __init__(self, model, signal):
         log.debug('FileSystemView init start()')
         self.model = model
         self.signal = signal
         self.items = []
-        self.model.probe_storage()  # probe before we complete
+        self.generation = 0
+        # devpath -> the widgets showing that device
+        self._fs_rows = {}
+        self._disk_rows = {}
+        self._used_rows = {}
+        self._avail_disks = None
+        self._menu_shown = None
+        self._installable = None
+
+        self.partition_list = Padding.center_79(Pile([]))
+        self.model_inputs = Padding.center_79(Pile([]))
+        self.menu = Padding.center_79(Pile([]))
+        self.used_disks = Padding.center_79(Pile([]))
+        self.buttons = Padding.fixed_10(Pile([]))
         self.body = [
             Padding.center_79(Text("FILE SYSTEM")),
-            Padding.center_79(self._build_partition_list()),
+            self.partition_list,
             Padding.line_break(""),
             Padding.center_79(Text("AVAILABLE DISKS")),
-            Padding.center_79(self._build_model_inputs()),
+            self.model_inputs,
             Padding.line_break(""),
-            Padding.center_79(self._build_menu()),
+            self.menu,
             Padding.line_break(""),
-            Padding.center_79(self._build_used_disks()),
-            Padding.fixed_10(self._build_buttons()),
+            self.used_disks,
+            self.buttons,
         ]
+        self.refresh()
         super().__init__(ListBox(self.body))
         log.debug('FileSystemView init complete()')
 
-    def _build_used_disks(self):
-        log.debug('FileSystemView: building used disks')
+    def refresh(self):
+        ''' Bring the screen up to date with the model '''
+        (changed, self.generation) = self.model.changed_disks(
+            self.generation)
+        log.debug('FileSystemView: refreshing %s', changed)
+        for devpath in changed:
+            self._fs_rows.pop(devpath, None)
+            self._disk_rows.pop(devpath, None)
+            self._used_rows.pop(devpath, None)
+        if changed or self._installable is None:
+            self._update_partition_list()
+            self._update_model_inputs()
+            self._update_menu()
+            self._update_used_disks()
+            self._update_buttons()
+
+    def _update_used_disks(self):
         pl = []
         for disk in self.model.get_used_disk_names():
-            log.debug('used disk: {}'.format(disk))
-            disk_string = disk
-            disk_tag = self.model.get_tag(disk)
-            if len(disk_tag):
-                disk_string += " {}".format(disk_tag)
-            pl.append(Color.info_minor(Text(disk_string)))
+            if disk not in self._used_rows:
+                log.debug('used disk: %s', disk)
+                disk_string = disk
+                disk_tag = self.model.get_tag(disk)
+                if len(disk_tag):
+                    disk_string += " {}".format(disk_tag)
+                self._used_rows[disk] = Color.info_minor(Text(disk_string))
+            pl.append(self._used_rows[disk])
         if len(pl):
-            return Pile(
-                [Text("USED DISKS"),
-                 Padding.line_break("")] + pl +
-                [Padding.line_break("")]
-            )
-
-        return Pile(pl)
+            pl = ([Text("USED DISKS"), Padding.line_break("")] + pl +
+                  [Padding.line_break("")])
+        self.used_disks.original_widget = Pile(pl)
+
+    def _build_fs_rows(self, dev):
+        ''' rows for the partitions and filesystems of `dev', and whether
+            it has any partitions or filesystems at all '''
+        rows = []
+        for mnt, size, fstype, path in dev.get_fs_table():
+            mnt = Text(mnt)
+            size = Text("{}".format(_humanize_size(size)))
+            fstype = Text(fstype) if fstype else '-'
+            path = Text(path) if path else '-'
+            partition_column = Columns([
+                (15, path),
+                size,
+                fstype,
+                mnt
+            ], 4)
+            rows.append(partition_column)
+        used = len(dev.disk.partitions) > 0 or len(dev.filesystems) > 0
+        return (rows, used)
 
-    def _build_partition_list(self):
-        log.debug('FileSystemView: building part list')
+    def _update_partition_list(self):
         pl = []
-        nr_parts = len(self.model.get_partitions())
-        nr_fs = len(self.model.get_filesystems())
-        if nr_parts == 0 and nr_fs == 0:
-            pl.append(Color.info_minor(
-                Text("No disks or partitions mounted")))
+        used = False
+        for (devpath, dev) in self.model.devices.items():
+            if devpath not in self._fs_rows:
+                self._fs_rows[devpath] = self._build_fs_rows(dev)
+            (rows, dev_used) = self._fs_rows[devpath]
+            pl += rows
+            used = used or dev_used
+        if not used:
+            pl = [Color.info_minor(Text("No disks or partitions mounted"))]
             log.debug('FileSystemView: no partitions')
-            return Pile(pl)
-        log.debug('FileSystemView: weve got partitions!')
-        for dev in self.model.devices.values():
-            for mnt, size, fstype, path in dev.get_fs_table():
-                mnt = Text(mnt)
-                size = Text("{}".format(_humanize_size(size)))
-                fstype = Text(fstype) if fstype else '-'
-                path = Text(path) if path else '-'
-                partition_column = Columns([
-                    (15, path),
-                    size,
-                    fstype,
-                    mnt
-                ], 4)
-                pl.append(partition_column)
-        log.debug('FileSystemView: build-part-list done')
-        return Pile(pl)
-
-    def _build_buttons(self):
-        log.debug('FileSystemView: building buttons')
-        buttons = []
+        self.partition_list.original_widget = Pile(pl)
 
+    def _update_buttons(self):
         # don't enable done botton if we can't install
-        if self.model.installable():
+        installable = self.model.installable()
+        if installable == self._installable:
+            return
+        self._installable = installable
+        buttons = []
+        if installable:
             buttons.append(
                 Color.button(done_btn(on_press=self.done),
                              focus_map='button focus'))
@@ -563,7 +606,7 @@ class FilesystemView(BaseView):
         buttons.append(Color.button(cancel_btn(on_press=self.cancel),
                                     focus_map='button focus'))
 
-        return Pile(buttons)
+        self.buttons.original_widget = Pile(buttons)
 
     def _get_percent_free(self, device):
         ''' return the device free space and percentage
@@ -574,57 +617,77 @@ class FilesystemView(BaseView):
         rounded = "{}{}".format(int(float(free[:-1])), free[-1])
         return (rounded, percent)
 
-    def _build_model_inputs(self):
-        log.debug('FileSystemView: building model inputs')
+    def _build_disk_rows(self, dname):
+        ''' the button and size columns for disk `dname' and its
+            available partitions '''
         col_1 = []
         col_2 = []
+        disk = self.model.get_disk_info(dname)
+        device = self.model.get_disk(dname)
+        btn = menu_btn(label=disk.name,
+                       on_press=self.show_disk_partition_view)
+
+        col_1.append(
+            Color.menu_button(btn, focus_map='menu_button focus'))
+        disk_sz = _humanize_size(disk.size)
+        log.debug('device partitions: %s', len(device.partitions))
+        # if we've consumed some of the device, show
+        # the remaining space and percentage of the whole
+        if len(device.partitions) > 0:
+            free, percent = self._get_percent_free(device)
+            disk_sz = "{} ({}%) free".format(free, percent)
+        col_2.append(Text(disk_sz))
+        for partname in device.available_partitions:
+            part = device.get_partition(partname)
+            btn = menu_btn(label=partname,
+                           on_press=self.show_disk_partition_view)
+            col_1.append(
+                Color.menu_button(btn, focus_map='menu_button focus'))
+            col_2.append(Text(_humanize_size(part.size)))
+        return (col_1, col_2)
 
+    def _update_model_inputs(self):
         avail_disks = self.model.get_available_disk_names()
+        rebuilt = [dname for dname in avail_disks
+                   if dname not in self._disk_rows]
+        if avail_disks == self._avail_disks and not rebuilt:
+            # keeps the focus where it was
+            return
+        self._avail_disks = avail_disks
         if len(avail_disks) == 0:
-            return Pile([Color.info_minor(Text("No available disks."))])
+            self.model_inputs.original_widget = Pile(
+                [Color.info_minor(Text("No available disks."))])
+            return
 
+        col_1 = []
+        col_2 = []
         for dname in avail_disks:
-            disk = self.model.get_disk_info(dname)
-            device = self.model.get_disk(dname)
-            btn = menu_btn(label=disk.name,
-                           on_press=self.show_disk_partition_view)
-
-            col_1.append(
-                Color.menu_button(btn, focus_map='menu_button focus'))
-            disk_sz = _humanize_size(disk.size)
-            log.debug('device partitions: {}'.format(len(device.partitions)))
-            # if we've consumed some of the device, show
-            # the remaining space and percentage of the whole
-            if len(device.partitions) > 0:
-                free, percent = self._get_percent_free(device)
-                disk_sz = "{} ({}%) free".format(free, percent)
-            col_2.append(Text(disk_sz))
-            for partname in device.available_partitions:
-                part = device.get_partition(partname)
-                btn = menu_btn(label=partname,
-                               on_press=self.show_disk_partition_view)
-                col_1.append(
-                    Color.menu_button(btn, focus_map='menu_button focus'))
-                col_2.append(Text(_humanize_size(part.size)))
+            if dname not in self._disk_rows:
+                self._disk_rows[dname] = self._build_disk_rows(dname)
+            (disk_col_1, disk_col_2) = self._disk_rows[dname]
+            col_1 += disk_col_1
+            col_2 += disk_col_2
 
         col_1 = BoxAdapter(SimpleList(col_1),
                            height=len(col_1))
         col_2 = BoxAdapter(SimpleList(col_2, is_selectable=False),
                            height=len(col_2))
-        return Columns([(16, col_1), col_2], 2)
+        self.model_inputs.original_widget = Columns([(16, col_1), col_2], 2)
 
-    def _build_menu(self):
-        log.debug('FileSystemView: building menu')
+    def _update_menu(self):
+        show = len(self.model.get_available_disk_names()) > 1
+        if show == self._menu_shown:
+            return
+        self._menu_shown = show
         opts = []
-        avail_disks = self.model.get_available_disk_names()
-        for opt, sig in self.model.get_menu():
-            if len(avail_disks) > 1:
+        if show:
+            for opt, sig in self.model.get_menu():
                 opts.append(Color.menu_button(
                             menu_btn(label=opt,
                                      on_press=self.on_fs_menu_press,
                                      user_data=sig),
                             focus_map='menu_button focus'))
-        return Pile(opts)
+        self.menu.original_widget = Pile(opts)
 
     def on_fs_menu_press(self, result, sig):
         self.signal.emit_signal(sig)
@@ -636,8 +699,8 @@ class FilesystemView(BaseView):
         self.signal.emit_signal('menu:filesystem:main', True)
 
     def done(self, button):
-        actions = self.model.get_actions()
-        self.signal.emit_signal('filesystem:finish', False, actions)
+        # the controller gets the actions, and shows what is wrong with them
+        self.signal.emit_signal('filesystem:finish', False)
 
     def show_disk_partition_view(self, partition):
         self.signal.emit_signal('menu:filesystem:main:show-disk-partition',
@@ -15,7 +15,7 @@
 
 import logging
 from urwid import (Text, Filler,
-                   Pile)
+                   Pile, ProgressBar)
 
 from subiquitycore.view import BaseView
 from subiquitycore.ui.buttons import confirm_btn
@@ -32,7 +32,13 @@ class ProgressView(BaseView):
         self.model = model
         self.signal = signal
         self.text = Text("Wait for it ...", align="left")
+        self.bar = ProgressBar(normal='progress_incomplete',
+                               complete='progress_complete')
+        self.stages = Text("", align="left")
         self.body = [
+            Padding.center_79(self.bar),
+            Padding.center_79(self.stages),
+            Padding.line_break(""),
             Padding.center_79(self.text),
             Padding.line_break(""),
         ]
@@ -52,10 +58,30 @@ class ProgressView(BaseView):
 
         self.pile.contents.append((w, self.pile.options()))
         self.pile.contents.append((z, self.pile.options()))
-        self.pile.focus_position = 2
+        self.pile.focus_position = len(self.body)
+
+    def update_progress(self):
+        ''' Show the stages and percentage from the model '''
+        self.bar.set_completion(self.model.percent)
+        lines = []
+        for (name, description, seconds, result) in \
+                self.model.stage_durations():
+            lines.append("{:<20} {:>7.1f}s  {}".format(
+                name, seconds, result or description or ''))
+        eta = self.model.eta()
+        if eta is not None:
+            lines.append("About {} left".format(_format_seconds(eta)))
+        self.stages.set_text("\n".join(lines))
 
     def reboot(self, btn):
         self.signal.emit_signal('installprogress:curtin-reboot')
 
     def quit(self, btn):
         self.signal.emit_signal('quit')
+
+
+def _format_seconds(seconds):
+    (minutes, seconds) = divmod(int(seconds), 60)
+    if minutes:
+        return "{}m{:02d}s".format(minutes, seconds)
+    return "{}s".format(seconds)
@@ -0,0 +1,152 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Answers file
+
+Runs the application unattended.  The answers file is YAML, a mapping
+from controller name to that controller's answers (see
+examples/answers.yaml):
+
+    Welcome:
+      language: English
+    Filesystem:
+      disk: /dev/sda
+
+Instead of showing its screen, each controller is given its answers in
+its unattended() method, and calls the same model methods and emits the
+same signals its views would.  Nothing is drawn: HeadlessLoop stands in
+for urwid's MainLoop.
+"""
+
+import fcntl
+import logging
+import os
+import sys
+
+import urwid
+from tornado.ioloop import IOLoop
+
+log = logging.getLogger('subiquitycore.answers')
+
+PIPE_READ_SIZE = 4096
+
+
+class AnswersError(ValueError):
+    """ The answers can not be used """
+    pass
+
+
+def load_answers(path, controllers):
+    ''' The answers in the file `path', by controller name.  Every name
+        must be one of `controllers'; missing answers are {}. '''
+    import yaml
+    try:
+        with open(path) as fp:
+            answers = yaml.safe_load(fp)
+    except (OSError, yaml.YAMLError) as e:
+        raise AnswersError('cannot read answers file {}: {}'.format(path, e))
+    if answers is None:
+        answers = {}
+    if not isinstance(answers, dict):
+        raise AnswersError('{}: expected answers by controller '
+                           'name'.format(path))
+    for (name, value) in answers.items():
+        if name not in controllers:
+            raise AnswersError('{}: no controller called {}'.format(
+                path, name))
+        if value is None:
+            answers[name] = {}
+        elif not isinstance(value, dict):
+            raise AnswersError('{}: the answers for {} are not a '
+                               'mapping'.format(path, name))
+    for name in controllers:
+        answers.setdefault(name, {})
+    log.debug('answers for %s', ', '.join(sorted(answers)))
+    return answers
+
+
+class HeadlessLoop:
+    ''' What the controllers use of urwid.MainLoop (alarms, watched pipes
+        and draw_screen) on a tornado IOLoop, with no screen.
+
+        As with MainLoop, urwid.ExitMainLoop raised by a callback ends
+        run(), and any other exception ends it and is raised again by
+        run().
+    '''
+
+    def __init__(self, ioloop=None):
+        if ioloop is None:
+            ioloop = IOLoop()
+        self.ioloop = ioloop
+        self._watch_pipes = {}
+        self._exc_info = None
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except urwid.ExitMainLoop:
+            self.ioloop.stop()
+        except Exception:
+            log.exception('Exception in headless loop callback')
+            self._exc_info = sys.exc_info()
+            self.ioloop.stop()
+
+    def set_alarm_in(self, sec, callback, user_data=None):
+        return self.ioloop.call_later(sec, self._call, callback, self,
+                                      user_data)
+
+    def remove_alarm(self, handle):
+        self.ioloop.remove_timeout(handle)
+        return True
+
+    def watch_pipe(self, callback):
+        ''' Call `callback' with what is written to the returned file
+            descriptor, until it returns False.  The caller closes the
+            write end. '''
+        (pipe_rd, pipe_wr) = os.pipe()
+        flags = fcntl.fcntl(pipe_rd, fcntl.F_GETFL)
+        fcntl.fcntl(pipe_rd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+        def read_pipe():
+            try:
+                data = os.read(pipe_rd, PIPE_READ_SIZE)
+            except BlockingIOError:
+                return
+            if (callback(data) is False or not data) and \
+               self._watch_pipes.get(pipe_wr) == pipe_rd:
+                self.remove_watch_pipe(pipe_wr)
+
+        self.ioloop.add_handler(
+            pipe_rd, lambda fd, events: self._call(read_pipe), IOLoop.READ)
+        self._watch_pipes[pipe_wr] = pipe_rd
+        return pipe_wr
+
+    def remove_watch_pipe(self, write_fd):
+        pipe_rd = self._watch_pipes.pop(write_fd, None)
+        if pipe_rd is None:
+            return False
+        self.ioloop.remove_handler(pipe_rd)
+        os.close(pipe_rd)
+        return True
+
+    def draw_screen(self):
+        pass
+
+    def run(self):
+        self.ioloop.start()
+        if self._exc_info is not None:
+            exc_info = self._exc_info
+            self._exc_info = None
+            raise exc_info[1].with_traceback(exc_info[2])
@@ -22,7 +22,7 @@ The way this works is you create your non-blocking thread:
 .. code::
 
     def my_async_method(self):
-        pool.submit(func, *args)
+        Async.pools['io'].submit(func, *args)
 
     # In your controller you would then call using coroutines
 
@@ -34,14 +34,239 @@ The way this works is you create your non-blocking thread:
             self.do_second_async_action()
         except Exeception as e:
             log.exception("Failed in our non-blocking code.")
+
+Work goes to one of several named pools so that a long job (a curtin
+install in the 'subprocess' pool) does not hold up short ones (network
+tasks in the 'io' pool):
+
+.. code::
+
+    token = CancellationToken()
+    fut = Async.schedule('io', func, args=(token,),
+                         priority=PRIORITY_HIGH, token=token)
+    ...
+    token.cancel()
+
+Queued work is dropped when its token is cancelled; running work is
+expected to look at the token now and then and stop.
 """
 
+import heapq
+import itertools
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+from concurrent.futures import CancelledError, Executor, Future
 log = logging.getLogger("subiquitycore.async")
 
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class CancellationToken():
+    ''' Shared between whoever wants some work to stop and the work '''
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                log.exception('cancellation callback {} failed'.format(
+                              callback))
+
+    def add_callback(self, callback):
+        ''' Call `callback()' on cancellation, right away if the token
+            is already cancelled '''
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        ''' Forget `callback', if it is still waiting '''
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CancelledError()
+
+    def wait(self, timeout=None):
+        ''' Sleep until cancelled or `timeout' passed, returns True if
+            cancelled '''
+        return self._event.wait(timeout)
+
+
+class _WorkItem():
+    def __init__(self, future, fn, args, kwargs, token):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.token = token
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            if self.token is not None:
+                self.token.raise_if_cancelled()
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class PriorityPool(Executor):
+    ''' A thread pool running the queued work with the lowest priority
+        value first (FIFO among equal priorities).
+
+        Threads are started as work comes in, up to `workers'.  Counters
+        for monitoring are returned by stats().
+    '''
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = max(workers, 1)
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._idle = 0
+        self._shutdown = False
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.max_queue_depth = 0
+
+    def __repr__(self):
+        return 'PriorityPool({!r}, {})'.format(self.name, self.workers)
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def submit(self, fn, *args, **kwargs):
+        return self.schedule(fn, args, kwargs)
+
+    def schedule(self, fn, args=(), kwargs=None, priority=PRIORITY_NORMAL,
+                 token=None):
+        ''' Queue `fn(*args, **kwargs)', returns its Future.  If `token'
+            is cancelled before the work started, it never runs. '''
+        future = Future()
+        item = _WorkItem(future, fn, args, kwargs or {}, token)
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule on {} after '
+                                   'shutdown'.format(self))
+            heapq.heappush(self._queue, (priority, next(self._seq), item))
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth,
+                                       len(self._queue))
+            if len(self._queue) > self._idle and \
+               len(self._threads) < self.workers:
+                self._start_thread()
+            self._cond.notify()
+        if token is not None:
+            # a token can outlive many tasks: forget the ones that are done
+            token.add_callback(future.cancel)
+            future.add_done_callback(
+                lambda f: token.remove_callback(f.cancel))
+        return future
+
+    def _start_thread(self):
+        t = threading.Thread(
+            target=self._worker,
+            name='{}-{}'.format(self.name, len(self._threads)))
+        t.daemon = True
+        self._threads.append(t)
+        t.start()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+                while not self._queue and not self._shutdown:
+                    self._cond.wait()
+                self._idle -= 1
+                if not self._queue:
+                    return
+                (_, _, item) = heapq.heappop(self._queue)
+                self.running += 1
+            item.run()
+            with self._cond:
+                self.running -= 1
+                if item.future.cancelled():
+                    self.cancelled += 1
+                else:
+                    self.completed += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'threads': len(self._threads),
+                'queued': len(self._queue),
+                'running': self.running,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'cancelled': self.cancelled,
+                'max_queue_depth': self.max_queue_depth,
+            }
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for t in threads:
+                t.join()
+
 
 class Async:
-    log.debug('instantiating ThreadPoolExector')
-    pool = ThreadPoolExecutor(1)
-    log.debug('pool={}'.format(pool))
+    ''' The application's named pools:
+
+        io: short jobs mostly waiting on the kernel or the network
+        subprocess: long running commands, e.g. curtin
+        cpu: number crunching, one thread per CPU
+    '''
+    log.debug('instantiating pools')
+    pools = {
+        'io': PriorityPool('io', 4),
+        'subprocess': PriorityPool('subprocess', 2),
+        'cpu': PriorityPool('cpu', os.cpu_count() or 1),
+    }
+    # kept for the callers of the old single-threaded pool
+    pool = pools['io']
+    log.debug('pools={}'.format(pools))
+
+    @classmethod
+    def schedule(cls, pool, fn, args=(), kwargs=None,
+                 priority=PRIORITY_NORMAL, token=None):
+        return cls.pools[pool].schedule(fn, args, kwargs, priority, token)
+
+    @classmethod
+    def stats(cls):
+        return {name: pool.stats() for (name, pool) in cls.pools.items()}
@@ -0,0 +1,91 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Bytecode bundle
+
+Packs the application's packages, compiled, into one zip file.  Live
+media are often too slow (or read-only) for Python to compile and cache
+bytecode at startup; with the bundle, startup reads one file holding
+ready-made bytecode.  The bin scripts put the bundle named by
+$SUBIQUITY_BUNDLE first on sys.path.  Build it with the same Python
+that will run it, e.g.:
+
+    python3 -m subiquitycore.bundle build/subiquity.zip
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+import zipfile
+
+log = logging.getLogger('subiquitycore.bundle')
+
+BUNDLE_ENV = 'SUBIQUITY_BUNDLE'
+PACKAGES = ['subiquitycore', 'subiquity', 'console_conf']
+# bundled too when they can be found, e.g. a probert checkout
+OPTIONAL_PACKAGES = ['probert']
+
+
+def package_dir(name):
+    spec = importlib.util.find_spec(name)
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return list(spec.submodule_search_locations)[0]
+
+
+def _not_tests(path):
+    return os.path.basename(path) != 'tests'
+
+
+def build_bundle(path, packages=PACKAGES, optional=OPTIONAL_PACKAGES,
+                 optimize=-1):
+    ''' Write `packages' (and whichever of `optional' are installed),
+        compiled, to the zip file `path'.  Returns the packages that
+        went in. '''
+    found = []
+    dirs = []
+    for name in list(packages) + list(optional):
+        pkgdir = package_dir(name)
+        if pkgdir is None:
+            if name in packages:
+                raise ValueError('package {} not found'.format(name))
+            continue
+        found.append(name)
+        dirs.append(pkgdir)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + '.tmp'
+    with zipfile.PyZipFile(tmp, 'w', optimize=optimize) as bundle:
+        for pkgdir in dirs:
+            bundle.writepy(pkgdir, filterfunc=_not_tests)
+    os.rename(tmp, path)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help='zip file to write')
+    parser.add_argument('-O', dest='optimize', type=int, default=-1,
+                        help='optimization level, as for compile()')
+    opts = parser.parse_args()
+    found = build_bundle(opts.output, optimize=opts.optimize)
+    print('{}: {} ({} KiB)'.format(opts.output, ', '.join(found),
+                                   os.path.getsize(opts.output) // 1024))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -29,6 +29,8 @@ class BaseController:
         self.loop = common['loop']
         self.prober = common['prober']
         self.controllers = common['controllers']
+        # all the answers when running unattended, None otherwise
+        self.answers = common.get('answers')
 
     def register_signals(self):
         """Defines signals associated with controller from model."""
@@ -39,3 +41,9 @@ class BaseController:
 
     def default(self):
         raise NotImplementedError(self.default)
+
+    def unattended(self, answers):
+        """Do what default() and the user would, from `answers' (this
+        controller's part of the answers file), without a screen.
+        Raises AnswersError if they can not be used."""
+        raise NotImplementedError(self.unattended)
@@ -14,12 +14,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import re
+from subiquitycore.answers import AnswersError
 from subiquitycore.controller import BaseController
-from subiquitycore.models import IdentityModel
-from subiquitycore.ui.views import LoginView
+from subiquitycore.models.identity import IdentityModel
+from subiquitycore.ui.views.login import LoginView
 
 log = logging.getLogger('subiquitycore.controllers.identity')
 
+# what UsernameEditor lets one type
+USERNAME_RE = re.compile(r'[a-z_][a-z0-9_-]*$')
+
 
 class BaseIdentityController(BaseController):
 
@@ -43,6 +48,23 @@ class BaseIdentityController(BaseController):
         self.ui.set_footer(footer, 40)
         self.ui.set_body(self.identity_view(self.model, self.signal, self.opts))
 
+    def unattended(self, answers):
+        for key in ('hostname', 'username'):
+            value = str(answers.get(key, ''))
+            if value and USERNAME_RE.match(value) is None:
+                raise AnswersError('invalid {} {}'.format(key, value))
+        # fill in and submit the view, so the answers get the same checks
+        view = self.identity_view(self.model, self.signal, self.opts)
+        view.realname.value = str(answers.get('realname', ''))
+        view.hostname.value = str(answers.get('hostname', ''))
+        view.username.value = str(answers.get('username', ''))
+        view.password.value = str(answers.get('password', ''))
+        view.confirm_password.value = view.password.value
+        view.ssh_import_id.value = str(answers.get('ssh-import-id', ''))
+        view.done(None)
+        if view.error.text:
+            raise AnswersError(view.error.text)
+
     def identity_done(self):
         self.signal.emit_signal('identity:login')
 
@@ -23,21 +23,64 @@ import time
 import netifaces
 import yaml
 
-from subiquitycore.async import Async
-from subiquitycore.models import NetworkModel
-from subiquitycore.ui.views import (NetworkView,
-                                    NetworkSetDefaultRouteView,
-                                    NetworkBondInterfacesView,
-                                    NetworkConfigureInterfaceView,
-                                    NetworkConfigureIPv4InterfaceView,
-                                    NetworkConfigureWLANView)
-from subiquitycore.ui.views.network import ApplyingConfigWidget
+from subiquitycore.answers import AnswersError
+from subiquitycore.async import Async, CancellationToken
+from subiquitycore.models.network import (NetworkModel,
+                                          valid_ipv4_address,
+                                          valid_ipv4_network)
+from subiquitycore.netlink import (RTMGRP_IPV4_ROUTE,
+                                   RTMGRP_IPV6_ROUTE,
+                                   RTMGRP_LINK,
+                                   RtnetlinkMonitor)
+from subiquitycore.ui.views.network import (ApplyingConfigWidget,
+                                            NetworkView)
+from subiquitycore.ui.views.network_bond_interfaces import (
+    NetworkBondInterfacesView)
+from subiquitycore.ui.views.network_configure_interface import (
+    NetworkConfigureInterfaceView,
+    NetworkConfigureWLANView)
+from subiquitycore.ui.views.network_configure_ipv4_interface import (
+    NetworkConfigureIPv4InterfaceView)
+from subiquitycore.ui.views.network_default_route import (
+    NetworkSetDefaultRouteView)
 from subiquitycore.ui.dummy import DummyView
 from subiquitycore.controller import BaseController
 from subiquitycore.utils import run_command_start, run_command_summarize
 
 log = logging.getLogger("subiquitycore.controller.network")
 
+NETPLAN_CONFIG = '/etc/netplan/00-snapd-config.yaml'
+NETPLAN_HEADER = "# This is the network config written by 'console-conf'\n"
+
+
+def write_netplan_config(config, path=NETPLAN_CONFIG):
+    """Write `config' to `path' unless it already says the same.
+
+    The file is replaced atomically, so netplan never sees half of it.
+    Returns True if the file was (re)written.
+    """
+    content = NETPLAN_HEADER + yaml.dump(config)
+    try:
+        with open(path) as fp:
+            current = fp.read()
+    except OSError:
+        current = None
+    if current == content:
+        return False
+    if current is not None:
+        try:
+            if yaml.safe_load(current) == config:
+                return False
+        except yaml.YAMLError:
+            pass
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fp:
+        fp.write(content)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.rename(tmp, path)
+    return True
+
 
 class BackgroundTask:
     """Something that runs without blocking the UI and can be canceled."""
@@ -76,113 +119,293 @@ class BackgroundProcess(BackgroundTask):
             pass # It's OK if the process has already terminated.
 
 
-class PythonSleep(BackgroundTask):
+class PipeCanceledTask(BackgroundTask):
+    """A task that waits in select() on self.r, which cancel() makes
+    readable.
+
+    The pipe only exists while the task runs, so a task canceled before
+    it gets to run holds no file descriptors.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.canceled = False
+        self.r = self.w = None
+
+    def open_pipe(self):
+        """Returns False if the task was canceled already."""
+        with self.lock:
+            if self.canceled:
+                return False
+            self.r, self.w = os.pipe()
+            return True
+
+    def close_pipe(self):
+        with self.lock:
+            os.close(self.r)
+            os.close(self.w)
+            self.r = self.w = None
+
+    def cancel(self):
+        with self.lock:
+            self.canceled = True
+            if self.w is not None:
+                os.write(self.w, b'x')
+
+
+class PythonSleep(PipeCanceledTask):
 
     def __init__(self, duration):
+        super().__init__()
         self.duration = duration
-        self.r, self.w = os.pipe()
 
     def __repr__(self):
         return 'PythonSleep(%r)'%(self.duration,)
 
     def run(self, observer):
-        r, _, _ = select.select([self.r], [], [], self.duration)
-        if not r:
-            observer.task_succeeded()
-        os.close(self.r)
-        os.close(self.w)
+        if not self.open_pipe():
+            return
+        try:
+            r, _, _ = select.select([self.r], [], [], self.duration)
+            if not r:
+                observer.task_succeeded()
+        finally:
+            self.close_pipe()
 
-    def cancel(self):
-        os.write(self.w, b'x')
 
+class WaitForDefaultRouteTask(PipeCanceledTask):
+    """Wait until there is a default route, for at least one of
+    `families' or, with all_families=True, for each of them.
 
-class WaitForDefaultRouteTask(BackgroundTask):
+    Sleeps on an rtnetlink socket and only looks at the routing table
+    again when the kernel reports a route or link change.
+    """
 
-    def __init__(self, timeout):
+    def __init__(self, timeout, families=(netifaces.AF_INET,
+                                          netifaces.AF_INET6),
+                 all_families=False):
+        super().__init__()
         self.timeout = timeout
-        self.r, self.w = os.pipe()
+        self.families = families
+        self.all_families = all_families
 
     def __repr__(self):
         return 'WaitForDefaultRouteTask(%r)'%(self.timeout,)
 
+    def have_default_route(self):
+        defaults = netifaces.gateways().get('default', {})
+        found = [family in defaults for family in self.families]
+        if self.all_families:
+            return all(found)
+        return any(found)
+
+    def _open_monitor(self):
+        try:
+            return RtnetlinkMonitor(RTMGRP_LINK |
+                                    RTMGRP_IPV4_ROUTE |
+                                    RTMGRP_IPV6_ROUTE)
+        except OSError:
+            log.exception("cannot listen to rtnetlink, polling for routes")
+            return None
+
     def run(self, observer):
+        if not self.open_pipe():
+            return
+        # Subscribe before the first look, so that a route showing up in
+        # between is not missed.
+        monitor = self._open_monitor()
         try:
-            start = time.time()
-            while time.time() - start < self.timeout:
-                if len(netifaces.gateways().get('default', {})) > 0:
+            deadline = time.time() + self.timeout
+            while True:
+                if self.have_default_route():
                     observer.task_succeeded()
                     return
-                r, _, _ = select.select([self.r], [], [], 0.1)
-                if r: # we've been canceled
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                if monitor is None:
+                    fds = [self.r]
+                    remaining = min(remaining, 0.1)
+                else:
+                    fds = [self.r, monitor]
+                r, _, _ = select.select(fds, [], [], remaining)
+                if self.r in r: # we've been canceled
                     return
+                if monitor in r:
+                    # What changed does not matter, only the result.
+                    monitor.read_events()
             observer.task_failed()
         finally:
-            os.close(self.r)
-            os.close(self.w)
+            if monitor is not None:
+                monitor.close()
+            self.close_pipe()
+
+
+class _TaskObserver:
+    """What a task running in a TaskGraph reports back to."""
+
+    def __init__(self, graph, stage):
+        self.graph = graph
+        self.stage = stage
+
+    def task_succeeded(self):
+        self.graph.call_from_thread(self.graph._task_succeeded, self.stage)
+
+    def task_failed(self):
+        self.graph.call_from_thread(self.graph._task_failed, self.stage)
 
-    def cancel(self):
-        os.write(self.w, b'x')
 
+class TaskGraph:
+    """Run BackgroundTasks as soon as the tasks they depend on succeeded.
+
+    `tasks' is a list of (stage, task) or (stage, task, [stages it
+    depends on]).  Tasks that do not depend on each other run
+    concurrently in the Async 'io' pool.  The watcher is told about
+    every task_complete(stage), the first task_error(stage) (after
+    which nothing new is started) and tasks_finished(), always on the
+    event loop thread.
+    """
 
-class TaskSequence:
     def __init__(self, loop, tasks, watcher):
         self.loop = loop
-        self.tasks = tasks
         self.watcher = watcher
         self.canceled = False
-        self.stage = None
-        self.curtask = None
+        self.failed = False
+        self.tasks = {}
+        self.deps = {}
+        self.order = []
+        for t in tasks:
+            stage, task = t[:2]
+            if stage in self.tasks:
+                raise ValueError("duplicate stage %r" % (stage,))
+            self.tasks[stage] = task
+            self.deps[stage] = set(t[2]) if len(t) > 2 else set()
+            self.order.append(stage)
+        self._check()
+        self.pending = set(self.order)
+        self.running = set()
+        self.done = set()
+        self.token = CancellationToken()
         self.incoming = queue.Queue()
-        self.outgoing = queue.Queue()
+        self.pipe_lock = threading.Lock()
         self.pipe = self.loop.watch_pipe(self._thread_callback)
 
+    def _check(self):
+        for stage in self.order:
+            for dep in self.deps[stage]:
+                if dep not in self.tasks:
+                    raise ValueError(
+                        "stage %r depends on unknown stage %r" % (stage, dep))
+        # every stage must eventually become ready
+        ready = set()
+        remaining = list(self.order)
+        while remaining:
+            now = [s for s in remaining if self.deps[s] <= ready]
+            if not now:
+                raise ValueError("dependency cycle between %r" % (remaining,))
+            ready.update(now)
+            remaining = [s for s in remaining if s not in ready]
+
+    @property
+    def stage(self):
+        """Stages currently running."""
+        return sorted(self.running)
+
     def run(self):
-        self._run1()
+        if not self.order:
+            self._finish()
+            return
+        self._start_ready()
 
     def cancel(self):
-        if self.curtask is not None:
-            log.debug("canceling %s", self.curtask)
-            self.curtask.cancel()
         self.canceled = True
-
-    def _run1(self):
-        self.stage, self.curtask = self.tasks[0]
-        self.tasks = self.tasks[1:]
-        log.debug('running %s for stage %s', self.curtask, self.stage)
+        self.token.cancel()
+        for stage in list(self.running):
+            log.debug("canceling %s", self.tasks[stage])
+            self.tasks[stage].cancel()
+        self._close()
+
+    def _start_ready(self):
+        for stage in self.order:
+            if stage in self.pending and self.deps[stage] <= self.done:
+                self.pending.discard(stage)
+                self.running.add(stage)
+                self._start(stage)
+
+    def _start(self, stage):
+        task = self.tasks[stage]
+        log.debug('running %s for stage %s', task, stage)
         def cb(fut):
             # We do this just so that any exceptions raised don't get lost.
             # Vomiting a traceback all over the console is nasty, but not as
             # nasty as silently doing nothing.
-            fut.result()
-        Async.pool.submit(self.curtask.run, self).add_done_callback(cb)
+            if not fut.cancelled():
+                fut.result()
+        Async.schedule('io', task.run, (_TaskObserver(self, stage),),
+                       token=self.token).add_done_callback(cb)
 
     def call_from_thread(self, func, *args):
+        # Never wait for the UI: queue the call and poke the loop.
         log.debug('call_from_thread %s %s', func, args)
         self.incoming.put((func, args))
-        os.write(self.pipe, b'x')
-        self.outgoing.get()
+        with self.pipe_lock:
+            # once closed, nothing is interested any more
+            if self.pipe is not None:
+                os.write(self.pipe, b'x')
 
     def _thread_callback(self, ignored):
-        func, args = self.incoming.get()
-        func(*args)
-        self.outgoing.put(None)
-
-    def task_succeeded(self):
-        self.call_from_thread(self._task_succeeded)
-
-    def _task_succeeded(self):
-        if self.canceled:
+        # Writes can get coalesced, so drain everything there is.
+        while True:
+            try:
+                func, args = self.incoming.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+
+    def _task_succeeded(self, stage):
+        self.running.discard(stage)
+        if self.canceled or self.failed:
             return
-        self.watcher.task_complete(self.stage)
-        if len(self.tasks) == 0:
-            self.watcher.tasks_finished()
+        self.done.add(stage)
+        self.watcher.task_complete(stage)
+        if len(self.done) == len(self.order):
+            self._finish()
         else:
-            self._run1()
+            self._start_ready()
 
-    def task_failed(self):
-        if self.canceled:
+    def _task_failed(self, stage):
+        self.running.discard(stage)
+        if self.canceled or self.failed:
             return
-        self.call_from_thread(self.watcher.task_error, self.stage)
+        self.failed = True
+        self.token.cancel()
+        for other in list(self.running):
+            self.tasks[other].cancel()
+        self._close()
+        self.watcher.task_error(stage)
+
+    def _finish(self):
+        self._close()
+        self.watcher.tasks_finished()
+
+    def _close(self):
+        with self.pipe_lock:
+            if self.pipe is not None:
+                self.loop.remove_watch_pipe(self.pipe)
+                os.close(self.pipe)
+                self.pipe = None
+
+
+class TaskSequence(TaskGraph):
+    """A TaskGraph where each task depends on the one before it."""
+
+    def __init__(self, loop, tasks, watcher):
+        chained = []
+        prev = None
+        for stage, task in tasks:
+            chained.append((stage, task, [prev] if prev is not None else []))
+            prev = stage
+        super().__init__(loop, chained, watcher)
 
 
 class NetworkController(BaseController):
@@ -199,6 +422,8 @@ class NetworkController(BaseController):
     def __init__(self, common):
         super().__init__(common)
         self.model = NetworkModel(self.prober, self.opts)
+        # set while the last 'netplan apply' has not succeeded
+        self.netplan_apply_failed = False
 
     def default(self):
         self.model.reset()
@@ -206,6 +431,54 @@ class NetworkController(BaseController):
         self.model.probe_network()
         self.signal.emit_signal('menu:network:main:start')
 
+    def unattended(self, answers):
+        self.model.reset()
+        log.info("probing for network devices")
+        self.model.probe_network()
+        # interfaces not in the answers keep what was probed
+        for (ifname, config) in answers.get('interfaces', {}).items():
+            self.answer_interface(ifname, config or {})
+        try:
+            if 'default-v4-gateway' in answers:
+                self.model.set_default_v4_gateway(
+                    None, answers['default-v4-gateway'])
+            if 'default-v6-gateway' in answers:
+                self.model.set_default_v6_gateway(
+                    None, answers['default-v6-gateway'])
+        except ValueError as e:
+            raise AnswersError(str(e))
+        # network_finish shows its progress over the network view
+        self.start()
+        self.network_finish(self.model.render())
+
+    def answer_interface(self, ifname, config):
+        try:
+            iface = self.model.get_interface(ifname)
+        except KeyError:
+            raise AnswersError('no interface called {}'.format(ifname))
+        iface.remove_networks()
+        iface.dhcp4 = bool(config.get('dhcp4', False))
+        iface.dhcp6 = bool(config.get('dhcp6', False))
+        ipv4 = config.get('ipv4')
+        if ipv4 is None:
+            return
+        # as NetworkConfigureIPv4InterfaceView would have it
+        result = {
+            'network': ipv4.get('network', ''),
+            'address': ipv4.get('address', ''),
+            'gateway': ipv4.get('gateway', ''),
+            'nameserver': ipv4.get('nameserver', ''),
+            'searchdomains': ipv4.get('searchdomains', ''),
+        }
+        if '/' not in result['network'] or \
+           valid_ipv4_network(result['network']) is False:
+            raise AnswersError('{}: network should be in CIDR form '
+                               '(xx.xx.xx.xx/yy)'.format(ifname))
+        if valid_ipv4_address(result['address'].split('/')[0]) is False:
+            raise AnswersError('{}: invalid address {}'.format(
+                ifname, result['address']))
+        iface.add_network(netifaces.AF_INET, result)
+
     def start(self):
         title = "Network connections"
         excerpt = ("Configure at least the main interface this server will "
@@ -222,27 +495,33 @@ class NetworkController(BaseController):
             if hasattr(self, 'tried_once'):
                 tasks = [
                     ('one', BackgroundProcess(['sleep', '0.1'])),
-                    ('two', PythonSleep(0.1)),
-                    ('three', BackgroundProcess(['sleep', '0.1'])),
+                    ('two', PythonSleep(0.1), ['one']),
+                    ('three', BackgroundProcess(['sleep', '0.1']), ['one']),
                     ]
             else:
                 self.tried_once = True
                 tasks = [
                     ('timeout', WaitForDefaultRouteTask(30)),
-                    ('one', BackgroundProcess(['sleep', '0.1'])),
-                    ('two', BackgroundProcess(['sleep', '0.1'])),
-                    ('three', BackgroundProcess(['false'])),
-                    ('four', BackgroundProcess(['sleep', '0.1'])),
+                    ('one', BackgroundProcess(['sleep', '0.1']), ['timeout']),
+                    ('two', BackgroundProcess(['sleep', '0.1']), ['one']),
+                    ('three', BackgroundProcess(['false']), ['one']),
+                    ('four', BackgroundProcess(['sleep', '0.1']),
+                     ['two', 'three']),
                     ]
         else:
-            with open('/etc/netplan/00-snapd-config.yaml', 'w') as w:
-                w.write("# This is the network config written by 'console-conf'\n")
-                w.write(yaml.dump(config))
-            tasks = [
-                ('generate', BackgroundProcess(['/lib/netplan/generate'])),
-                ('apply', BackgroundProcess(['netplan', 'apply'])),
-                ('timeout', WaitForDefaultRouteTask(30)),
-                ]
+            changed = write_netplan_config(config)
+            if changed or self.netplan_apply_failed:
+                # 'netplan apply' runs the generator itself.
+                tasks = [
+                    ('apply', BackgroundProcess(['netplan', 'apply'])),
+                    ('timeout', WaitForDefaultRouteTask(30), ['apply']),
+                    ]
+                self.netplan_apply_failed = True
+            else:
+                log.debug("network config unchanged, not applying it")
+                tasks = [
+                    ('timeout', WaitForDefaultRouteTask(30)),
+                    ]
 
         def cancel():
             self.cs.cancel()
@@ -250,14 +529,22 @@ class NetworkController(BaseController):
         self.acw = ApplyingConfigWidget(len(tasks), cancel)
         self.ui.frame.body.show_overlay(self.acw)
 
-        self.cs = TaskSequence(self.loop, tasks, self)
+        self.cs = TaskGraph(self.loop, tasks, self)
         self.cs.run()
 
     def task_complete(self, stage):
+        if stage == 'apply':
+            self.netplan_apply_failed = False
         self.acw.advance()
 
     def task_error(self, stage):
         self.ui.frame.body.remove_overlay(self.acw)
+        if self.answers is not None:
+            # nobody to change the settings, install without the network
+            log.warning("network configuration failed (%s), going on "
+                        "unattended", stage)
+            self.signal.emit_signal('next-screen')
+            return
         self.ui.frame.body.show_network_error(stage)
 
     def tasks_finished(self):
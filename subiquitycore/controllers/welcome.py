@@ -14,8 +14,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from subiquitycore.ui.views import WelcomeView
-from subiquitycore.models import WelcomeModel
+from subiquitycore.answers import AnswersError
+from subiquitycore.ui.views.welcome import CoreWelcomeView as WelcomeView
+from subiquitycore.models.welcome import WelcomeModel
 from subiquitycore.controller import BaseController
 
 
@@ -39,5 +40,12 @@ class WelcomeController(BaseController):
         view = WelcomeView(self.model, self.signal)
         self.ui.set_body(view)
 
+    def unattended(self, answers):
+        language = answers.get('language', self.model.supported_languages[0])
+        if language not in self.model.supported_languages:
+            raise AnswersError('unsupported language {}'.format(language))
+        self.model.selected_language = language
+        self.signal.emit_signal('welcome:done')
+
     def done(self):
         self.signal.emit_signal('next-screen')
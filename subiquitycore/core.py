@@ -13,13 +13,20 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from importlib import import_module
 import logging
+import os
+import sys
+import time
 import urwid
 from tornado.ioloop import IOLoop
-from tornado.util import import_object
+from subiquitycore.answers import AnswersError, HeadlessLoop, load_answers
+from subiquitycore.async import Async, PRIORITY_LOW
+from subiquitycore.controller import BaseController
 from subiquitycore.signals import Signal
 from subiquitycore.palette import STYLES, STYLES_MONO
 from subiquitycore.prober import Prober, ProberException
+from subiquitycore.ui.serial import SerialMainLoop, SerialScreen
 
 log = logging.getLogger('subiquitycore.core')
 
@@ -29,6 +36,87 @@ class ApplicationError(Exception):
     pass
 
 
+def process_age():
+    ''' seconds since this process started, None if unknown '''
+    try:
+        with open('/proc/self/stat') as fp:
+            # the command name in field 2 may contain spaces
+            fields = fp.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as fp:
+            uptime = float(fp.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ControllerRegistry:
+    ''' The application's controllers by name, each imported and
+        instantiated (and its signals connected) when first looked up.
+
+        The controller called Name is NameController from the module
+        <project>.controllers.name, or else subiquitycore.controllers.name.
+    '''
+
+    def __init__(self, project, names, common):
+        self.project = project
+        self.names = list(names)
+        self.common = common
+        self.instances = {}
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, name):
+        if name not in self.instances:
+            self.load(name)
+        return self.instances[name]
+
+    def loaded(self, name):
+        return name in self.instances
+
+    def import_controller(self, name):
+        modname = name.lower()
+        for package in (self.project, 'subiquitycore'):
+            fullname = '{}.controllers.{}'.format(package, modname)
+            try:
+                module = import_module(fullname)
+            except ImportError as e:
+                if e.name != fullname:
+                    raise
+                continue
+            return getattr(module, name + 'Controller')
+        raise ApplicationError('No controller called {}'.format(name))
+
+    def load(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        start = time.time()
+        klass = self.import_controller(name)
+        controller = klass(self.common)
+        self.instances[name] = controller
+        controller.register_signals()
+        log.debug('loaded controller %s in %.1fms', name,
+                  (time.time() - start) * 1000)
+        return controller
+
+    def load_all(self):
+        for name in self.names:
+            self[name]
+
+    def warm_up(self, name):
+        ''' Import the controller's modules in the background, so that
+            loading it later is quick '''
+        if name in self.names and name not in self.instances:
+            Async.schedule('io', self.import_controller, (name,),
+                           priority=PRIORITY_LOW)
+
+
 class Application:
 
     # A concrete subclass must set project and controllers attributes, e.g.:
@@ -45,25 +133,61 @@ class Application:
     # ]
     # The 'next-screen' and 'prev-screen' signals move through the list of
     # controllers in order, calling the default method on the controller
-    # instance.
+    # instance.  Controllers are only imported and instantiated when they
+    # are first shown (or their signals are first emitted), the next one
+    # is imported in the background meanwhile.
+    #
+    # The probe data sections in 'probes' are probed in the background as
+    # soon as the application is created, so that they are (hopefully)
+    # ready by the time a controller needs them.
+    #
+    # With an answers file (opts.answers, see subiquitycore.answers)
+    # nothing is shown: each controller's unattended method is called
+    # with its answers instead of default.
+
+    probes = ["network", "storage"]
 
     def __init__(self, ui, opts):
+        self.start_time = time.time()
         try:
             prober = Prober(opts)
         except ProberException as e:
             err = "Prober init failed: {}".format(e)
             log.exception(err)
             raise ApplicationError(err)
+        prober.start_probing(self.probes)
+
+        answers = None
+        if getattr(opts, 'answers', None):
+            try:
+                answers = load_answers(opts.answers, self.controllers)
+            except AnswersError as e:
+                log.exception('Failed to load answers')
+                raise ApplicationError(str(e))
+
+        # parsed in the background so far, a bad one must still stop us
+        # before the first screen
+        try:
+            prober.check_machine_config()
+        except ProberException as e:
+            err = "Prober init failed: {}".format(e)
+            log.exception(err)
+            raise ApplicationError(err)
 
         self.common = {
             "ui": ui,
             "opts": opts,
             "signal": Signal(),
             "prober": prober,
-            "loop": None
+            "loop": None,
+            "answers": answers,
         }
-        self.common['controllers'] = dict.fromkeys(self.controllers)
+        self.common['controllers'] = ControllerRegistry(
+            self.project, self.controllers, self.common)
+        self.common['signal'].unknown_signal = self.unknown_signal
         self.controller_index = -1
+        self.first_paint = None
+        self.exit_status = 0
 
     def _connect_base_signals(self):
         """ Connect signals used in the core controller
@@ -77,20 +201,58 @@ class Application:
         signals.append(('refresh', self.redraw_screen))
         signals.append(('next-screen', self.next_screen))
         signals.append(('prev-screen', self.prev_screen))
+        signals.append(('unattended:failed', self.unattended_failed))
         self.common['signal'].connect_signals(signals)
-
-        # Registers signals from each controller
-        for controller, controller_class in self.common['controllers'].items():
-            controller_class.register_signals()
         log.debug(self.common['signal'])
 
+    def unknown_signal(self, name):
+        # Some controller that was not loaded yet must be listening
+        controllers = self.common['controllers']
+        if any(not controllers.loaded(c) for c in controllers):
+            log.debug('%s emitted, loading all controllers', name)
+            controllers.load_all()
+
     def next_screen(self, *args):
         self.controller_index += 1
         if self.controller_index >= len(self.controllers):
             self.exit()
         controller_name = self.controllers[self.controller_index]
         next_controller = self.common['controllers'][controller_name]
+        if self.common['answers'] is not None:
+            self.answer(controller_name, next_controller)
+            return
         next_controller.default()
+        if self.first_paint is None:
+            self.log_first_paint()
+        if self.controller_index + 1 < len(self.controllers):
+            self.common['controllers'].warm_up(
+                self.controllers[self.controller_index + 1])
+
+    def answer(self, controller_name, controller):
+        log.info('answering %s', controller_name)
+        if type(controller).unattended is BaseController.unattended:
+            self.unattended_failed(
+                '{} can not run unattended'.format(controller_name))
+            return
+        try:
+            controller.unattended(self.common['answers'][controller_name])
+        except AnswersError as e:
+            self.unattended_failed('{}: {}'.format(controller_name, e))
+
+    def unattended_failed(self, message):
+        log.error('unattended run failed: %s', message)
+        print('unattended run failed: {}'.format(message), file=sys.stderr)
+        self.exit_status = 1
+        self.exit()
+
+    def log_first_paint(self):
+        self.common['loop'].draw_screen()
+        self.first_paint = time.time()
+        age = process_age()
+        log.info('first paint %.0fms after the application started%s',
+                 (self.first_paint - self.start_time) * 1000,
+                 '' if age is None else
+                 ', {:.0f}ms after the process started'.format(age * 1000))
 
     def prev_screen(self, *args):
         if self.controller_index == 0:
@@ -125,36 +287,39 @@ class Application:
         return False
 
     def run(self):
-        if not hasattr(self, 'loop'):
+        if self.common['answers'] is not None:
+            # nothing to draw, only the event loop is needed
+            self.common['loop'] = HeadlessLoop(IOLoop())
+            log.info('running unattended, answers from %s',
+                     self.common['opts'].answers)
+        elif not hasattr(self, 'loop'):
             palette = STYLES
+            loop_class = urwid.MainLoop
             additional_opts = {
-                'screen': urwid.raw_display.Screen(),
                 'unhandled_input': self.header_hotkeys,
                 'handle_mouse': False
             }
             if self.common['opts'].run_on_serial:
+                # only send what changed, at a rate the link can take
                 palette = STYLES_MONO
+                loop_class = SerialMainLoop
+                additional_opts['screen'] = SerialScreen()
             else:
+                additional_opts['screen'] = urwid.raw_display.Screen()
                 additional_opts['screen'].set_terminal_properties(colors=256)
                 additional_opts['screen'].reset_default_terminal_palette()
 
             evl = urwid.TornadoEventLoop(IOLoop())
-            self.common['loop'] = urwid.MainLoop(
+            self.common['loop'] = loop_class(
                 self.common['ui'], palette, event_loop=evl, **additional_opts)
             log.debug("Running event loop: {}".format(
                 self.common['loop'].event_loop))
 
         try:
             self.set_alarm_in(0.05, self.next_screen)
-            for k in self.common['controllers']:
-                log.debug("Importing controller: {}".format(k))
-                klass = import_object(
-                    ("%s.controllers.{}Controller" % self.project).format(
-                        k))
-                self.common['controllers'][k] = klass(self.common)
-            log.debug("*** %s", self.common['controllers'])
             self._connect_base_signals()
             self.common['loop'].run()
         except:
             log.exception("Exception in controller.run():")
             raise
+        return self.exit_status
@@ -24,6 +24,9 @@ from subiquitycore import utils
 
 log = logging.getLogger("subiquitycore.curtin")
 
+# libyaml's emitter when available, it is a lot faster on large configs
+SafeDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
 TMPDIR = '/tmp'
 CURTIN_SEARCH_PATH = ['/usr/local/curtin/bin', '/usr/bin']
 CURTIN_INSTALL_PATH = ['/media/root-ro', '/']
@@ -34,22 +37,35 @@ CURTIN_NETWORK_CONFIG_FILE = CONF_PREFIX + 'network.yaml'
 CURTIN_STORAGE_CONFIG_FILE = CONF_PREFIX + 'storage.yaml'
 CURTIN_PRESERVED_CONFIG_FILE = CONF_PREFIX + 'storage-preserved.yaml'
 POST_INSTALL_CONFIG_FILE = CONF_PREFIX + 'postinst.yaml'
+CURTIN_REPORTING_CONFIG_FILE = CONF_PREFIX + 'reporting.yaml'
 CURTIN_CONFIGS = {
     'network': CURTIN_NETWORK_CONFIG_FILE,
     'storage': CURTIN_STORAGE_CONFIG_FILE,
     'postinstall': POST_INSTALL_CONFIG_FILE,
     'preserved': CURTIN_PRESERVED_CONFIG_FILE,
+    'reporting': CURTIN_REPORTING_CONFIG_FILE,
 }
-CURTIN_CONFIG_HEADER = """
+CURTIN_REPORTING_HEADER = """
 reporting:
  subiquity:
   type: print
+"""
 
+CURTIN_REPORTING_WEBHOOK = """
+reporting:
+ subiquity_events:
+  type: webhook
+  endpoint: {}
+"""
+
+CURTIN_PARTITIONING_HEADER = """
 partitioning_commands:
  builtin: curtin block-meta custom
 
 """
 
+CURTIN_CONFIG_HEADER = CURTIN_REPORTING_HEADER + CURTIN_PARTITIONING_HEADER
+
 CURTIN_LOG_HEADER = """
 install:
   log_file: {}
@@ -60,16 +76,6 @@ power_state:
   message: s-Ubiquity install complete. Rebooting
   mode: reboot
 """
-CURTIN_STORAGE_CONFIG_HEADER = """
-storage:
-  version: 1
-  config:
-"""
-CURTIN_NETWORK_CONFIG_HEADER = """
-network:
-  version: 1
-  config:
-"""
 
 # TODO, this should be moved to the in-target cloud-config seed so on first
 # boot of the target, it reconfigures datasource_list to none for subsequent
@@ -124,34 +130,98 @@ def curtin_write_postinst_config(userinfo):
         conf.close()
 
 
+def curtin_write_reporting_config(endpoint):
+    ''' Write the config having curtin report its events to `endpoint'.
+        It is written when curtin is about to run and passed next to the
+        other configs, whose reporting section curtin merges it into, so
+        it does not matter when those were written. '''
+    with open(CURTIN_REPORTING_CONFIG_FILE, 'w') as conf:
+        datestr = '# Autogenerated by SUbiquity: {} UTC'.format(
+            str(datetime.datetime.utcnow()))
+        conf.write(datestr)
+        conf.write(CURTIN_REPORTING_WEBHOOK.format(endpoint))
+
+
 def curtin_log_header(logfile=CURTIN_INSTALL_LOG):
     return CURTIN_LOG_HEADER.format(logfile)
 
 
-def curtin_write_storage_actions(actions):
-    curtin_config = yaml.dump(actions, default_flow_style=False)
-    curtin_config = "    " + "\n    ".join(curtin_config.splitlines())
+def _emit_node(dumper, node):
+    ''' Emit the events for a represented node, like yaml's Serializer
+        does (minus anchors, every action is represented on its own) '''
+    if isinstance(node, yaml.ScalarNode):
+        implicit = (
+            node.tag == dumper.resolve(yaml.ScalarNode, node.value,
+                                       (True, False)),
+            node.tag == dumper.resolve(yaml.ScalarNode, node.value,
+                                       (False, True)))
+        dumper.emit(yaml.ScalarEvent(None, node.tag, implicit, node.value,
+                                     style=node.style))
+    elif isinstance(node, yaml.SequenceNode):
+        implicit = node.tag == dumper.resolve(yaml.SequenceNode,
+                                              node.value, True)
+        dumper.emit(yaml.SequenceStartEvent(None, node.tag, implicit,
+                                            flow_style=node.flow_style))
+        for item in node.value:
+            _emit_node(dumper, item)
+        dumper.emit(yaml.SequenceEndEvent())
+    else:
+        implicit = node.tag == dumper.resolve(yaml.MappingNode,
+                                              node.value, True)
+        dumper.emit(yaml.MappingStartEvent(None, node.tag, implicit,
+                                           flow_style=node.flow_style))
+        for (key, value) in node.value:
+            _emit_node(dumper, key)
+            _emit_node(dumper, value)
+        dumper.emit(yaml.MappingEndEvent())
+
+
+def curtin_write_config(path, section, actions, log_header=None):
+    ''' Write a curtin config with `actions' as `section'.config, i.e.
+
+        section:
+          version: 1
+          config: actions
+
+        The actions are emitted one by one straight into the file, so
+        neither the YAML text nor the node graph of the whole config is
+        ever held in memory. '''
     datestr = '# Autogenerated by SUbiquity: {} UTC'.format(
         str(datetime.datetime.utcnow()))
-    with open(CURTIN_STORAGE_CONFIG_FILE, 'w') as conf:
+    with open(path, 'w') as conf:
         conf.write(datestr)
         conf.write(CURTIN_CONFIG_HEADER)
-        conf.write(curtin_log_header(logfile=CURTIN_INSTALL_LOG))
-        conf.write(CURTIN_STORAGE_CONFIG_HEADER)
-        conf.write(curtin_config)
-        conf.close()
+        if log_header is not None:
+            conf.write(log_header)
+        conf.write('\n')
+        dumper = SafeDumper(conf, default_flow_style=False)
+        dumper.emit(yaml.StreamStartEvent())
+        dumper.emit(yaml.DocumentStartEvent(explicit=False))
+        dumper.emit(yaml.MappingStartEvent(None, None, True))
+        _emit_node(dumper, dumper.represent_data(section))
+        dumper.emit(yaml.MappingStartEvent(None, None, True))
+        for item in ('version', 1, 'config'):
+            _emit_node(dumper, dumper.represent_data(item))
+        dumper.emit(yaml.SequenceStartEvent(None, None, True))
+        for action in actions:
+            _emit_node(dumper, dumper.represent_data(action))
+            dumper.represented_objects = {}
+            dumper.object_keeper = []
+        dumper.emit(yaml.SequenceEndEvent())
+        dumper.emit(yaml.MappingEndEvent())
+        dumper.emit(yaml.MappingEndEvent())
+        dumper.emit(yaml.DocumentEndEvent(explicit=False))
+        dumper.emit(yaml.StreamEndEvent())
+        dumper.dispose()
+
+
+def curtin_write_storage_actions(actions):
+    curtin_write_config(CURTIN_STORAGE_CONFIG_FILE, 'storage', actions,
+                        curtin_log_header(logfile=CURTIN_INSTALL_LOG))
 
 
 def curtin_write_network_actions(actions):
-    curtin_config = yaml.dump(actions, default_flow_style=False)
-    curtin_config = "    " + "\n    ".join(curtin_config.splitlines())
-    datestr = '# Autogenerated by SUbiquity: {} UTC'.format(
-        str(datetime.datetime.utcnow()))
-    with open(CURTIN_NETWORK_CONFIG_FILE, 'w') as conf:
-        conf.write(datestr)
-        conf.write(CURTIN_CONFIG_HEADER + CURTIN_NETWORK_CONFIG_HEADER)
-        conf.write(curtin_config)
-        conf.close()
+    curtin_write_config(CURTIN_NETWORK_CONFIG_FILE, 'network', actions)
 
 
 def curtin_apply_networking(actions, dryrun=True):
@@ -176,17 +246,8 @@ def curtin_apply_networking(actions, dryrun=True):
 def curtin_write_preserved_actions(actions):
     ''' caller must use models.actions.preserve_action on
         all elements of the actions'''
-    curtin_config = yaml.dump(actions, default_flow_style=False)
-    curtin_config = "    " + "\n    ".join(curtin_config.splitlines())
-    datestr = '# Autogenerated by SUbiquity: {} UTC'.format(
-        str(datetime.datetime.utcnow()))
-    with open(CURTIN_PRESERVED_CONFIG_FILE, 'w') as conf:
-        conf.write(datestr)
-        conf.write(CURTIN_CONFIG_HEADER)
-        conf.write(curtin_log_header(logfile=CURTIN_POSTINSTALL_LOG))
-        conf.write(CURTIN_STORAGE_CONFIG_HEADER)
-        conf.write(curtin_config)
-        conf.close()
+    curtin_write_config(CURTIN_PRESERVED_CONFIG_FILE, 'storage', actions,
+                        curtin_log_header(logfile=CURTIN_POSTINSTALL_LOG))
 
 
 def curtin_find_curtin():
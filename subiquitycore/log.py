@@ -13,16 +13,130 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+""" Logging
+
+Records are handed to a queue on the calling thread and formatted and
+written to the log file by a background thread, so that logging from
+the UI thread never waits for the disk.  Use %-style arguments, e.g.
+log.debug('disk=%s', disk), rather than .format(): the message is then
+not built at all if the level is off.  Messages whose arguments are all
+plain values (strings, numbers) or lazy() are built on the background
+thread too; any other argument could change before then, so those
+messages are built on the calling thread.  Wrap arguments that are
+expensive to turn into text, and do not change once logged, with
+lazy().
+
+Levels can be set per logger namespace, by passing `levels' to
+setup_logger() or with SUBIQUITY_LOG_LEVELS in the environment, e.g.
+SUBIQUITY_LOG_LEVELS=subiquitycore.prober=INFO,subiquity.signals=WARNING
+"""
+
+import atexit
+import copy
 import logging
 import os
+import queue
 import sys
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import (QueueHandler,
+                              QueueListener,
+                              TimedRotatingFileHandler)
 
 LOGDIR = "/writable/.subiquity"
 LOGFILE = os.path.join(LOGDIR, "subiquity-debug.log")
+LOG_LEVELS_ENV = 'SUBIQUITY_LOG_LEVELS'
+
+# levels set before those passed to setup_logger() or in the environment
+DEFAULT_LEVELS = {
+    # the navigation stack dump, see subiquitycore.signals
+    'subiquity.signals.trace': 'INFO',
+}
+
+_listener = None
+_handler = None
+
+
+class lazy:
+    ''' Log argument calling `func(*args, **kwargs)' only when the
+        message is actually formatted, on the log writer thread '''
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.func(*self.args, **self.kwargs))
+
+
+# log arguments that can be turned into text on the listener thread
+DEFERRED_ARG_TYPES = (str, bytes, int, float, bool, type(None), lazy)
+
 
+def _deferrable(args):
+    if isinstance(args, dict):
+        args = args.values()
+    return all(isinstance(arg, DEFERRED_ARG_TYPES) for arg in args or ())
 
-def setup_logger(name=__name__, dir=LOGDIR):
+
+class DeferredQueueHandler(QueueHandler):
+    ''' QueueHandler leaving the formatting to the QueueListener thread.
+
+        The stock QueueHandler runs the whole Formatter before queueing
+        the record.  Here a message is only merged with its arguments
+        right away when some of them could change before the listener
+        gets to it, and tracebacks are rendered while they still
+        describe the current exception. '''
+
+    def prepare(self, record):
+        # other handlers may still look at the original record
+        record = copy.copy(record)
+        if not _deferrable(record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec):
+    ''' "name=LEVEL,name=LEVEL" -> {name: LEVEL} '''
+    levels = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, level = item.rpartition('=')
+        if not sep:
+            # a bare level applies to everything
+            name = ''
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def set_levels(levels):
+    for (name, level) in levels.items():
+        try:
+            logging.getLogger(name).setLevel(level)
+        except (ValueError, TypeError):
+            sys.stderr.write(
+                'Ignoring bad log level {!r} for {!r}\n'.format(level, name))
+
+
+def stop_logger():
+    ''' Write out whatever is still queued '''
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def setup_logger(name=__name__, dir=LOGDIR, levels=None):
+    global _listener, _handler
     LOGFILE = os.path.join(dir, "subiquity-debug.log")
     try:
         os.makedirs(dir, exist_ok=True)
@@ -41,7 +155,21 @@ def setup_logger(name=__name__, dir=LOGDIR):
     # log_filter = logging.Filter(name='subiquity')
     # log.addFilter(log_filter)
 
+    stop_logger()
+    records = queue.Queue()
+    _listener = QueueListener(records, log)
+    _listener.start()
+
     logger = logging.getLogger('')
     logger.setLevel('DEBUG')
-    logger.addHandler(log)
+    if _handler is None:
+        atexit.register(stop_logger)
+    else:
+        # set up again, the old queue has nobody reading it any more
+        logger.removeHandler(_handler)
+    _handler = DeferredQueueHandler(records)
+    logger.addHandler(_handler)
+    set_levels(DEFAULT_LEVELS)
+    set_levels(levels or {})
+    set_levels(parse_levels(os.environ.get(LOG_LEVELS_ENV, '')))
     return LOGFILE
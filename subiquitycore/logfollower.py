@@ -0,0 +1,107 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Log follower
+
+In-process `tail -f': keeps the log open and reads whatever was
+appended since the last look into a ring buffer of the last lines.
+"""
+
+import logging
+import os
+from collections import deque
+
+log = logging.getLogger('subiquitycore.logfollower')
+
+READ_SIZE = 65536
+
+
+class LogFollower():
+    ''' Follow the log at `path', keeping its last `lines' lines.
+
+        poll() reads what was appended and returns True if the tail
+        changed.  A log that gets truncated or replaced is read again
+        from the start, and follow() switches to another log.
+    '''
+
+    def __init__(self, path, lines=10):
+        self.lines = deque(maxlen=lines)
+        self._fp = None
+        self.follow(path)
+
+    def follow(self, path):
+        self.close()
+        self.path = path
+        self.lines.clear()
+        self._partial = b''
+        self._offset = 0
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def _open(self):
+        try:
+            self._fp = open(self.path, 'rb')
+        except OSError:
+            return False
+        self._offset = 0
+        return True
+
+    def _restart(self):
+        ''' the file we were reading went away or shrank '''
+        log.debug('{} was truncated or replaced, reading it '
+                  'again'.format(self.path))
+        self.close()
+        changed = len(self.lines) > 0 or len(self._partial) > 0
+        self.lines.clear()
+        self._partial = b''
+        return changed
+
+    def poll(self):
+        changed = False
+        if self._fp is not None:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                st = None
+            fst = os.fstat(self._fp.fileno())
+            if st is None or st.st_ino != fst.st_ino or \
+               fst.st_size < self._offset:
+                changed = self._restart()
+        if self._fp is None and not self._open():
+            return changed
+
+        while True:
+            data = self._fp.read(READ_SIZE)
+            if not data:
+                break
+            self._offset += len(data)
+            changed = True
+            lines = (self._partial + data).split(b'\n')
+            self._partial = lines.pop()
+            self.lines.extend(lines)
+        return changed
+
+    def tail(self):
+        ''' The last lines, like `tail' would print them '''
+        lines = list(self.lines)
+        if self._partial:
+            lines = lines[1:] if len(lines) == self.lines.maxlen else lines
+            lines.append(self._partial)
+        else:
+            lines.append(b'')
+        return b'\n'.join(lines)
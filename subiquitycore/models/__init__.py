@@ -13,7 +13,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .network import NetworkModel  # NOQA
-from .welcome import WelcomeModel  # NOQA
-from .identity import IdentityModel  # NOQA
-from .login import LoginModel  # NOQA
+""" Core models
+
+Import models from their modules, so that a controller only loads the
+models it uses.
+"""
@@ -17,6 +17,7 @@ import errno
 import ipaddress
 import logging
 import os
+from collections import namedtuple
 
 import netifaces
 
@@ -29,13 +30,20 @@ NETDEV_IGNORED_IFACE_NAMES = ['lo']
 NETDEV_IGNORED_IFACE_TYPES = ['bridge', 'tun', 'tap', 'dummy', 'sit']
 log = logging.getLogger('subiquitycore.models.network')
 
+# What the views show about an interface, see NetworkModel._summarize()
+InterfaceSummary = namedtuple('InterfaceSummary', [
+    'ifname', 'type', 'hwaddr', 'bonded', 'bond_slave', 'bond_master',
+    'bridge_member', 'speed', 'vendor', 'model', 'ip4', 'ip6'])
+
 
 class Networkdev():
     def __init__(self, ifname, iftype, probe_info=None):
         self.ifname = ifname
         self.iftype = iftype
-        self.is_switchport = False
+        self._is_switchport = False
         self.probe_info = probe_info
+        # _get_ip_info() of the current probe_info
+        self._ip_info = None
         self.dhcp4_addresses = []
         self.dhcp6_addresses = []
         self.ipv4_addresses = []
@@ -52,6 +60,7 @@ class Networkdev():
         log.debug('Configuring iface {}'.format(self.ifname))
         log.debug('Info: {}'.format(probe_info.ip))
         self.probe_info = probe_info
+        self._ip_info = None
         self.configure_from_info()
 
     def configure_from_info(self):
@@ -132,6 +141,15 @@ class Networkdev():
 
         return result
 
+    @property
+    def is_switchport(self):
+        return self._is_switchport
+
+    @is_switchport.setter
+    def is_switchport(self, value):
+        self._is_switchport = value
+        self._ip_info = None
+
     @property
     def is_configured(self):
         return not self.is_switchport
@@ -157,6 +175,8 @@ class Networkdev():
             probed information, and instead report the configured
             ip from the static element of the subnets attribute.
         '''
+        if self._ip_info is not None:
+            return self._ip_info
         log.debug('getting ip info on {}'.format(self.ifname))
         ip4 = []
         ip6 = []
@@ -198,6 +218,7 @@ class Networkdev():
                     'ip4_providers': ip4_providers, 'ip6_providers': ip6_providers,
                   }
 
+        self._ip_info = ip_info
         return ip_info
 
     @property
@@ -321,6 +342,7 @@ class NetworkModel(BaseModel):
         self.v4_gateway_dev = None
         self.v6_gateway_dev = None
         self.network_routes = {}
+        self._summaries = None
 
     def get_menu(self):
         return self.additional_options
@@ -331,6 +353,7 @@ class NetworkModel(BaseModel):
         self.prober.probe()
         network_devices = self.prober.get_network_devices()
         self.network_routes = self.prober.get_network_routes()
+        self._summaries = None
 
         for iface in network_devices:
             if iface in NETDEV_IGNORED_IFACE_NAMES:
@@ -393,16 +416,17 @@ class NetworkModel(BaseModel):
         return os.path.exists(sys_dev_path(iface, "wireless"))
 
     def iface_is_bridge_member(self, iface):
-        ''' scan through all of the bridges
-            and see if iface is included in a bridge '''
-        bridges = self.get_bridges()
-        for bridge in bridges:
+        ''' is iface included in a bridge '''
+        return self.get_iface_summary(iface).bridge_member
+
+    def _bridge_members(self):
+        ''' scan through all of the bridges, once '''
+        members = set()
+        for bridge in self.get_bridges():
             brinfo = self.info[bridge].bridge
             if brinfo:
-                if iface in brinfo['interfaces']:
-                    return True
-
-        return False
+                members.update(brinfo['interfaces'])
+        return members
 
     def iface_get_speed(self, iface):
         '''string'ify and bucketize iface speed:
@@ -503,13 +527,8 @@ class NetworkModel(BaseModel):
         return False
 
     def get_bond_masters(self):
-        bond_masters = []
-        for iface in self.get_all_interface_names():
-            bondinfo = self.info[iface].bond
-            if bondinfo['is_master'] is True:
-                bond_masters.append(iface)
-
-        return bond_masters
+        return [summary.ifname for summary in self.get_iface_summaries()
+                if summary.bond_master]
 
     def iface_is_bridge(self, iface):
         return self.devices[iface].type == 'bridge'
@@ -526,15 +545,50 @@ class NetworkModel(BaseModel):
             route.append(None)
         return route
 
+    def _summarize(self):
+        ''' Work out the InterfaceSummary of every interface in one go.
+            Kept until the network is probed again or a bond is added. '''
+        log.debug('summarizing %s interfaces', len(self.devices))
+        bridge_members = self._bridge_members()
+        summaries = {}
+        for (ifname, dev) in self.devices.items():
+            bondinfo = self.info[ifname].bond or {}
+            summaries[ifname] = InterfaceSummary(
+                ifname=ifname,
+                type=dev.type,
+                hwaddr=self.get_hw_addr(ifname),
+                bonded=self.iface_is_bonded(ifname),
+                bond_slave=self.iface_is_bond_slave(ifname),
+                bond_master=bondinfo.get('is_master') is True,
+                bridge_member=ifname in bridge_members,
+                speed=self.iface_get_speed(ifname),
+                vendor=self.get_vendor(ifname),
+                model=self.get_model(ifname),
+                ip4=tuple(dev.ip4),
+                ip6=tuple(dev.ip6))
+        return summaries
+
+    def get_iface_summary(self, iface):
+        if self._summaries is None:
+            self._summaries = self._summarize()
+        return self._summaries[iface]
+
+    def get_iface_summaries(self):
+        ''' InterfaceSummary of every interface, sorted by name '''
+        if self._summaries is None:
+            self._summaries = self._summarize()
+        return [summary for (_, summary) in sorted(self._summaries.items())]
+
     def get_iface_info(self, iface):
+        summary = self.get_iface_summary(iface)
         info = {
-            'bonded': self.iface_is_bonded(iface),
-            'bond_slave': self.iface_is_bond_slave(iface),
-            'bond_master': iface in self.get_bond_masters(),
-            'speed': self.iface_get_speed(iface),
-            'vendor': self.get_vendor(iface),
-            'model': self.get_model(iface),
-            'ip': self.devices[iface].ip4,
+            'bonded': summary.bonded,
+            'bond_slave': summary.bond_slave,
+            'bond_master': summary.bond_master,
+            'speed': summary.speed,
+            'vendor': summary.vendor,
+            'model': summary.model,
+            'ip': list(summary.ip4),
         }
         return info
 
@@ -590,6 +644,7 @@ class NetworkModel(BaseModel):
 
         self.devices[ifname] = bonddev
         self.info[ifname] = bondinfo
+        self._summaries = None
 
     def clear_gateways(self):
         log.debug("clearing default gateway")
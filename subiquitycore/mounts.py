@@ -0,0 +1,145 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Mount table
+
+Index of the mounted block devices, parsed from /proc/mounts only when
+the kernel says the mount table changed: /proc/self/mountinfo reports
+POLLPRI | POLLERR to poll() after every mount or umount.
+"""
+
+import logging
+import os
+import select
+import threading
+
+log = logging.getLogger('subiquitycore.mounts')
+
+PROC_MOUNTS = '/proc/mounts'
+PROC_MOUNTINFO = '/proc/self/mountinfo'
+SYS_CLASS_BLOCK = '/sys/class/block'
+
+
+def _unescape(field):
+    # /proc/mounts escapes space, tab, newline and backslash as octal
+    if '\\' not in field:
+        return field
+    return field.encode('utf-8').decode('unicode_escape')
+
+
+def parent_disk(devpath):
+    ''' Return the /dev path of the disk `devpath' is a partition of, or
+        `devpath' itself if it is not a partition. '''
+    sysblock = os.path.join(SYS_CLASS_BLOCK, os.path.basename(devpath))
+    if os.path.exists(os.path.join(sysblock, 'partition')):
+        parent = os.path.dirname(os.path.realpath(sysblock))
+        return os.path.join('/dev', os.path.basename(parent))
+    return devpath
+
+
+class MountTable():
+    ''' Block devices currently mounted, indexed by resolved device path
+        (`devices') and by the resolved path of their disk (`disks').
+
+        `generation' is bumped every time the table is re-read, so that
+        users can cheaply tell whether anything they derived from it is
+        stale.
+    '''
+
+    def __init__(self, mounts=PROC_MOUNTS, mountinfo=PROC_MOUNTINFO):
+        self.mounts = mounts
+        self.generation = 0
+        self.devices = {}
+        self.disks = {}
+        self._lock = threading.Lock()
+        self._watch = None
+        self._poller = None
+        try:
+            # must be opened before the first parse, or a change
+            # in between would go unnoticed
+            self._watch = open(mountinfo)
+            self._poller = select.poll()
+            self._poller.register(self._watch,
+                                  select.POLLPRI | select.POLLERR)
+        except (OSError, AttributeError):
+            log.exception('Cannot watch {}, re-reading {} on every '
+                          'lookup'.format(mountinfo, mounts))
+            if self._watch is not None:
+                self._watch.close()
+            self._watch = self._poller = None
+        self._parse()
+
+    def _changed(self):
+        if self._poller is None:
+            return True
+        # polling also acknowledges the change
+        return len(self._poller.poll(0)) > 0
+
+    def _parse(self):
+        devices = {}
+        disks = {}
+        try:
+            with open(self.mounts) as pm:
+                lines = pm.readlines()
+        except OSError:
+            log.exception('Failed to read {}'.format(self.mounts))
+            lines = []
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 2 or not fields[0].startswith('/dev/'):
+                continue
+            # resolve any symlinks (/dev/disk/by-*, /dev/mapper/*)
+            devpath = os.path.realpath(_unescape(fields[0]))
+            if devpath not in devices:
+                devices[devpath] = []
+                disks.setdefault(parent_disk(devpath), set()).add(devpath)
+            devices[devpath].append(_unescape(fields[1]))
+        self.devices = devices
+        self.disks = disks
+        self.generation += 1
+        log.debug('mount table generation {}: {} mounted devices'.format(
+                  self.generation, len(devices)))
+
+    def refresh(self):
+        ''' Re-read the mount table if it changed.  Returns the
+            current generation. '''
+        with self._lock:
+            if self._changed():
+                self._parse()
+            return self.generation
+
+    def is_mounted(self, devpath):
+        ''' True if `devpath' or any of its partitions is mounted '''
+        self.refresh()
+        devpath = os.path.realpath(devpath)
+        return devpath in self.devices or devpath in self.disks
+
+    def mountpoints(self, devpath):
+        ''' Where `devpath' itself is mounted '''
+        self.refresh()
+        return list(self.devices.get(os.path.realpath(devpath), []))
+
+
+_mount_table = None
+_mount_table_lock = threading.Lock()
+
+
+def get_mount_table():
+    ''' The MountTable shared by everything in the process '''
+    global _mount_table
+    with _mount_table_lock:
+        if _mount_table is None:
+            _mount_table = MountTable()
+        return _mount_table
@@ -0,0 +1,136 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" rtnetlink
+
+Minimal listener for the kernel's rtnetlink multicast groups, enough to
+find out that links, addresses or routes changed without polling.
+"""
+
+import errno
+import logging
+import socket
+import struct
+from collections import namedtuple
+
+log = logging.getLogger('subiquitycore.netlink')
+
+NETLINK_ROUTE = 0
+
+# multicast groups, from linux/rtnetlink.h
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+
+# message types
+NLMSG_NOOP = 1
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+
+LINK_EVENTS = (RTM_NEWLINK, RTM_DELLINK)
+ADDR_EVENTS = (RTM_NEWADDR, RTM_DELADDR)
+ROUTE_EVENTS = (RTM_NEWROUTE, RTM_DELROUTE)
+
+# struct nlmsghdr, struct ifinfomsg, struct ifaddrmsg, struct rtmsg
+NLMSGHDR = struct.Struct('=IHHII')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBI')
+RTMSG = struct.Struct('=BBBBBBBBI')
+
+RECV_SIZE = 65536
+
+# 'ifindex' is None for route events, 'dst_len' is None for anything
+# but route events (a dst_len of 0 is a default route).
+RtnetlinkEvent = namedtuple('RtnetlinkEvent',
+                            ['type', 'family', 'ifindex', 'dst_len'])
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def parse_messages(data):
+    ''' Parse a buffer received from an rtnetlink socket into a list
+        of RtnetlinkEvent '''
+    events = []
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        (length, msg_type, _, _, _) = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        body = offset + NLMSGHDR.size
+        if msg_type in LINK_EVENTS:
+            (family, _, index, _, _) = IFINFOMSG.unpack_from(data, body)
+            events.append(RtnetlinkEvent(msg_type, family, index, None))
+        elif msg_type in ADDR_EVENTS:
+            (family, _, _, _, index) = IFADDRMSG.unpack_from(data, body)
+            events.append(RtnetlinkEvent(msg_type, family, index, None))
+        elif msg_type in ROUTE_EVENTS:
+            (family, dst_len, *_) = RTMSG.unpack_from(data, body)
+            events.append(RtnetlinkEvent(msg_type, family, None, dst_len))
+        offset += _align(length)
+    return events
+
+
+class RtnetlinkMonitor():
+    ''' Non-blocking rtnetlink socket subscribed to `groups'.
+
+        fileno() can be handed to select()/poll() to sleep until the
+        kernel reports a change.
+    '''
+
+    def __init__(self, groups):
+        self.groups = groups
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                  NETLINK_ROUTE)
+        self.sock.bind((0, groups))
+        self.sock.setblocking(False)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read_events(self):
+        ''' Drain the socket.
+
+            Returns (events, overrun).  `overrun' is True if the kernel
+            dropped messages because we did not read fast enough, in
+            which case callers must assume anything may have changed.
+        '''
+        events = []
+        overrun = False
+        while True:
+            try:
+                data = self.sock.recv(RECV_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    log.debug('rtnetlink socket overrun')
+                    overrun = True
+                    continue
+                raise
+            events += parse_messages(data)
+        return (events, overrun)
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,244 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Probe cache
+
+Keeps probe data on disk together with a fingerprint of the hardware it
+was probed on, so that a later run on the same (or an identical) machine
+can skip probing altogether.
+
+Each probe data section has its own fingerprint:
+
+- storage: DMI identifiers plus name, major:minor and size of every
+  block device, and the serial, partition table and filesystem ids udev
+  has for it, so that repartitioning or reformatting a disk shows.  Only
+  what stays the same from one boot to the next is used; loop and ram
+  devices are left out.  Without a udev database storage is not cached.
+- network: DMI identifiers plus name, MAC and driver of every network
+  device.  Addresses and routes change at runtime and are caught by the
+  prober's NetworkMonitor instead.
+
+Fingerprints only read a few small sysfs/procfs files, which is much
+cheaper than probing.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import yaml
+
+from subiquitycore import __version__ as VERSION
+
+log = logging.getLogger('subiquitycore.probecache')
+
+CACHE_VERSION = 1
+DMI_ATTRS = [
+    'sys_vendor',
+    'product_name',
+    'product_uuid',
+    'product_serial',
+    'board_serial',
+    'chassis_serial',
+]
+SYS_DMI_ID = '/sys/class/dmi/id'
+SYS_CLASS_BLOCK = '/sys/class/block'
+SYS_CLASS_NET = '/sys/class/net'
+UDEV_DATA = '/run/udev/data'
+# block devices that say nothing about the machine
+IGNORED_BLOCK_DEVICES = ('loop', 'ram')
+# the udev properties describing a disk and what is on it; the rest of
+# the database entry (e.g. I:, when the device was initialized) changes
+# on every boot
+UDEV_KEYS = (
+    'ID_SERIAL',
+    'ID_PART_TABLE_TYPE',
+    'ID_PART_TABLE_UUID',
+    'ID_FS_TYPE',
+    'ID_FS_UUID',
+    'ID_PART_ENTRY_TYPE',
+    'ID_PART_ENTRY_UUID',
+    'ID_PART_ENTRY_NUMBER',
+    'ID_PART_ENTRY_OFFSET',
+    'ID_PART_ENTRY_SIZE',
+)
+
+
+def _read(path):
+    try:
+        with open(path) as fp:
+            return fp.read().strip()
+    except (OSError, UnicodeDecodeError):
+        # missing, or root only (serial numbers)
+        return None
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def _dmi_ids():
+    return [_read(os.path.join(SYS_DMI_ID, attr)) for attr in DMI_ATTRS]
+
+
+def _digest(items):
+    return hashlib.sha256(
+        json.dumps(items, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _udev_properties(majmin):
+    ''' The UDEV_KEYS properties udev has for block device `majmin' '''
+    data = _read(os.path.join(UDEV_DATA, 'b' + majmin))
+    properties = {}
+    for line in (data or '').splitlines():
+        if not line.startswith('E:'):
+            continue
+        (key, _, value) = line[2:].partition('=')
+        if key in UDEV_KEYS:
+            properties[key] = value
+    return properties
+
+
+def storage_fingerprint():
+    if not os.path.isdir(UDEV_DATA):
+        # nothing tells us what is on the disks
+        return None
+    devices = []
+    for dev in _listdir(SYS_CLASS_BLOCK):
+        if dev.startswith(IGNORED_BLOCK_DEVICES):
+            continue
+        sysblock = os.path.join(SYS_CLASS_BLOCK, dev)
+        majmin = _read(os.path.join(sysblock, 'dev'))
+        devices.append([dev,
+                        majmin,
+                        _read(os.path.join(sysblock, 'size')),
+                        _udev_properties(majmin) if majmin else {}])
+    return _digest([VERSION, _dmi_ids(), devices])
+
+
+def _driver(iface):
+    try:
+        return os.path.basename(os.readlink(
+            os.path.join(SYS_CLASS_NET, iface, 'device', 'driver')))
+    except OSError:
+        # virtual devices have none
+        return None
+
+
+def network_fingerprint():
+    devices = []
+    for iface in _listdir(SYS_CLASS_NET):
+        devices.append([iface,
+                        _read(os.path.join(SYS_CLASS_NET, iface, 'address')),
+                        _driver(iface)])
+    return _digest([VERSION, _dmi_ids(), devices])
+
+
+FINGERPRINTS = {
+    'network': network_fingerprint,
+    'storage': storage_fingerprint,
+}
+
+
+class ProbeCache():
+    ''' Probe data sections cached in the file at `path' '''
+
+    def __init__(self, path):
+        self.path = path
+        self.fingerprints = {}
+        self.probe_data = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, section):
+        ''' Fingerprint of `section' on this machine, or None if it cannot
+            be told when the section changes, in which case it is never
+            cached. '''
+        return FINGERPRINTS[section]()
+
+    def load(self):
+        ''' Return the cached probe data sections that are still valid for
+            this machine.  A missing or unreadable cache is not an error,
+            it just means everything has to be probed. '''
+        if not os.path.exists(self.path):
+            log.debug('probe cache {} not present'.format(self.path))
+            return {}
+        try:
+            with open(self.path) as fp:
+                cache = yaml.safe_load(fp)
+            if cache.get('version') != CACHE_VERSION:
+                log.debug('ignoring probe cache with version {}'.format(
+                          cache.get('version')))
+                return {}
+            fingerprints = cache['fingerprints']
+            probe_data = cache['probe_data']
+        except (OSError, UnicodeDecodeError, yaml.YAMLError,
+                AttributeError, KeyError, TypeError):
+            log.exception('Failed to read probe cache {}'.format(self.path))
+            return {}
+
+        valid = {}
+        for section in FINGERPRINTS:
+            if section not in probe_data:
+                continue
+            fingerprint = self.fingerprint(section)
+            if fingerprint is None:
+                log.debug('probe cache: cannot fingerprint {}'.format(
+                          section))
+                continue
+            if fingerprints.get(section) != fingerprint:
+                log.debug('probe cache: {} changed since it was '
+                          'cached'.format(section))
+                continue
+            log.info('probe cache: using cached {} data'.format(section))
+            valid[section] = probe_data[section]
+            # the caller owns (and may modify) what we return, keep a copy
+            # for when the cache file is rewritten
+            with self._lock:
+                self.fingerprints[section] = fingerprint
+                self.probe_data[section] = copy.deepcopy(probe_data[section])
+        return valid
+
+    def save(self, section, data, fingerprint):
+        ''' Cache `data' for `section' and rewrite the cache file.
+            `fingerprint' must have been taken *before* probing `data', so
+            that changes made while probing invalidate the cache.  This is
+            called from the probing threads. '''
+        if fingerprint is None:
+            log.debug('probe cache: not caching {}'.format(section))
+            return
+        with self._lock:
+            self.fingerprints[section] = fingerprint
+            self.probe_data[section] = copy.deepcopy(data)
+            cache = {
+                'version': CACHE_VERSION,
+                'fingerprints': self.fingerprints,
+                'probe_data': self.probe_data,
+            }
+            tmp = self.path + '.tmp'
+            try:
+                with open(tmp, 'w') as fp:
+                    yaml.safe_dump(cache, fp)
+                os.rename(tmp, self.path)
+            except (OSError, yaml.YAMLError):
+                log.exception('Failed to write probe cache {}'.format(
+                              self.path))
+                return
+        log.debug('probe cache: saved {} data'.format(section))
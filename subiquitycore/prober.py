@@ -13,60 +13,323 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
+import socket
 import yaml
 import os
-from probert.storage import (Storage,
-                             StorageInfo)
-from probert.network import (Network,
-                             NetworkInfo)
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from subiquitycore.probecache import ProbeCache
+from subiquitycore.sysfs import get_block_attributes
+from subiquitycore.netlink import (ADDR_EVENTS,
+                                   ROUTE_EVENTS,
+                                   RTMGRP_IPV4_IFADDR,
+                                   RTMGRP_IPV4_ROUTE,
+                                   RTMGRP_IPV6_IFADDR,
+                                   RTMGRP_IPV6_ROUTE,
+                                   RtnetlinkMonitor)
 
 log = logging.getLogger('subiquitycore.prober')
 
+# libyaml is a lot faster, but optional
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+MACHINE_CONFIG_SECTIONS = ('network', 'storage')
+
 
 class ProberException(Exception):
     '''Base Prober Exception'''
     pass
 
 
+def load_machine_config(machine_config):
+    ''' Load a machine config file.  These are usually JSON dumps of
+        probert's output, which json parses much faster than any YAML
+        loader, so YAML is only used for files that are not JSON. '''
+    try:
+        with open(machine_config, 'rb') as mc:
+            content = mc.read().decode('utf-8')
+        data = None
+        if content.lstrip()[:1] in ('{', '['):
+            try:
+                data = json.loads(content)
+            except ValueError:
+                # YAML flow style looks a lot like JSON
+                log.debug('{} is not JSON, trying YAML'.format(
+                          machine_config))
+        if data is None:
+            data = yaml.load(content, Loader=SafeLoader)
+    except (UnicodeDecodeError, yaml.YAMLError):
+        err = 'Failed to parse machine config'
+        log.exception(err)
+        raise ProberException(err)
+
+    if not isinstance(data, dict):
+        err = 'Machine config {} is not a mapping'.format(machine_config)
+        log.error(err)
+        raise ProberException(err)
+    return data
+
+
+NetworkChanges = namedtuple('NetworkChanges',
+                            ['changed', 'removed', 'routes', 'overrun'])
+
+
+class NetworkMonitor():
+    ''' Collects network changes as they happen: udev events for network
+        devices (add/remove/change) and rtnetlink events for addresses
+        and routes.  changes() returns what happened since it was last
+        called.
+    '''
+
+    def __init__(self):
+        # pyudev and probert are only imported when first used, usually
+        # on the probing threads, to keep them off the path to the first
+        # screen.
+        import pyudev
+        self.udev = pyudev.Monitor.from_netlink(pyudev.Context())
+        self.udev.filter_by('net')
+        self.udev.start()
+        self.rtnl = RtnetlinkMonitor(RTMGRP_IPV4_IFADDR |
+                                     RTMGRP_IPV6_IFADDR |
+                                     RTMGRP_IPV4_ROUTE |
+                                     RTMGRP_IPV6_ROUTE)
+
+    def changes(self):
+        changed = set()
+        removed = set()
+        routes = False
+
+        device = self.udev.poll(timeout=0)
+        while device is not None:
+            log.debug('udev: {} {}'.format(device.action, device.sys_name))
+            if device.action == 'remove':
+                removed.add(device.sys_name)
+                changed.discard(device.sys_name)
+            else:
+                changed.add(device.sys_name)
+                removed.discard(device.sys_name)
+            device = self.udev.poll(timeout=0)
+
+        events, overrun = self.rtnl.read_events()
+        for event in events:
+            if event.type in ROUTE_EVENTS:
+                routes = True
+            elif event.type in ADDR_EVENTS:
+                try:
+                    changed.add(socket.if_indextoname(event.ifindex))
+                except OSError:
+                    # already gone, udev tells us about removals
+                    pass
+
+        return NetworkChanges(changed, removed, routes, overrun)
+
+
 class Prober():
     def __init__(self, opts):
         self.opts = opts
         self.probe_data = {}
+        # section name -> Future of a background probe still in flight
+        self._probes = {}
+        # guards _probes and probe_data between the threads asking
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(2)
+        self._network_monitor = None
+        self._network_monitor_failed = False
+        self._machine_config = None
+
+        self.cache = None
 
         if self.opts.machine_config:
             log.debug('User specified machine_config: {}'.format(
                       self.opts.machine_config))
             if os.path.exists(self.opts.machine_config):
-                self.probe_data = \
-                    self._load_machine_config(self.opts.machine_config)
+                self._start_loading_machine_config(self.opts.machine_config)
+        elif getattr(self.opts, 'probe_cache', None):
+            log.debug('User specified probe_cache: {}'.format(
+                      self.opts.probe_cache))
+            self.cache = ProbeCache(self.opts.probe_cache)
+            self.probe_data = self.cache.load()
+            if 'network' in self.probe_data:
+                # changes from now on are caught by the monitor
+                self._start_network_monitor()
         log.debug('Prober() init finished, data:{}'.format(self.probe_data))
 
     def _load_machine_config(self, machine_config):
-        with open(machine_config) as mc:
+        return load_machine_config(machine_config)
+
+    def _start_loading_machine_config(self, machine_config):
+        ''' Parse the machine config on a worker thread.  Each section
+            gets a future of its own, so it only lands in probe_data
+            when a getter first asks for it.  Parse errors are raised by
+            check_machine_config(). '''
+        loading = self._pool.submit(self._load_machine_config,
+                                    machine_config)
+        self._machine_config = loading
+        sections = {section: Future() for section in MACHINE_CONFIG_SECTIONS}
+
+        def split(loading):
             try:
-                data = yaml.safe_load(mc)
-            except (UnicodeDecodeError, yaml.reader.ReaderError):
-                err = 'Failed to parse machine config'
-                log.exception(err)
-                raise ProberException(err)
+                data = loading.result()
+            except Exception as e:
+                for future in sections.values():
+                    future.set_exception(e)
+                return
+            for section, future in sections.items():
+                # a section missing from the config stays missing
+                future.set_result(data.get(section))
 
-        return data
+        with self._lock:
+            self._probes.update(sections)
+        loading.add_done_callback(split)
 
-    def probe(self):
+    def check_machine_config(self):
+        ''' Wait for the machine config to be parsed, raises
+            ProberException if it could not be.  Every getter checks, so
+            that with a bad config none of them probes the host in its
+            place. '''
+        if self._machine_config is not None:
+            self._machine_config.result()
+
+    def _probe_network(self):
+        from probert.network import Network
         network = Network()
         results = network.probe()
-        self.probe_data['network'] = {}
-        self.probe_data['network']['devices'] = results
-        self.probe_data['network']['routes'] = network.get_routes()
+        return {
+            'devices': results,
+            'routes': network.get_routes(),
+        }
+
+    def _probe_storage(self):
+        from probert.storage import Storage
+        storage = Storage()
+        return storage.probe()
+
+    def start_probing(self, sections=('storage', 'network')):
+        ''' Start probing the requested sections on worker threads.
+
+            Sections already present in probe_data (e.g. loaded from a
+            machine config) or already being probed are skipped.  The
+            getters below wait on the resulting futures.
+        '''
+        probes = {
+            'network': self._probe_network,
+            'storage': self._probe_storage,
+        }
+        with self._lock:
+            for section in sections:
+                if section in self.probe_data or section in self._probes:
+                    continue
+                log.debug('start_probing: starting {} probe'.format(section))
+                if section == 'network':
+                    self._start_network_monitor()
+                self._probes[section] = self._pool.submit(
+                    self._cached_probe, section, probes[section])
+
+    def _cached_probe(self, section, probe):
+        if self.cache is None:
+            return probe()
+        fingerprint = self.cache.fingerprint(section)
+        data = probe()
+        self.cache.save(section, data, fingerprint)
+        return data
+
+    def _wait_for_probe(self, section):
+        ''' Wait for the probe of `section' in flight, if any.  Everyone
+            asking waits on the same future; the first one done moves the
+            result to probe_data, under the lock so that nobody sees the
+            probe gone before its data is there. '''
+        self.check_machine_config()
+        with self._lock:
+            future = self._probes.get(section)
+        if future is None:
+            return
+        log.debug('waiting for {} probe to finish'.format(section))
+        error = future.exception()
+        with self._lock:
+            if self._probes.get(section) is future:
+                del self._probes[section]
+                if error is None and future.result() is not None:
+                    self._set_probe_data(section, future.result())
+        if error is not None:
+            future.result()
+
+    def _set_probe_data(self, section, data):
+        self.probe_data[section] = data
+        if section == 'storage':
+            # sysfs attributes read so far may be stale now
+            get_block_attributes().invalidate()
+
+    def _start_network_monitor(self):
+        ''' Start watching for network changes.  This has to happen
+            before a live probe starts so that no change is missed. '''
+        if self._network_monitor is not None:
+            # anything seen so far is covered by the probe about to start
+            self._network_monitor.changes()
+            return
+        if self._network_monitor_failed:
+            return
+        try:
+            self._network_monitor = NetworkMonitor()
+        except OSError:
+            log.exception('Failed to start network monitor, every network '
+                          'probe will be a full probe')
+            self._network_monitor_failed = True
+
+    def _apply_network_changes(self):
+        ''' Bring probe_data['network'] up to date from the monitored
+            changes, if that can be done without a full probe.
+
+            Removed devices are dropped and route changes only re-read
+            the routes; added or changed devices need a full probe, as
+            probert has no way to probe a single device.
+
+            Returns True if probe_data['network'] is now up to date.
+        '''
+        if self._network_monitor is None or 'network' not in self.probe_data:
+            return False
+        changes = self._network_monitor.changes()
+        if changes.overrun or changes.changed:
+            log.debug('network changed: {}'.format(changes))
+            return False
+
+        devices = self.probe_data['network']['devices']
+        for iface in changes.removed:
+            log.debug('dropping removed network device {}'.format(iface))
+            devices.pop(iface, None)
+        if changes.routes:
+            log.debug('network routes changed, re-reading routes')
+            from probert.network import Network
+            self.probe_data['network']['routes'] = Network().get_routes()
+        return True
+
+    def probe(self):
+        ''' Bring network probe data up to date.  A probe started by
+            start_probing() that has not been consumed yet is fresh enough
+            to use as is, otherwise only a network that changed since the
+            last probe is probed again. '''
+        self.check_machine_config()
+        with self._lock:
+            if 'network' not in self._probes:
+                if self._apply_network_changes():
+                    return
+                self._start_network_monitor()
+                self._probes['network'] = self._pool.submit(
+                    self._cached_probe, 'network', self._probe_network)
+        self._wait_for_probe('network')
 
     def get_network_devices(self):
+        self._wait_for_probe('network')
         if 'network' not in self.probe_data:
             log.debug('get_network_devices: no network in probe_data, fetching')
             self.probe()
         return self.probe_data['network']['devices']
 
     def get_network_routes(self):
+        self._wait_for_probe('network')
         if 'network' not in self.probe_data:
             log.debug('get_network_routes: no network in probe_data, fetching')
             self.probe()
@@ -74,23 +337,26 @@ class Prober():
 
     def get_network_info(self, device):
         ''' Load a NetworkInfo class for specified device '''
+        from probert.network import NetworkInfo
         return NetworkInfo({device: self.get_network_devices().get(device)})
 
     def get_storage(self):
         ''' Load a StorageInfo class.  Probe if it's not present '''
+        self._wait_for_probe('storage')
         if 'storage' not in self.probe_data:
             log.debug('get_storage: no storage in probe_data, fetching')
-            storage = Storage()
-            results = storage.probe()
-            self.probe_data['storage'] = results
+            self.start_probing(['storage'])
+            self._wait_for_probe('storage')
 
         return self.probe_data['storage']
 
     def get_storage_info(self, device):
         ''' Load a StorageInfo class for specified device '''
+        from probert.storage import StorageInfo
         return StorageInfo({device: self.get_storage().get(device)})
 
 
 def make_network_info(device, info):
     ''' Create a NetworkInfo class for specified device from info'''
+    from probert.network import NetworkInfo
     return NetworkInfo({device: info})
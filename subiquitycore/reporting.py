@@ -0,0 +1,99 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Curtin event receiver
+
+curtin's webhook reporter POSTs every start/finish event as JSON, e.g.
+
+.. code::
+
+    {"name": "cmd-install/stage-partitioning",
+     "description": "configuring storage",
+     "event_type": "finish", "result": "SUCCESS",
+     "origin": "curtin", "timestamp": 1476262000.123}
+
+CurtinEventReceiver is a tiny HTTP server on localhost, running on the
+application's tornado IOLoop, that hands those events to a callback.
+"""
+
+import json
+import logging
+
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application, RequestHandler
+
+log = logging.getLogger('subiquitycore.reporting')
+
+
+class CurtinEventHandler(RequestHandler):
+    def initialize(self, callback):
+        self.callback = callback
+
+    def post(self):
+        try:
+            event = json.loads(self.request.body.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            log.exception('Ignoring malformed curtin event')
+            self.set_status(400)
+            return
+        if not isinstance(event, dict) or 'name' not in event:
+            log.error('Ignoring curtin event without a name: '
+                      '{}'.format(event))
+            self.set_status(400)
+            return
+        try:
+            self.callback(event)
+        except Exception:
+            log.exception('Failed to handle curtin event {}'.format(event))
+
+    def log_exception(self, *args):
+        # never let tornado print on the console we are drawing on
+        log.error('curtin event receiver error', exc_info=args)
+
+
+class CurtinEventReceiver():
+    ''' Receives curtin events on http://127.0.0.1:<port>/ and calls
+        `callback(event)' on the IOLoop thread for each of them '''
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.server = None
+        self.endpoint = None
+
+    def start(self):
+        ''' Start listening on a free port, returns the endpoint URL to
+            give curtin '''
+        sockets = bind_sockets(0, '127.0.0.1')
+        app = Application([(r'/', CurtinEventHandler,
+                            {'callback': self.callback})],
+                          log_function=self._log_request)
+        self.server = HTTPServer(app)
+        self.server.add_sockets(sockets)
+        port = sockets[0].getsockname()[1]
+        self.endpoint = 'http://127.0.0.1:{}/'.format(port)
+        log.debug('curtin event receiver listening on {}'.format(
+                  self.endpoint))
+        return self.endpoint
+
+    def stop(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+            self.endpoint = None
+
+    def _log_request(self, handler):
+        log.debug('curtin event: {} {}'.format(handler.get_status(),
+                                               handler.request.body[:200]))
@@ -20,45 +20,92 @@ import urwid
 import logging
 
 log = logging.getLogger('subiquity.signals')
+# The navigation stack is only dumped when tracing is asked for, e.g.
+# with SUBIQUITY_LOG_LEVELS=subiquity.signals.trace=DEBUG (setup_logger()
+# keeps it at INFO otherwise)
+trace_log = logging.getLogger('subiquity.signals.trace')
 
 
 class SignalException(Exception):
     "Problem with a signal"
 
 
+class SignalStack:
+    """ The menu signals visited, as (name, args, kwargs), with an index
+    of where each name is so that finding and trimming back to an entry
+    do not scan the stack.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def __repr__(self):
+        return repr(self.entries)
+
+    def index(self, name):
+        return self.positions[name]
+
+    def push(self, name, args, kwargs):
+        self.positions[name] = len(self.entries)
+        self.entries.append((name, args, kwargs))
+
+    def pop(self):
+        entry = self.entries.pop()
+        del self.positions[entry[0]]
+        return entry
+
+    def trim(self, name):
+        """ Drop everything above `name' """
+        index = self.positions[name]
+        while len(self.entries) > index + 1:
+            self.pop()
+
+
 class Signal:
-    known_signals = []
-    signal_stack = []
+    known_signals = set()
+    signal_stack = SignalStack()
     default_signal = None
+    # called with the name of a signal nobody connected to yet, before
+    # emitting it, e.g. to load whatever handles it
+    unknown_signal = None
 
     def register_signals(self, signals):
         if type(signals) is list:
-            self.known_signals.extend(signals)
+            self.known_signals.update(signals)
         else:
-            self.known_signals.append(signals)
+            self.known_signals.add(signals)
         urwid.register_signal(Signal, signals)
 
     def prev_signal(self):
-        log.debug('prev_signal: before: '
-                  'size={} stack={}'.format(len(self.signal_stack),
-                                            self.signal_stack))
+        trace_log.debug('prev_signal: before: size=%d stack=%s',
+                        len(self.signal_stack),
+                        self.signal_stack)
         if len(self.signal_stack) > 1:
             (current_name, *_) = self.signal_stack.pop()
             (prev_name, args, kwargs) = self.signal_stack.pop()
-            log.debug('current_name={}'.format(current_name))
-            log.debug('previous={}'.format(prev_name))
+            log.debug('current_name=%s', current_name)
+            log.debug('previous=%s', prev_name)
             while (current_name.count(':') < prev_name.count(':') or
                    current_name == prev_name):
                 log.debug('get next previous')
                 (prev_name, args, kwargs) = self.signal_stack.pop()
-                log.debug('previous={}'.format(prev_name))
+                log.debug('previous=%s', prev_name)
 
-            log.debug('prev_signal: after: '
-                      'size={} stack={}'.format(len(self.signal_stack),
-                                                self.signal_stack))
+            trace_log.debug('prev_signal: after: size=%d stack=%s',
+                            len(self.signal_stack),
+                            self.signal_stack)
 
-            log.debug("PrevEmitter: {}, {}, {}".format(prev_name, args,
-                                                       kwargs))
+            log.debug("PrevEmitter: %s, %s, %s", prev_name, args, kwargs)
             self.emit_signal(prev_name, *args, **kwargs)
         else:
             log.debug('stack empty: emitting menu:welcome:main')
@@ -66,32 +113,27 @@ class Signal:
             urwid.emit_signal(self, 'menu:welcome:main')
 
     def emit_signal(self, name, *args, **kwargs):
-        log.debug("Emitter: {}, {}, {}".format(name, args, kwargs))
+        log.debug("Emitter: %s, %s, %s", name, args, kwargs)
+        if name not in self.known_signals and \
+           self.unknown_signal is not None:
+            self.unknown_signal(name)
         if name.startswith("menu:"):
-            log.debug(" emit: before: "
-                      "size={} stack={}".format(len(self.signal_stack),
-                                                self.signal_stack))
             # only stack *menu* signals, drop signals if we've already
             # visited this level
-            match = [s for s in self.signal_stack if s[0] == name]
-            if len(match) > 0:
-                index = self.signal_stack.index(match.pop())
-                log.debug('Already visited {}, trimming stack'.format(name))
-                self.signal_stack = self.signal_stack[0:index + 1]
+            if name in self.signal_stack:
+                log.debug('Already visited %s, trimming stack', name)
+                self.signal_stack.trim(name)
             else:
-                log.debug('New menu for stack: {}'.format(name))
-                self.signal_stack.append((name, args, kwargs))
+                log.debug('New menu for stack: %s', name)
+                self.signal_stack.push(name, args, kwargs)
 
-            log.debug(" emit: after: "
-                      "size={} stack={}".format(len(self.signal_stack),
-                                                self.signal_stack))
+            trace_log.debug(" emit: after: size=%d stack=%s",
+                            len(self.signal_stack),
+                            self.signal_stack)
         urwid.emit_signal(self, name, *args, **kwargs)
 
     def connect_signal(self, name, cb, **kwargs):
-        log.debug(
-            "Emitter Connection: {}, {}, {}".format(name,
-                                                    cb,
-                                                    kwargs))
+        log.debug("Emitter Connection: %s, %s, %s", name, cb, kwargs)
         urwid.connect_signal(self, name, cb, **kwargs)
 
     def connect_signals(self, signal_callback):
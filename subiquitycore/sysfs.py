@@ -0,0 +1,140 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" sysfs
+
+Batched reader for block device attributes.  Every attribute of every
+block device is read in a single pass over /sys/class/block, and kept
+until the storage is probed again, instead of opening a couple of
+files each time a disk is looked at.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger('subiquitycore.sysfs')
+
+SYS_CLASS_BLOCK = '/sys/class/block'
+
+# a device is only a handful of small reads, so threads only pay off on
+# storage nodes with hundreds of devices
+READ_WORKERS = 4
+READ_FANOUT_DEVICES = 128
+
+# attribute name -> path relative to the device's sysfs directory
+BLOCK_ATTRS = {
+    'size': 'size',
+    'logical_block_size': 'queue/logical_block_size',
+    'physical_block_size': 'queue/physical_block_size',
+    'optimal_io_size': 'queue/optimal_io_size',
+    'rotational': 'queue/rotational',
+    'discard_granularity': 'queue/discard_granularity',
+    'model': 'device/model',
+    'serial': 'device/serial',
+}
+
+
+def _read_attr(path):
+    # os.open/os.read is a lot fewer syscalls than open()
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        return os.read(fd, 4096).decode('utf-8', 'replace').strip()
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+class BlockAttributes():
+    ''' Attributes of all block devices, as {device: {attr: value}}.
+
+        Values are the stripped strings found in sysfs; attributes a
+        device does not have are left out.  With `workers' > 1 and at
+        least `fanout' devices, devices are read on that many threads.
+    '''
+
+    def __init__(self, attrs=BLOCK_ATTRS, sysfs=SYS_CLASS_BLOCK, workers=0,
+                 fanout=READ_FANOUT_DEVICES):
+        self.attrs = attrs
+        self.sysfs = sysfs
+        self.workers = workers
+        self.fanout = fanout
+        self.generation = 0
+        self._devices = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        ''' Forget what was read, e.g. because storage was re-probed '''
+        with self._lock:
+            self._devices = None
+            self.generation += 1
+
+    def _read_device(self, path):
+        values = {}
+        for (attr, relpath) in self.attrs.items():
+            value = _read_attr(os.path.join(path, relpath))
+            if value is not None:
+                values[attr] = value
+        return values
+
+    def _read_all(self):
+        try:
+            devices = sorted((entry.name, entry.path)
+                             for entry in os.scandir(self.sysfs))
+        except OSError:
+            log.exception('Failed to list {}'.format(self.sysfs))
+            return {}
+        paths = [path for (_, path) in devices]
+        if self.workers > 1 and len(paths) >= max(self.fanout, 2):
+            with ThreadPoolExecutor(self.workers) as pool:
+                values = list(pool.map(self._read_device, paths))
+        else:
+            values = [self._read_device(path) for path in paths]
+        log.debug('read {} attributes of {} block devices'.format(
+                  len(self.attrs), len(paths)))
+        return {name: value
+                for ((name, _), value) in zip(devices, values)}
+
+    def devices(self):
+        with self._lock:
+            if self._devices is None:
+                self._devices = self._read_all()
+            return self._devices
+
+    def device(self, devname):
+        ''' Attributes of `devname' (sda or /dev/sda), {} if there is no
+            such block device '''
+        return self.devices().get(os.path.basename(devname), {})
+
+    def get(self, devname, attr, default=None):
+        return self.device(devname).get(attr, default)
+
+
+_block_attributes = None
+_block_attributes_lock = threading.Lock()
+
+
+def get_block_attributes():
+    ''' The BlockAttributes shared by everything in the process '''
+    global _block_attributes
+    with _block_attributes_lock:
+        if _block_attributes is None:
+            _block_attributes = BlockAttributes(workers=READ_WORKERS)
+        return _block_attributes
@@ -0,0 +1,278 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Serial console display
+
+Drawing for slow serial links (9600 or 115200 baud, often through a
+BMC's serial-over-LAN).  urwid's raw display rewrites every row that
+changed, from its first column to its last.  SerialScreen remembers
+the cell grid last sent and only sends the span of each row that
+differs.  SerialMainLoop caps the frame rate, and leaves the link time
+to send the previous frame before drawing again; redraws asked for in
+between are merged into one.
+"""
+
+import errno
+import logging
+import termios
+import time
+
+import urwid
+from urwid import escape, str_util, util
+
+log = logging.getLogger('subiquitycore.ui.serial')
+
+MAX_FPS = 10
+
+# a character on the wire is 8 bits plus start and stop bits
+BITS_PER_BYTE = 10
+
+# replaces control characters, like urwid does
+_UNPRINTABLE = {i: '?' for i in list(range(32)) + [127]}
+
+_BAUD_RATES = {}
+for _rate in (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200,
+              230400, 460800, 921600):
+    if hasattr(termios, 'B{}'.format(_rate)):
+        _BAUD_RATES[getattr(termios, 'B{}'.format(_rate))] = _rate
+
+
+def _target_encoding():
+    ''' the encoding urwid renders canvases in '''
+    if hasattr(util, 'get_encoding'):
+        return util.get_encoding()
+    return util._target_encoding
+
+
+def terminal_baud(fp):
+    ''' The output speed of the terminal `fp', None if unknown '''
+    try:
+        speed = termios.tcgetattr(fp.fileno())[5]
+    except (AttributeError, OSError, ValueError, termios.error):
+        return None
+    return _BAUD_RATES.get(speed)
+
+
+def canvas_cells(canvas, encoding):
+    ''' The rows of `canvas' as lists of (attr, charset, text) cells.  The
+        second cell of a double width character has text ''. '''
+    rows = []
+    for row in canvas.content():
+        cells = []
+        for (attr, cs, run) in row:
+            text = run.decode(encoding, 'replace')
+            if cs != 'U':
+                text = text.translate(_UNPRINTABLE)
+            for char in text:
+                width = str_util.get_width(ord(char))
+                if width == 0 and cells:
+                    # combining character
+                    (a, c, t) = cells[-1]
+                    cells[-1] = (a, c, t + char)
+                    continue
+                cells.append((attr, cs, char))
+                if width == 2:
+                    cells.append((attr, cs, ''))
+        rows.append(cells)
+    return rows
+
+
+def _changed_span(old, new):
+    ''' First and last column where the two rows differ, None if they
+        are the same '''
+    if old == new:
+        return None
+    if old is None or len(old) != len(new):
+        return (0, len(new) - 1)
+    first = 0
+    while old[first] == new[first]:
+        first += 1
+    last = len(new) - 1
+    while old[last] == new[last]:
+        last -= 1
+    # never start or end in the middle of a double width character
+    while first > 0 and new[first][2] == '':
+        first -= 1
+    while last + 1 < len(new) and new[last + 1][2] == '':
+        last += 1
+    return (first, last)
+
+
+def _is_blank(cell):
+    (attr, cs, text) = cell
+    return attr is None and text == ' '
+
+
+class SerialScreen(urwid.raw_display.Screen):
+    ''' A raw display that only sends the cells that changed.
+
+        After each frame, last_frame_bytes is the number of bytes it
+        took and bytes_written the total so far.  baud is the speed of
+        the output terminal, if it could be found out.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cells = None
+        self._cells_size = None
+        self.baud = None
+        self.last_frame_bytes = 0
+        self.bytes_written = 0
+
+    def start(self, *args, **kwargs):
+        result = super().start(*args, **kwargs)
+        self.baud = terminal_baud(self._term_output_file)
+        log.debug('serial screen started, baud %s', self.baud)
+        return result
+
+    def draw_screen(self, size, canvas):
+        self.last_frame_bytes = 0
+        # the default screen buffer (no alternate screen) is left to
+        # urwid, so is a resize it has not handled yet
+        if getattr(self, '_rows_used', None) is not None or \
+           getattr(self, '_resized', False):
+            self._cells = None
+            return super().draw_screen(size, canvas)
+        if self.screen_buf and canvas is self._screen_buf_canvas:
+            return
+
+        (maxcol, maxrow) = size
+        if not self.screen_buf or size != self._cells_size:
+            # cleared, started or resized: everything has to be sent
+            self._cells = None
+        self._setup_G1()
+        encoding = _target_encoding()
+        utf8 = util.get_encoding_mode() == 'utf8'
+        rows = canvas_cells(canvas, encoding)
+        output = []
+        state = {'attr': (), 'cs': ()}
+
+        def put(cell):
+            (attr, cs, text) = cell
+            if attr != state['attr']:
+                output.append(self._attr_to_escape(attr))
+                state['attr'] = attr
+            if not utf8 and cs != state['cs']:
+                if state['cs'] == 'U':
+                    output.append(escape.IBMPC_OFF)
+                if cs is None:
+                    output.append(escape.SI)
+                elif cs == 'U':
+                    output.append(escape.IBMPC_ON)
+                else:
+                    output.append(escape.SO)
+                state['cs'] = cs
+            output.append(text)
+
+        for (y, row) in enumerate(rows):
+            old = self._cells[y] if self._cells is not None else None
+            span = _changed_span(old, row)
+            if span is None:
+                continue
+            (first, last) = span
+            output.append(escape.set_cursor_position(first, y))
+            end = last
+            if last == maxcol - 1:
+                # blank to the end of the line: erase instead of sending
+                # spaces
+                while end >= first and _is_blank(row[end]):
+                    end -= 1
+                if end < last:
+                    for cell in row[first:end + 1]:
+                        put(cell)
+                    put((None, state['cs'], ''))
+                    output.append(escape.ERASE_IN_LINE_RIGHT)
+                    continue
+            if y == maxrow - 1 and last == maxcol - 1 and maxcol > 1 and \
+               row[-1][2] != '' and row[-2][2] != '':
+                # writing the bottom right cell would scroll the screen:
+                # write it one to the left, then insert the cell before
+                # it, which pushes it into place
+                for cell in row[first:-2]:
+                    put(cell)
+                if first == maxcol - 1:
+                    output.append(escape.set_cursor_position(maxcol - 2, y))
+                put(row[-1])
+                output.append('\x08' + escape.INSERT_ON)
+                put(row[-2])
+                output.append(escape.INSERT_OFF)
+                continue
+            for cell in row[first:last + 1]:
+                put(cell)
+
+        if canvas.cursor is not None:
+            (x, y) = canvas.cursor
+            output += [escape.set_cursor_position(x, y), escape.SHOW_CURSOR]
+        else:
+            output.append(escape.HIDE_CURSOR)
+
+        data = ''.join(output)
+        try:
+            self.write(data)
+            self.flush()
+        except OSError as e:
+            # ignore interrupted syscall
+            if e.args[0] != errno.EINTR:
+                raise
+        self.last_frame_bytes = len(data.encode(encoding, 'replace'))
+        self.bytes_written += self.last_frame_bytes
+
+        self._cells = rows
+        self._cells_size = size
+        self.screen_buf = canvas.content()
+        self._screen_buf_canvas = canvas
+
+
+class SerialMainLoop(urwid.MainLoop):
+    ''' A MainLoop that draws at most `max_fps' frames per second, and
+        no faster than the screen's link (when it knows its baud rate)
+        can send them.  A redraw asked for too soon is done once, when
+        the time comes. '''
+
+    def __init__(self, *args, max_fps=MAX_FPS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_fps = max_fps
+        self.frames = 0
+        self._next_frame = 0
+        self._redraw_handle = None
+
+    def draw_screen(self):
+        if self._redraw_handle is not None:
+            # already coming
+            return
+        delay = self._next_frame - time.time()
+        if delay > 0:
+            self._redraw_handle = self.event_loop.alarm(delay,
+                                                        self._delayed_draw)
+            return
+        self._draw()
+
+    def _delayed_draw(self):
+        self._redraw_handle = None
+        self._draw()
+
+    def _draw(self):
+        start = time.time()
+        super().draw_screen()
+        written = getattr(self.screen, 'last_frame_bytes', None)
+        if written == 0:
+            # nothing changed, the link is still free
+            return
+        self.frames += 1
+        interval = 1.0 / self.max_fps
+        baud = getattr(self.screen, 'baud', None)
+        if written is not None and baud:
+            interval = max(interval, written * BITS_PER_BYTE / baud)
+        self._next_frame = start + interval
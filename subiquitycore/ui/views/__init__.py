@@ -13,10 +13,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .network import NetworkView  # NOQA
-from .network_default_route import NetworkSetDefaultRouteView  # NOQA
-from .network_configure_interface import NetworkConfigureInterfaceView, NetworkConfigureWLANView  # NOQA
-from .network_configure_ipv4_interface import NetworkConfigureIPv4InterfaceView  # NOQA
-from .network_bond_interfaces import NetworkBondInterfacesView  # NOQA
-from .welcome import CoreWelcomeView as WelcomeView  # NOQA
-from .login import LoginView  # NOQA
+""" Core UI Views
+
+Import views from their modules, so that showing one screen does not
+load all the others.
+"""
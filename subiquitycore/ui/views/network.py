@@ -190,24 +190,23 @@ class NetworkView(BaseView):
                     col_2.append(Text("Not associated."))
 
             # Other device info (MAC, vendor/model, speed)
-            info = self.model.get_iface_info(iface)
-            hwaddr = self.model.get_hw_addr(iface)
-            log.debug('iface info:{}'.format(info))
+            info = self.model.get_iface_summary(iface)
+            log.debug('iface info:%s', info)
             template = ''
-            if hwaddr:
-                template += '{} '.format(hwaddr)
-            if info['bond_slave']:
+            if info.hwaddr:
+                template += '{} '.format(info.hwaddr)
+            if info.bond_slave:
                 template += '(Bonded) '
-            if not info['vendor'].lower().startswith('unknown'):
-                vendor = textwrap.wrap(info['vendor'], 15)[0]
+            if not info.vendor.lower().startswith('unknown'):
+                vendor = textwrap.wrap(info.vendor, 15)[0]
                 template += '{} '.format(vendor)
-            if not info['model'].lower().startswith('unknown'):
-                model = textwrap.wrap(info['model'], 20)[0]
+            if not info.model.lower().startswith('unknown'):
+                model = textwrap.wrap(info.model, 20)[0]
                 template += '{} '.format(model)
-            if info['speed']:
-                template += '({speed})'.format(**info)
+            if info.speed:
+                template += '({})'.format(info.speed)
             #log.debug('template: {}', template)
-            log.debug('hwaddr:{}, {}'.format(hwaddr, template))
+            log.debug('hwaddr:%s, %s', info.hwaddr, template)
 
             col_2.append(Color.info_minor(Text(template)))
             iface_menus.append(Columns([(ifname_width, Pile(col_1)), Pile(col_2)], 2))
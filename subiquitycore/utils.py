@@ -88,7 +88,7 @@ def environment_check(check):
 
 def run_command_async(cmd, timeout=None):
     log.debug('calling Async command: {}'.format(cmd))
-    return Async.pool.submit(run_command, cmd, timeout)
+    return Async.schedule('subprocess', run_command, (cmd, timeout))
 
 
 def run_command_start(command, timeout=None, shell=False):